@@ -1,27 +1,57 @@
 """
 FastAPI backend for Dial-In Application - Main application file
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 from contextlib import asynccontextmanager
+from cascade_jobs import CascadeWorker
+from category_stats import CategoryStatsReconciler
+from completion_ledger import TASK_LEDGER_COMPACTION, compact_completion_history
+from daily_rollups import RollupWorker
 from database import Base, engine, ensure_schema_updates
-from routes import auth, categories, tasks, events, rules, user, user_data
+from profile_capture import ProfileCaptureMiddleware
+from reminders import ReminderDispatcher
+from request_profiling import ProfilingMiddleware, install_sql_hooks
+from routes import admin, analytics, auth, availability, bootstrap, calendar, cascades, categories, export, ics, imports, search, stream, tasks, events, rules, sync, user, user_data
 from rule_engine import RuleScheduler
+from session_tokens import ADMIN_TOKEN, authorize_stream_scope, authorize_user_scope, require_admin
+from slow_query_log import install_slow_query_log
+from task_archive import TaskArchiver
 
 # Create the database tables
 Base.metadata.create_all(bind=engine)
 ensure_schema_updates()
+install_sql_hooks(engine)
+install_slow_query_log(engine)
 
 rule_scheduler = RuleScheduler(interval_seconds=60, horizon_days=30)
+cascade_worker = CascadeWorker(poll_seconds=30)
+category_stats_reconciler = CategoryStatsReconciler(interval_seconds=6 * 3600)
+rollup_worker = RollupWorker(interval_seconds=300)
+reminder_dispatcher = ReminderDispatcher(refill_seconds=300)
+task_archiver = TaskArchiver(
+    interval_seconds=3600,
+    after_archive=compact_completion_history if TASK_LEDGER_COMPACTION else None,
+)
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     rule_scheduler.start()
+    cascade_worker.start()
+    task_archiver.start()
+    category_stats_reconciler.start()
+    rollup_worker.start()
+    reminder_dispatcher.start()
     try:
         yield
     finally:
+        reminder_dispatcher.stop()
+        rollup_worker.stop()
+        category_stats_reconciler.stop()
+        task_archiver.stop()
+        cascade_worker.stop()
         rule_scheduler.stop()
 
 
@@ -42,14 +72,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include routers
+# Profile captures are an admin feature; without a token the middleware is not installed at all
+if ADMIN_TOKEN:
+    app.add_middleware(ProfileCaptureMiddleware)
+
+# Outermost, so its timings cover CORS handling too
+app.add_middleware(ProfilingMiddleware)
+
+# Include routers; a presented access token must match the user a request names
+user_scoped = [Depends(authorize_user_scope)]
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-app.include_router(categories.router, prefix="/categories", tags=["Categories"])
-app.include_router(tasks.router, prefix="/tasks", tags=["Tasks"])
-app.include_router(events.router, prefix="/events", tags=["Events"])
-app.include_router(rules.router, prefix="/rules", tags=["Rules"])
-app.include_router(user.router, prefix="/user", tags=["User"])
-app.include_router(user_data.router, prefix="/user_data", tags=["User Data"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+app.include_router(categories.router, prefix="/categories", tags=["Categories"], dependencies=user_scoped)
+app.include_router(tasks.router, prefix="/tasks", tags=["Tasks"], dependencies=user_scoped)
+app.include_router(events.router, prefix="/events", tags=["Events"], dependencies=user_scoped)
+app.include_router(rules.router, prefix="/rules", tags=["Rules"], dependencies=user_scoped)
+app.include_router(user.router, prefix="/user", tags=["User"], dependencies=user_scoped)
+app.include_router(user_data.router, prefix="/user_data", tags=["User Data"], dependencies=user_scoped)
+app.include_router(sync.router, prefix="/sync", tags=["Sync"], dependencies=user_scoped)
+app.include_router(bootstrap.router, prefix="/bootstrap", tags=["Bootstrap"], dependencies=user_scoped)
+app.include_router(export.router, prefix="/export", tags=["Export"], dependencies=user_scoped)
+app.include_router(imports.router, prefix="/import", tags=["Import"], dependencies=user_scoped)
+app.include_router(cascades.router, prefix="/cascades", tags=["Cascades"], dependencies=user_scoped)
+app.include_router(calendar.router, prefix="/calendar", tags=["Calendar"], dependencies=user_scoped)
+app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"], dependencies=user_scoped)
+app.include_router(availability.router, tags=["Availability"], dependencies=user_scoped)
+app.include_router(search.router, prefix="/search", tags=["Search"], dependencies=user_scoped)
+app.include_router(stream.router, prefix="/stream", tags=["Stream"], dependencies=[Depends(authorize_stream_scope)])
+# The feed URL carries its own HMAC token; calendar apps cannot send Authorization headers
+app.include_router(ics.router, prefix="/ics", tags=["Calendar Feed"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,150 @@
+"""Busy intervals, free slots and conflicts from a single sweep over sorted intervals.
+
+A user's busy time is every event with an ``end_time`` plus every task with
+both a ``due_time`` and an ``end_time``. Completed tasks still count, since
+the slot was booked. Events without an end and tasks with only a due time
+mark an instant rather than a span, so they never block or conflict. Times
+are naive wall-clock values, as stored.
+
+Intervals are fetched with the same range filters as the calendar, sorted once
+by start, and walked once. An interval conflicts with the current group when
+it starts before the group's latest end, so back-to-back items do not
+conflict. Merging, free-slot extraction and conflict grouping are therefore
+O(n log n) in the number of intervals in the window, not O(n²).
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import ArchivedTask, Event, Task
+from serializers import ARCHIVED_TASK_COLUMNS, TASK_COLUMNS, fetch_dicts
+from task_archive import task_window_filters, window_reaches_archive
+from view_filters import events_overlapping
+
+AVAILABILITY_MAX_DAYS = 366
+CONFLICT_DEFAULT_DAYS = 30
+
+EVENT_INTERVAL_COLUMNS = (Event.id, Event.title, Event.start_time, Event.end_time)
+TASK_INTERVAL_KEYS = {"id", "title", "due_date", "due_time", "end_date", "end_time"}
+
+
+def _wall_time(value: str) -> time:
+    return time(int(value[:2]), int(value[3:5]))
+
+
+def _task_bounds(row: Dict[str, object]) -> Optional[Tuple[datetime, datetime]]:
+    due_date: date = row["due_date"]  # type: ignore[assignment]
+    try:
+        start = datetime.combine(due_date, _wall_time(row["due_time"]))  # type: ignore[arg-type]
+        end = datetime.combine(row["end_date"] or due_date, _wall_time(row["end_time"]))  # type: ignore[arg-type]
+    except ValueError:
+        return None
+    return (start, end) if end > start else None
+
+
+def load_intervals(db: Session, user_id: int, start: datetime, end: datetime) -> List[Dict[str, object]]:
+    """The user's busy intervals overlapping [start, end), sorted by start then end."""
+    intervals: List[Dict[str, object]] = []
+    for row in fetch_dicts(
+        db,
+        EVENT_INTERVAL_COLUMNS,
+        events_overlapping(user_id, start, end),
+        Event.end_time.isnot(None),
+        Event.end_time > Event.start_time,
+    ):
+        if row["end_time"] > start:  # type: ignore[operator]
+            intervals.append({"kind": "event", "id": row["id"], "title": row["title"], "start": row["start_time"], "end": row["end_time"]})
+
+    task_sources = [(Task, TASK_COLUMNS)]
+    if window_reaches_archive(start.date()):
+        task_sources.append((ArchivedTask, ARCHIVED_TASK_COLUMNS))
+    # The last day is inclusive in task_window_filters; a window ending at midnight excludes it
+    last_day = (end - timedelta(microseconds=1)).date()
+    for model, columns in task_sources:
+        # Only the columns an interval needs; the title still reads through from the rule
+        for row in fetch_dicts(
+            db,
+            [column for column in columns if column.key in TASK_INTERVAL_KEYS],
+            model.user_id == user_id,
+            model.due_time.isnot(None),
+            model.end_time.isnot(None),
+            *task_window_filters(model, start.date(), last_day, include_undated=False),
+        ):
+            bounds = _task_bounds(row)
+            if bounds is None or bounds[0] >= end or bounds[1] <= start:
+                continue
+            intervals.append({"kind": "task", "id": row["id"], "title": row["title"], "start": bounds[0], "end": bounds[1]})
+
+    intervals.sort(key=lambda interval: (interval["start"], interval["end"]))
+    return intervals
+
+
+def merge_busy(intervals: List[Dict[str, object]], start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Union of the sorted intervals, clipped to [start, end)."""
+    merged: List[Tuple[datetime, datetime]] = []
+    for interval in intervals:
+        busy_start = max(interval["start"], start)  # type: ignore[type-var]
+        busy_end = min(interval["end"], end)  # type: ignore[type-var]
+        if busy_end <= busy_start:
+            continue
+        if merged and busy_start <= merged[-1][1]:
+            if busy_end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], busy_end)
+        else:
+            merged.append((busy_start, busy_end))
+    return merged
+
+
+def free_slots(
+    busy: List[Tuple[datetime, datetime]],
+    start: datetime,
+    end: datetime,
+    min_length: timedelta = timedelta(0),
+) -> List[Tuple[datetime, datetime]]:
+    """Gaps between merged busy intervals inside [start, end) lasting at least ``min_length``."""
+    slots: List[Tuple[datetime, datetime]] = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor and busy_start - cursor >= min_length:
+            slots.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if end > cursor and end - cursor >= min_length:
+        slots.append((cursor, end))
+    return slots
+
+
+def _peak_overlap(group: List[Dict[str, object]]) -> int:
+    # Ends sort before starts at the same instant, so touching items do not count
+    boundaries = sorted(
+        [(interval["start"], 1) for interval in group] + [(interval["end"], -1) for interval in group],
+        key=lambda boundary: (boundary[0], boundary[1]),
+    )
+    depth = peak = 0
+    for _, step in boundaries:
+        depth += step
+        peak = max(peak, depth)
+    return peak
+
+
+def _conflict(group: List[Dict[str, object]], group_end: datetime) -> Dict[str, object]:
+    return {"start": group[0]["start"], "end": group_end, "max_overlap": _peak_overlap(group), "items": group}
+
+
+def find_conflicts(intervals: List[Dict[str, object]]) -> Iterator[Dict[str, object]]:
+    """Yield each group of two or more transitively overlapping intervals, in time order."""
+    group: List[Dict[str, object]] = []
+    group_end = datetime.min
+    for interval in intervals:
+        if group and interval["start"] < group_end:  # type: ignore[operator]
+            group.append(interval)
+            group_end = max(group_end, interval["end"])  # type: ignore[type-var]
+            continue
+        if len(group) > 1:
+            yield _conflict(group, group_end)
+        group = [interval]
+        group_end = interval["end"]  # type: ignore[assignment]
+    if len(group) > 1:
+        yield _conflict(group, group_end)
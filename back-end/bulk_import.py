@@ -0,0 +1,437 @@
+"""Streaming bulk import of projects, rules, tasks and events.
+
+Uploads are read record by record from a file object in NDJSON, CSV or iCalendar
+(VEVENT/VTODO) form and validated with the same helpers the single-row routes
+use. Tasks and events are written with executemany INSERTs committed every
+``IMPORT_BATCH_SIZE`` rows. Projects and rules are inserted as they arrive so
+later rows in the same upload can reference them by their exported ids.
+"""
+from __future__ import annotations
+
+import csv
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+import orjson
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import Category, Event, Rule, Task
+from response_cache import bump_generation
+from route_utils import normalize_color, normalize_event_duration, normalize_icon, parse_date_only, parse_time_only
+from rule_engine import parse_rate_pattern, run_rule_generation
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+IMPORT_ENTITIES = ("category", "rule", "task", "event")
+
+# (line number, record, parse error) triples produced by the format readers
+ImportRecord = Tuple[int, Optional[dict], Optional[str]]
+
+
+class ImportRowError(ValueError):
+    """Raised when a single record fails validation; the import continues."""
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    return value if value != "" else None
+
+
+def _parse_bool(value, default: bool = False) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    normalized = str(value).strip().lower()
+    if normalized in {"true", "1", "yes", "y", "t"}:
+        return True
+    if normalized in {"false", "0", "no", "n", "f"}:
+        return False
+    raise ImportRowError(f"Invalid boolean: {value!r}")
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    value = _text(value)
+    if value is None:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _parse_id(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ImportRowError(f"Invalid id: {value!r}")
+    return int(value)
+
+
+def iter_ndjson_records(stream: TextIO) -> Iterator[ImportRecord]:
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def iter_csv_records(stream: TextIO) -> Iterator[ImportRecord]:
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, {key: value for key, value in record.items() if key}, None
+
+
+def _unescape_ics_text(value: str) -> str:
+    result = []
+    index = 0
+    while index < len(value):
+        character = value[index]
+        if character == "\\" and index + 1 < len(value):
+            following = value[index + 1]
+            result.append("\n" if following in "nN" else following)
+            index += 2
+            continue
+        result.append(character)
+        index += 1
+    return "".join(result)
+
+
+def _split_ics_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    in_quotes = False
+    for index, character in enumerate(line):
+        if character == '"':
+            in_quotes = not in_quotes
+        elif character == ":" and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return line.upper(), {}, ""
+
+    name, *raw_params = head.split(";")
+    params = {}
+    for raw_param in raw_params:
+        key, _, param_value = raw_param.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def _parse_ics_datetime(value: str, params: Dict[str, str]):
+    """Return a date for all-day values, otherwise a naive datetime (UTC when suffixed Z)."""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d").date()
+    return datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+
+
+def _ics_component_to_record(component: str, properties: Dict[str, Tuple[Dict[str, str], str]]) -> dict:
+    def text_property(name: str) -> Optional[str]:
+        entry = properties.get(name)
+        return _unescape_ics_text(entry[1]) if entry else None
+
+    def time_property(name: str):
+        entry = properties.get(name)
+        if not entry:
+            return None
+        try:
+            return _parse_ics_datetime(entry[1], entry[0])
+        except ValueError:
+            raise ImportRowError(f"Invalid {name}: {entry[1]!r}")
+
+    if component == "VEVENT":
+        start = time_property("DTSTART")
+        end = time_property("DTEND")
+        if end is None and isinstance(start, date) and not isinstance(start, datetime):
+            end = start + timedelta(days=1)
+        return {
+            "entity": "event",
+            "title": text_property("SUMMARY"),
+            "description": text_property("DESCRIPTION"),
+            "start_time": start.isoformat() if start else None,
+            "end_time": end.isoformat() if end else None,
+        }
+
+    due = time_property("DUE") or time_property("DTSTART")
+    completed = time_property("COMPLETED")
+    status = (text_property("STATUS") or "").upper()
+    return {
+        "entity": "task",
+        "title": text_property("SUMMARY"),
+        "description": text_property("DESCRIPTION"),
+        "due_date": due.isoformat() if due else None,
+        "due_time": due.strftime("%H:%M") if isinstance(due, datetime) and due.strftime("%H:%M") != "00:00" else None,
+        "is_completed": status == "COMPLETED" or completed is not None,
+        "completed_at": completed.isoformat() if isinstance(completed, datetime) else None,
+    }
+
+
+def iter_ics_records(stream: TextIO) -> Iterator[ImportRecord]:
+    """Yield VEVENT and VTODO components; other components (VTIMEZONE, VALARM) are skipped."""
+
+    def unfolded_lines() -> Iterator[Tuple[int, str]]:
+        pending: Optional[str] = None
+        pending_line = 0
+        for line_number, raw_line in enumerate(stream, start=1):
+            line = raw_line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and pending is not None:
+                pending += line[1:]
+                continue
+            if pending is not None:
+                yield pending_line, pending
+            pending, pending_line = line, line_number
+        if pending is not None:
+            yield pending_line, pending
+
+    component: Optional[str] = None
+    component_line = 0
+    nested_depth = 0
+    properties: Dict[str, Tuple[Dict[str, str], str]] = {}
+
+    for line_number, line in unfolded_lines():
+        if not line:
+            continue
+        name, params, value = _split_ics_property(line)
+
+        if name == "BEGIN":
+            if component is not None:
+                nested_depth += 1
+            elif value.upper() in {"VEVENT", "VTODO"}:
+                component, component_line, properties = value.upper(), line_number, {}
+            continue
+
+        if name == "END":
+            if nested_depth:
+                nested_depth -= 1
+            elif component is not None and value.upper() == component:
+                try:
+                    yield component_line, _ics_component_to_record(component, properties), None
+                except ImportRowError as exc:
+                    yield component_line, None, str(exc)
+                component = None
+            continue
+
+        if component is not None and not nested_depth:
+            properties.setdefault(name, (params, value))
+
+
+IMPORT_READERS = {
+    "ndjson": iter_ndjson_records,
+    "csv": iter_csv_records,
+    "ics": iter_ics_records,
+}
+
+
+class BulkImporter:
+    """Validate import records for one user and write them in batches."""
+
+    def __init__(self, db: Session, user_id: int, default_entity: Optional[str] = None):
+        self.db = db
+        self.user_id = user_id
+        self.default_entity = default_entity
+        self.category_ids: Set[int] = {
+            row[0] for row in db.query(Category.id).filter(Category.user_id == user_id).all()
+        }
+        self.rule_ids: Set[int] = {row[0] for row in db.query(Rule.id).filter(Rule.user_id == user_id).all()}
+        # Ids as they appear in the upload -> ids assigned on insert
+        self.category_id_map: Dict[int, int] = {}
+        self.rule_id_map: Dict[int, int] = {}
+        self.pending: Dict[str, List[dict]] = {"task": [], "event": []}
+        self.counts = {entity: 0 for entity in IMPORT_ENTITIES}
+        self.errors: List[dict] = []
+        self.error_count = 0
+
+    def run(self, records: Iterator[ImportRecord]) -> Dict[str, object]:
+        for line_number, record, parse_error in records:
+            if parse_error is not None:
+                self._record_error(line_number, None, parse_error)
+                continue
+            self.add(line_number, record)
+        return self.finish()
+
+    def add(self, line_number: int, record: dict) -> None:
+        entity = _text(record.get("entity")) or self.default_entity
+        if entity not in IMPORT_ENTITIES:
+            self._record_error(line_number, entity, "Unknown or missing entity")
+            return
+
+        try:
+            if entity == "category":
+                self._insert_category(record)
+            elif entity == "rule":
+                self._insert_rule(record)
+            else:
+                values = self._task_values(record) if entity == "task" else self._event_values(record)
+                self.pending[entity].append(values)
+                if len(self.pending[entity]) >= IMPORT_BATCH_SIZE:
+                    self.flush()
+        except (ImportRowError, ValueError, TypeError) as exc:
+            self._record_error(line_number, entity, str(exc))
+            return
+
+        self.counts[entity] += 1
+
+    def flush(self) -> None:
+        if self.pending["task"]:
+            self.db.execute(insert(Task), self.pending["task"])
+            self.pending["task"] = []
+        if self.pending["event"]:
+            self.db.execute(insert(Event), self.pending["event"])
+            self.pending["event"] = []
+        self.db.commit()
+
+    def finish(self) -> Dict[str, object]:
+        self.flush()
+
+        if self.counts["rule"]:
+            start_date = datetime.utcnow().date()
+            run_rule_generation(self.db, start_date, start_date + timedelta(days=30), user_id=self.user_id)
+        bump_generation(self.user_id)
+
+        return {
+            "imported": self.counts,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+        }
+
+    def _record_error(self, line_number: int, entity: Optional[str], message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "entity": entity, "error": message})
+
+    def _resolve_category(self, value) -> Optional[int]:
+        category_id = _parse_id(value)
+        if category_id is None:
+            return None
+        if category_id in self.category_id_map:
+            return self.category_id_map[category_id]
+        if category_id in self.category_ids:
+            return category_id
+        raise ImportRowError(f"Unknown project: {category_id}")
+
+    def _resolve_rule(self, value) -> Optional[int]:
+        rule_id = _parse_id(value)
+        if rule_id is None:
+            return None
+        if rule_id in self.rule_id_map:
+            return self.rule_id_map[rule_id]
+        if rule_id in self.rule_ids:
+            return rule_id
+        raise ImportRowError(f"Unknown rule: {rule_id}")
+
+    def _insert_category(self, record: dict) -> None:
+        name = _text(record.get("name"))
+        if not name:
+            raise ImportRowError("name is required")
+
+        result = self.db.execute(
+            insert(Category).values(
+                name=name,
+                icon=normalize_icon(record.get("icon")),
+                color=normalize_color(record.get("color")),
+                user_id=self.user_id,
+                created_at=_parse_datetime(record.get("created_at")) or datetime.utcnow(),
+            )
+        )
+        new_id = result.inserted_primary_key[0]
+        self.category_ids.add(new_id)
+        source_id = _parse_id(record.get("id"))
+        if source_id is not None:
+            self.category_id_map[source_id] = new_id
+
+    def _insert_rule(self, record: dict) -> None:
+        name = _text(record.get("name"))
+        if not name or not name.strip():
+            raise ImportRowError("name is required")
+        rate_pattern = _text(record.get("rate_pattern"))
+        if not rate_pattern or not parse_rate_pattern(rate_pattern):
+            raise ImportRowError("Invalid rate_pattern")
+        category_id = self._resolve_category(record.get("category_id"))
+        if category_id is None:
+            raise ImportRowError("Project is required")
+
+        description = _text(record.get("description"))
+        result = self.db.execute(
+            insert(Rule).values(
+                name=name.strip(),
+                icon=normalize_icon(record.get("icon")),
+                color=normalize_color(record.get("color")),
+                description=description if description and description.strip() else None,
+                category_id=category_id,
+                user_id=self.user_id,
+                rate_pattern=rate_pattern,
+                is_active=_parse_bool(record.get("is_active"), default=True),
+                event_duration_minutes=normalize_event_duration(record.get("event_duration_minutes")),
+                # created_at anchors interval patterns, so keep the exported value
+                created_at=_parse_datetime(record.get("created_at")) or datetime.utcnow(),
+            )
+        )
+        new_id = result.inserted_primary_key[0]
+        self.rule_ids.add(new_id)
+        source_id = _parse_id(record.get("id"))
+        if source_id is not None:
+            self.rule_id_map[source_id] = new_id
+
+    def _task_values(self, record: dict) -> dict:
+        title = _text(record.get("title"))
+        if not title:
+            raise ImportRowError("title is required")
+
+        due_date = _text(record.get("due_date"))
+        end_date = _text(record.get("end_date"))
+        parsed_due_date = parse_date_only(due_date)
+        parsed_end_date = parse_date_only(end_date)
+        is_completed = _parse_bool(record.get("is_completed"))
+
+        return {
+            "title": title,
+            "icon": normalize_icon(record.get("icon")),
+            "color": normalize_color(record.get("color")),
+            "description": _text(record.get("description")),
+            "category_id": self._resolve_category(record.get("category_id")),
+            "rule_id": self._resolve_rule(record.get("rule_id")),
+            "user_id": self.user_id,
+            "is_completed": is_completed,
+            "due_date": parsed_due_date,
+            "due_time": parse_time_only(_text(record.get("due_time")), due_date) if parsed_due_date else None,
+            "end_date": parsed_end_date,
+            "end_time": parse_time_only(_text(record.get("end_time")), end_date) if parsed_end_date else None,
+            "created_at": _parse_datetime(record.get("created_at")) or datetime.utcnow(),
+            "completed_at": _parse_datetime(record.get("completed_at")) if is_completed else None,
+        }
+
+    def _event_values(self, record: dict) -> dict:
+        title = _text(record.get("title"))
+        if not title:
+            raise ImportRowError("title is required")
+        start_time = _parse_datetime(record.get("start_time"))
+        if start_time is None:
+            raise ImportRowError("start_time is required")
+
+        return {
+            "title": title,
+            "description": _text(record.get("description")),
+            "category_id": self._resolve_category(record.get("category_id")),
+            "rule_id": self._resolve_rule(record.get("rule_id")),
+            "user_id": self.user_id,
+            "start_time": start_time,
+            "end_time": _parse_datetime(record.get("end_time")),
+            "created_at": _parse_datetime(record.get("created_at")) or datetime.utcnow(),
+        }
+
+
+def run_import(db: Session, user_id: int, stream: TextIO, import_format: str, default_entity: Optional[str] = None):
+    """Parse ``stream`` in ``import_format`` and import every valid record for ``user_id``."""
+    importer = BulkImporter(db, user_id, default_entity=default_entity)
+    return importer.run(IMPORT_READERS[import_format](stream))
@@ -0,0 +1,232 @@
+"""Chunked background processing of project and rule cascade deletes.
+
+Deleting a project or rule removes the parent row inside the request and records a
+``CascadeJob``. Its child tasks are then deleted or orphaned in bounded chunks,
+each in its own short transaction, so SQLite's write lock is never held for an
+unbounded statement. The chunk size adapts so a chunk's transaction stays under
+``CASCADE_MAX_CHUNK_SECONDS``. Jobs are persisted and resume after a restart.
+Archived tasks are handled the same way once the hot table is done.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session
+
+from completion_ledger import release_rule_ledgers
+from database import SessionLocal
+from models import ArchivedTask, CascadeJob, Rule, Task
+from response_cache import bump_generation
+
+CASCADE_INITIAL_CHUNK_SIZE = 500
+CASCADE_MIN_CHUNK_SIZE = 50
+CASCADE_MAX_CHUNK_SIZE = 5000
+CASCADE_MAX_CHUNK_SECONDS = 0.05
+# Pause between chunks so other writers and the rule scheduler can take the lock
+CASCADE_CHUNK_PAUSE_SECONDS = 0.01
+
+_work_available = threading.Event()
+
+
+def _job_rule_ids(job: CascadeJob) -> List[int]:
+    return json.loads(job.rule_ids or "[]")
+
+
+def _affected_tasks_filter(job: CascadeJob, model=Task):
+    rule_ids = _job_rule_ids(job)
+    if job.kind == "rule":
+        return model.rule_id.in_(rule_ids)
+    if rule_ids:
+        return or_(model.rule_id.in_(rule_ids), model.category_id == job.target_id)
+    return model.category_id == job.target_id
+
+
+def enqueue_cascade(
+    db: Session,
+    user_id: int,
+    kind: str,
+    target_id: int,
+    rule_ids: List[int],
+    action: str,
+) -> CascadeJob:
+    """Record a cascade job in the caller's transaction; the caller commits it.
+
+    Call before deleting the rules: orphaning writes their names and descriptions
+    into tasks that inherit them, reads show them on tasks the job has not reached
+    yet, and their completion ledgers are released here.
+    """
+    inherited_fields = {}
+    if rule_ids:
+        inherited_fields = {
+            rule_id: [name, description]
+            for rule_id, name, description in db.query(Rule.id, Rule.name, Rule.description).filter(Rule.id.in_(rule_ids))
+        }
+    release_rule_ledgers(db, rule_ids, materialize=action == "orphan")
+
+    job = CascadeJob(
+        user_id=user_id,
+        kind=kind,
+        target_id=target_id,
+        rule_ids=json.dumps(sorted(rule_ids)),
+        inherited_fields=json.dumps(inherited_fields),
+        action=action,
+        status="pending",
+        processed=0,
+    )
+    job.total = sum(
+        db.query(model.id).filter(model.user_id == user_id, _affected_tasks_filter(job, model)).count()
+        for model in (Task, ArchivedTask)
+    )
+    db.add(job)
+    return job
+
+
+def _write_inherited_fields(job: CascadeJob, model, chunk_query) -> None:
+    # Tasks about to lose their rule keep the title and description they displayed
+    for rule_id, (name, description) in json.loads(job.inherited_fields or "{}").items():
+        chunk_query.filter(model.rule_id == int(rule_id)).update(
+            {
+                model.title: case((model.title == "", name), else_=model.title),
+                model.description: func.coalesce(model.description, description),
+            },
+            synchronize_session=False,
+        )
+
+
+def process_cascade_chunk(db: Session, job: CascadeJob, chunk_size: int) -> int:
+    """Delete or orphan up to ``chunk_size`` child tasks of ``job`` and commit.
+
+    Returns the number of tasks handled. The job is done once a chunk comes back short.
+    """
+    rule_ids = _job_rule_ids(job)
+    handled = 0
+    for model in (Task, ArchivedTask):
+        task_ids = [
+            row[0]
+            for row in db.query(model.id)
+            .filter(model.user_id == job.user_id, _affected_tasks_filter(job, model))
+            .limit(chunk_size - handled)
+            .all()
+        ]
+        if not task_ids:
+            continue
+
+        chunk_query = db.query(model).filter(model.id.in_(task_ids))
+        if job.action != "delete":
+            _write_inherited_fields(job, model, chunk_query)
+
+        if job.action == "delete":
+            chunk_query.delete(synchronize_session=False)
+        elif job.kind == "rule":
+            chunk_query.update({model.rule_id: None}, synchronize_session=False)
+        else:
+            # Matches the former inline behaviour: rule tasks lose both links,
+            # tasks filed under the project lose their project
+            chunk_query.update(
+                {
+                    model.rule_id: case((model.rule_id.in_(rule_ids), None), else_=model.rule_id) if rule_ids else model.rule_id,
+                    model.category_id: None,
+                },
+                synchronize_session=False,
+            )
+
+        handled += len(task_ids)
+        if handled >= chunk_size:
+            break
+
+    job.processed = (job.processed or 0) + handled
+    if handled < chunk_size:
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+    else:
+        job.status = "running"
+    db.commit()
+
+    if handled:
+        bump_generation(job.user_id)
+    return handled
+
+
+def run_cascade_job(db: Session, job: CascadeJob, stop_event: Optional[threading.Event] = None) -> None:
+    """Work through a job chunk by chunk, adapting chunk size to the lock-time budget."""
+    chunk_size = CASCADE_INITIAL_CHUNK_SIZE
+    while job.status != "done":
+        if stop_event is not None and stop_event.is_set():
+            return
+
+        started = time.perf_counter()
+        process_cascade_chunk(db, job, chunk_size)
+        elapsed = time.perf_counter() - started
+
+        if elapsed > CASCADE_MAX_CHUNK_SECONDS:
+            chunk_size = max(CASCADE_MIN_CHUNK_SIZE, chunk_size // 2)
+        elif elapsed < CASCADE_MAX_CHUNK_SECONDS / 4:
+            chunk_size = min(CASCADE_MAX_CHUNK_SIZE, chunk_size * 2)
+
+        time.sleep(CASCADE_CHUNK_PAUSE_SECONDS)
+
+
+def start_cascade(db: Session, job: CascadeJob) -> CascadeJob:
+    """Process the first chunk inline and hand anything left to the worker.
+
+    Small cascades therefore finish within the request that started them, while
+    large ones return immediately with a job the client can poll.
+    """
+    process_cascade_chunk(db, job, CASCADE_INITIAL_CHUNK_SIZE)
+    if job.status != "done":
+        _work_available.set()
+    return job
+
+
+class CascadeWorker:
+    def __init__(self, poll_seconds: int = 30):
+        self.poll_seconds = poll_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="cascade-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        _work_available.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.is_set():
+            _work_available.clear()
+            db = SessionLocal()
+            try:
+                pending_jobs = (
+                    db.query(CascadeJob)
+                    .filter(CascadeJob.status.in_(("pending", "running")))
+                    .order_by(CascadeJob.id)
+                    .all()
+                )
+                for job in pending_jobs:
+                    try:
+                        run_cascade_job(db, job, self._stop_event)
+                    except Exception as exc:
+                        print(f"Cascade job {job.id} error: {exc}")
+                        db.rollback()
+                        job.status = "failed"
+                        job.error = str(exc)
+                        job.finished_at = datetime.utcnow()
+                        db.commit()
+            except Exception as exc:
+                print(f"Cascade worker error: {exc}")
+                db.rollback()
+            finally:
+                db.close()
+
+            _work_available.wait(self.poll_seconds)
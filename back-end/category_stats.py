@@ -0,0 +1,100 @@
+"""Per-project task counters.
+
+``category_stats`` holds open and completed task counts per project and
+``category_open_due`` holds open tasks per project and due date. Both are kept
+current by the triggers installed in ``database.ensure_category_stats``, so
+``GET /categories/`` can return counts by primary-key lookups instead of
+scanning tasks. Overdue counts add up the open tasks due before today plus
+today's timed tasks whose time has passed. Completed counts also include the
+occurrences folded into completion ledgers.
+
+``CategoryStatsReconciler`` periodically rebuilds each user's counters from the
+task tables, which repairs any drift from writes the triggers cannot see.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, rebuild_category_stats
+from models import Category, CategoryOpenDue, CategoryStats, Rule, RuleCompletionLedger, Task, User
+from response_cache import bump_generation
+
+
+def category_count_columns(user_id: int, now: datetime) -> Tuple:
+    """Count columns for a categories select, looked up per project row."""
+    today = now.date()
+    open_count = select(CategoryStats.open_count).where(CategoryStats.category_id == Category.id).scalar_subquery()
+    completed_count = select(CategoryStats.completed_count).where(CategoryStats.category_id == Category.id).scalar_subquery()
+    ledger_count = (
+        select(func.sum(RuleCompletionLedger.entry_count))
+        .join(Rule, Rule.id == RuleCompletionLedger.rule_id)
+        .where(Rule.category_id == Category.id)
+        .scalar_subquery()
+    )
+    overdue_before_today = (
+        select(func.sum(CategoryOpenDue.open_count))
+        .where(CategoryOpenDue.category_id == Category.id, CategoryOpenDue.due_date < today)
+        .scalar_subquery()
+    )
+    overdue_today = (
+        select(func.count())
+        .where(
+            Task.user_id == user_id,
+            Task.due_date == today,
+            Task.category_id == Category.id,
+            Task.is_completed == False,
+            Task.due_time < now.strftime("%H:%M"),
+        )
+        .scalar_subquery()
+    )
+    return (
+        func.coalesce(open_count, 0).label("open_count"),
+        (func.coalesce(completed_count, 0) + func.coalesce(ledger_count, 0)).label("completed_count"),
+        (func.coalesce(overdue_before_today, 0) + overdue_today).label("overdue_count"),
+    )
+
+
+def reconcile_category_stats(db: Session, user_id: int) -> None:
+    """Rebuild one user's counters in a single short transaction."""
+    rebuild_category_stats(db.connection(), user_id)
+    db.commit()
+    bump_generation(user_id)
+
+
+class CategoryStatsReconciler:
+    def __init__(self, interval_seconds: int = 6 * 3600):
+        self.interval_seconds = interval_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="category-stats-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def _run_loop(self) -> None:
+        # The triggers keep counters current in between, so the first pass waits one interval
+        while not self._stop_event.wait(self.interval_seconds):
+            db = SessionLocal()
+            try:
+                for (user_id,) in db.query(User.id).all():
+                    if self._stop_event.is_set():
+                        break
+                    reconcile_category_stats(db, user_id)
+            except Exception as exc:
+                print(f"Category stats reconcile error: {exc}")
+                db.rollback()
+            finally:
+                db.close()
@@ -0,0 +1,154 @@
+"""In-process change notifications for the server-sent events stream.
+
+``bump_generation`` runs after every committed change, from routes, the rule
+scheduler and the background jobs alike, and ``change_bus`` listens to it. A
+notification carries only the user id and merely wakes that user's open
+streams. Each stream then reads what changed since the last version it sent
+from the sync columns and tombstones that back ``GET /sync/``. The bus therefore
+never buffers events: a slow connection holds at most one pending wake-up, and
+it reads the next batch only after the previous one has been sent. Because
+the stream replays from the database, reconnecting with ``Last-Event-ID``
+cannot miss a change.
+
+``push_message`` carries one-off notifications, such as reminders, that have no
+row behind them. Each connection keeps the latest 100 and drops older ones.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from database import SYNC_TRACKED_TABLES, SessionLocal
+from response_cache import add_generation_listener
+
+CHANGE_STREAM_BATCH_SIZE = 500
+CHANGE_STREAM_MAX_PER_USER = 8
+CHANGE_STREAM_MAX_MESSAGES = 100
+
+
+class ChangeSubscription:
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._messages: Deque[Tuple[str, dict]] = deque(maxlen=CHANGE_STREAM_MAX_MESSAGES)
+
+    def notify(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # The connection's loop has shut down; unsubscribe follows
+            pass
+
+    def push(self, event: str, data: dict) -> None:
+        def deliver() -> None:
+            self._messages.append((event, data))
+            self._wake.set()
+
+        try:
+            self._loop.call_soon_threadsafe(deliver)
+        except RuntimeError:
+            pass
+
+    def drain(self) -> List[Tuple[str, dict]]:
+        messages = list(self._messages)
+        self._messages.clear()
+        return messages
+
+    def clear(self) -> None:
+        self._wake.clear()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a change notification; False when ``timeout`` passed without one."""
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class ChangeBus:
+    def __init__(self, max_per_user: int = CHANGE_STREAM_MAX_PER_USER):
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[int, Set[ChangeSubscription]] = {}
+
+    def subscribe(self, user_id: int) -> Optional[ChangeSubscription]:
+        """Register a stream from inside its event loop; None when the user has too many open."""
+        subscription = ChangeSubscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault(user_id, set())
+            if len(subscriptions) >= self.max_per_user:
+                return None
+            subscriptions.add(subscription)
+        return subscription
+
+    def has_capacity(self, user_id: int) -> bool:
+        with self._lock:
+            return len(self._subscriptions.get(user_id, ())) < self.max_per_user
+
+    def unsubscribe(self, subscription: ChangeSubscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.notify()
+
+    def push_message(self, user_id: int, event: str, data: dict) -> None:
+        """Send a one-off event to the user's open streams; unlike changes it is not replayed."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event, data)
+
+
+change_bus = ChangeBus()
+add_generation_listener(change_bus.publish)
+
+
+def current_change_version(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.execute(
+            text("SELECT value FROM sync_versions WHERE user_id = :user_id"), {"user_id": user_id}
+        ).scalar() or 0
+    finally:
+        db.close()
+
+
+def read_changes(user_id: int, since: int, limit: int = CHANGE_STREAM_BATCH_SIZE) -> List[Tuple[int, str, int, str]]:
+    """Up to ``limit`` (version, entity, id, op) changes after ``since``, oldest first.
+
+    ``op`` is ``upsert`` for rows that exist now and ``delete`` for tombstones. A
+    row changed several times is reported once, at its latest version.
+    """
+    params = {"user_id": user_id, "since": since, "limit": limit}
+    selects = [
+        f"SELECT * FROM (SELECT version, '{table}' AS entity, id, 'upsert' AS op FROM {table} "
+        "WHERE user_id = :user_id AND version > :since ORDER BY version LIMIT :limit)"
+        for table in SYNC_TRACKED_TABLES
+    ]
+    selects.append(
+        "SELECT * FROM (SELECT version, entity, entity_id AS id, 'delete' AS op FROM sync_tombstones "
+        "WHERE user_id = :user_id AND version > :since ORDER BY version LIMIT :limit)"
+    )
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text(" UNION ALL ".join(selects) + " ORDER BY version LIMIT :limit"), params
+        ).fetchall()
+    finally:
+        db.close()
+    return [tuple(row) for row in rows]
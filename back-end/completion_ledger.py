@@ -0,0 +1,250 @@
+"""Compact completion history for rule-generated tasks.
+
+A completed past occurrence that still matches its rule exactly (inherited title
+and description, the rule's project, no icon, colour or end) carries no
+information beyond its date and time. Compaction replaces such rows, hot or
+archived, with one ``RuleCompletionLedger`` per rule and time of day: a bitmap with
+one bit per day since the ledger's first date. A daily rule's year of history
+shrinks from 365 rows plus index entries to about 46 bytes.
+
+Read endpoints expand ledgers back into task dicts, shaped like ``TASK_COLUMNS``
+rows, for windows that reach past the archive horizon. Expanded occurrences have
+no id, so they are read-only history; ``completed_at`` and ``created_at`` are not
+kept. Compaction is opt-in per rule through ``POST /rules/{id}/compact-history``,
+or for everyone by the task archiver when ``TASK_LEDGER_COMPACTION`` is set.
+"""
+from __future__ import annotations
+
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+
+from models import ArchivedTask, RollupDirtyDay, Rule, RuleCompletionLedger, Task
+from response_cache import bump_generation
+from task_archive import archive_cutoff
+
+TASK_LEDGER_COMPACTION = os.getenv("TASK_LEDGER_COMPACTION", "0").lower() in {"1", "true", "yes"}
+LEDGER_DELETE_CHUNK_SIZE = 500
+
+
+def encode_dates(dates: Iterable[date]) -> Tuple[date, bytes]:
+    """Encode dates as (first date, little-endian bitmap of day offsets)."""
+    ordered = sorted(set(dates))
+    start_date = ordered[0]
+    bits = 0
+    for value in ordered:
+        bits |= 1 << (value - start_date).days
+    offset_span = (ordered[-1] - start_date).days
+    return start_date, bits.to_bytes(offset_span // 8 + 1, "little")
+
+
+def iter_ledger_dates(start_date: date, bitmap: bytes) -> Iterator[date]:
+    """Yield the dates marked in a ledger bitmap, in ascending order."""
+    for byte_index, byte in enumerate(bitmap):
+        while byte:
+            low_bit = byte & -byte
+            yield start_date + timedelta(days=byte_index * 8 + low_bit.bit_length() - 1)
+            byte ^= low_bit
+
+
+def _compactable_filters(model, rule: Rule, cutoff: date) -> List:
+    return [
+        model.rule_id == rule.id,
+        model.user_id == rule.user_id,
+        model.is_completed == True,
+        model.due_date.isnot(None),
+        model.due_date < cutoff,
+        model.end_date.is_(None),
+        model.end_time.is_(None),
+        model.icon.is_(None),
+        model.color.is_(None),
+        or_(model.title == "", model.title == rule.name),
+        or_(model.description.is_(None), model.description == rule.description),
+        model.category_id == rule.category_id,
+    ]
+
+
+def compact_rule_history(db: Session, rule: Rule, cutoff: Optional[date] = None) -> int:
+    """Fold a rule's compactable completed occurrences into its ledgers; caller commits.
+
+    Only occurrences due before the archive cutoff are touched, so the rule engine
+    still sees every row it might otherwise regenerate. Returns the rows removed.
+    """
+    cutoff = cutoff or archive_cutoff()
+    dates_by_time: Dict[str, Set[date]] = {}
+    ids_by_model: Dict[type, List[int]] = {}
+    for model in (Task, ArchivedTask):
+        rows = db.query(model.id, model.due_date, model.due_time).filter(*_compactable_filters(model, rule, cutoff)).all()
+        for task_id, due_date, due_time in rows:
+            dates_by_time.setdefault(due_time or "", set()).add(due_date)
+            ids_by_model.setdefault(model, []).append(task_id)
+
+    if not dates_by_time:
+        return 0
+
+    ledgers = {
+        ledger.due_time: ledger
+        for ledger in db.query(RuleCompletionLedger).filter(RuleCompletionLedger.rule_id == rule.id).all()
+    }
+    for due_time, dates in dates_by_time.items():
+        ledger = ledgers.get(due_time)
+        if ledger is None:
+            ledger = RuleCompletionLedger(rule_id=rule.id, user_id=rule.user_id, due_time=due_time)
+            db.add(ledger)
+        else:
+            dates |= set(iter_ledger_dates(ledger.start_date, ledger.bitmap))
+        ledger.start_date, ledger.bitmap = encode_dates(dates)
+        ledger.entry_count = len(dates)
+
+    removed = 0
+    for model, task_ids in ids_by_model.items():
+        for index in range(0, len(task_ids), LEDGER_DELETE_CHUNK_SIZE):
+            chunk = task_ids[index:index + LEDGER_DELETE_CHUNK_SIZE]
+            db.query(model).filter(model.id.in_(chunk)).delete(synchronize_session=False)
+        removed += len(task_ids)
+    return removed
+
+
+def compact_completion_history(
+    db: Session,
+    user_id: Optional[int] = None,
+    rule_ids: Optional[Iterable[int]] = None,
+) -> Dict[str, int]:
+    """Compact history rule by rule, committing after each so the write lock stays short."""
+    query = db.query(Rule)
+    if user_id is not None:
+        query = query.filter(Rule.user_id == user_id)
+    if rule_ids is not None:
+        query = query.filter(Rule.id.in_(list(rule_ids)))
+
+    cutoff = archive_cutoff()
+    rules_compacted = 0
+    tasks_compacted = 0
+    for rule in query.all():
+        removed = compact_rule_history(db, rule, cutoff)
+        if not removed:
+            continue
+        db.commit()
+        bump_generation(rule.user_id)
+        rules_compacted += 1
+        tasks_compacted += removed
+
+    return {"rules_compacted": rules_compacted, "tasks_compacted": tasks_compacted}
+
+
+def iter_ledger_tasks(
+    db: Session,
+    user_id: int,
+    window_start: Optional[date] = None,
+    window_end: Optional[date] = None,
+) -> Iterator[Dict[str, object]]:
+    """Expand a user's ledgers into task dicts dated within the window.
+
+    Compacted occurrences have no task row, so their ``id`` is the string
+    ``ledger-<rule_id>-<due_date>``: unique in a listing, never a valid task id
+    for the write routes, and easy for clients to tell from real tasks.
+    """
+    rows = (
+        db.query(
+            RuleCompletionLedger.rule_id,
+            RuleCompletionLedger.due_time,
+            RuleCompletionLedger.start_date,
+            RuleCompletionLedger.bitmap,
+            Rule.name,
+            Rule.description,
+            Rule.category_id,
+        )
+        .join(Rule, Rule.id == RuleCompletionLedger.rule_id)
+        .filter(RuleCompletionLedger.user_id == user_id)
+        .all()
+    )
+    for rule_id, due_time, start_date, bitmap, name, description, category_id in rows:
+        for due_date in iter_ledger_dates(start_date, bitmap):
+            if window_start and due_date < window_start:
+                continue
+            if window_end and due_date > window_end:
+                break
+            yield {
+                "id": f"ledger-{rule_id}-{due_date.isoformat()}",
+                "title": name,
+                "icon": None,
+                "color": None,
+                "description": description,
+                "category_id": category_id,
+                "rule_id": rule_id,
+                "user_id": user_id,
+                "is_completed": True,
+                "due_date": due_date,
+                "due_time": due_time or None,
+                "end_date": None,
+                "end_time": None,
+                "created_at": None,
+                "completed_at": None,
+                "version": None,
+            }
+
+
+def mark_ledger_days_dirty(db: Session, rule_ids: List[int]) -> None:
+    """Queue every day recorded in the rules' ledgers for the daily rollup job.
+
+    Task writes are queued by triggers; ledgers need this when their rule moves to
+    another project or the ledger is dropped without materializing.
+    """
+    if not rule_ids:
+        return
+    rows = (
+        db.query(RuleCompletionLedger.user_id, RuleCompletionLedger.start_date, RuleCompletionLedger.bitmap)
+        .filter(RuleCompletionLedger.rule_id.in_(rule_ids))
+        .all()
+    )
+    days = {(user_id, day) for user_id, start_date, bitmap in rows for day in iter_ledger_dates(start_date, bitmap)}
+    if days:
+        db.execute(
+            insert(RollupDirtyDay).prefix_with("OR IGNORE"),
+            [{"user_id": user_id, "day": day} for user_id, day in days],
+        )
+
+
+def release_rule_ledgers(db: Session, rule_ids: List[int], materialize: bool) -> int:
+    """Drop the ledgers of rules being deleted; caller commits.
+
+    With ``materialize`` the recorded occurrences first become ordinary completed
+    tasks carrying the rule's title, so orphaning a rule keeps its history.
+    """
+    if not rule_ids:
+        return 0
+    ledgers = db.query(RuleCompletionLedger).filter(RuleCompletionLedger.rule_id.in_(rule_ids)).all()
+    if not ledgers:
+        return 0
+
+    created = 0
+    if materialize:
+        rules = {rule.id: rule for rule in db.query(Rule).filter(Rule.id.in_(rule_ids)).all()}
+        mappings = []
+        for ledger in ledgers:
+            rule = rules.get(ledger.rule_id)
+            if rule is None:
+                continue
+            for due_date in iter_ledger_dates(ledger.start_date, ledger.bitmap):
+                mappings.append({
+                    "title": rule.name,
+                    "description": rule.description,
+                    "category_id": rule.category_id,
+                    "rule_id": rule.id,
+                    "user_id": rule.user_id,
+                    "is_completed": True,
+                    "due_date": due_date,
+                    "due_time": ledger.due_time or None,
+                })
+        if mappings:
+            db.bulk_insert_mappings(Task, mappings)
+        created = len(mappings)
+
+    else:
+        mark_ledger_days_dirty(db, rule_ids)
+
+    db.query(RuleCompletionLedger).filter(RuleCompletionLedger.rule_id.in_(rule_ids)).delete(synchronize_session=False)
+    return created
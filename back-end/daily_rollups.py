@@ -0,0 +1,201 @@
+"""Pre-aggregated daily task counts for the analytics endpoints.
+
+``task_daily_rollups`` holds per user, due day, project and rule the number of
+tasks, how many of them a rule generated and how many were completed. Missed
+counts are derived at query time as the incomplete tasks of days before today.
+
+Triggers queue every (user, day) touched by a task write in
+``rollup_dirty_days``. ``RollupWorker`` folds only those days back in by
+recomputing them from the hot and archived tasks plus the completion ledgers,
+so the job costs the size of the change rather than the history. Rebuild
+everything with::
+
+    python -m daily_rollups rebuild [--user-id ID]
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from completion_ledger import iter_ledger_dates
+from database import TASK_TABLES, Base, SessionLocal, engine, ensure_schema_updates
+from models import RollupDirtyDay, Rule, RuleCompletionLedger
+from response_cache import bump_generation
+
+ROLLUP_FOLD_BATCH_DAYS = 500
+
+_TASK_ROWS = " UNION ALL ".join(
+    f"SELECT user_id, due_date, category_id, rule_id, is_completed FROM {table}" for table in TASK_TABLES
+)
+
+_UPSERT_LEDGER_COUNTS = text(
+    "INSERT INTO task_daily_rollups "
+    "(user_id, day, category_id, rule_id, task_count, generated_count, completed_count) "
+    "VALUES (:user_id, :day, :category_id, :rule_id, :count, :count, :count) "
+    "ON CONFLICT(user_id, day, category_id, rule_id) DO UPDATE SET "
+    "task_count = task_count + excluded.task_count, "
+    "generated_count = generated_count + excluded.generated_count, "
+    "completed_count = completed_count + excluded.completed_count"
+)
+
+
+def _fold_days(db: Session, user_id: int, days: Optional[Set[date]]) -> None:
+    """Recompute a user's rollups for ``days`` (all days when None) in the caller's transaction."""
+    params: Dict[str, object] = {"user_id": user_id}
+    day_filter = ""
+    if days is not None:
+        params["days"] = [day.isoformat() for day in sorted(days)]
+        day_filter = "AND due_date IN :days"
+
+    delete_sql = "DELETE FROM task_daily_rollups WHERE user_id = :user_id"
+    insert_sql = (
+        "INSERT INTO task_daily_rollups "
+        "(user_id, day, category_id, rule_id, task_count, generated_count, completed_count) "
+        "SELECT user_id, due_date, COALESCE(category_id, 0), COALESCE(rule_id, 0), COUNT(*), "
+        "SUM(rule_id IS NOT NULL), SUM(COALESCE(is_completed, 0) != 0) "
+        f"FROM ({_TASK_ROWS}) WHERE user_id = :user_id AND due_date IS NOT NULL {day_filter} "
+        "GROUP BY due_date, COALESCE(category_id, 0), COALESCE(rule_id, 0)"
+    )
+    if days is not None:
+        delete_sql += " AND day IN :days"
+        db.execute(text(delete_sql).bindparams(bindparam("days", expanding=True)), params)
+        db.execute(text(insert_sql).bindparams(bindparam("days", expanding=True)), params)
+    else:
+        db.execute(text(delete_sql), params)
+        db.execute(text(insert_sql), params)
+
+    # Compacted occurrences are completed, rule-generated tasks filed under the rule's project
+    ledger_counts: Counter = Counter()
+    ledgers = (
+        db.query(RuleCompletionLedger.rule_id, RuleCompletionLedger.start_date, RuleCompletionLedger.bitmap, Rule.category_id)
+        .join(Rule, Rule.id == RuleCompletionLedger.rule_id)
+        .filter(RuleCompletionLedger.user_id == user_id)
+        .all()
+    )
+    for rule_id, start_date, bitmap, category_id in ledgers:
+        for day in iter_ledger_dates(start_date, bitmap):
+            if days is None or day in days:
+                ledger_counts[(day, category_id or 0, rule_id)] += 1
+    if ledger_counts:
+        db.execute(
+            _UPSERT_LEDGER_COUNTS,
+            [
+                {"user_id": user_id, "day": day.isoformat(), "category_id": category_id, "rule_id": rule_id, "count": count}
+                for (day, category_id, rule_id), count in ledger_counts.items()
+            ],
+        )
+
+
+def fold_dirty_rollups(db: Session, batch_days: int = ROLLUP_FOLD_BATCH_DAYS) -> Dict[str, int]:
+    """Recompute one batch of queued days and commit; returns how many were folded."""
+    dirty = db.query(RollupDirtyDay.user_id, RollupDirtyDay.day).limit(batch_days).all()
+    if not dirty:
+        return {"folded": 0}
+
+    days_by_user: Dict[int, Set[date]] = {}
+    for user_id, day in dirty:
+        days_by_user.setdefault(user_id, set()).add(day)
+
+    for user_id, days in days_by_user.items():
+        _fold_days(db, user_id, days)
+        db.execute(
+            text("DELETE FROM rollup_dirty_days WHERE user_id = :user_id AND day IN :days").bindparams(
+                bindparam("days", expanding=True)
+            ),
+            {"user_id": user_id, "days": [day.isoformat() for day in sorted(days)]},
+        )
+    db.commit()
+
+    for user_id in days_by_user:
+        bump_generation(user_id)
+    return {"folded": len(dirty)}
+
+
+def rebuild_rollups(db: Session, user_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """Recompute all rollups from scratch, one user per transaction."""
+    if user_ids is None:
+        user_ids = [
+            row[0]
+            for row in db.execute(text(" UNION ".join(f"SELECT DISTINCT user_id FROM {table}" for table in TASK_TABLES)))
+        ]
+
+    rebuilt = 0
+    for user_id in user_ids:
+        _fold_days(db, user_id, None)
+        db.query(RollupDirtyDay).filter(RollupDirtyDay.user_id == user_id).delete(synchronize_session=False)
+        db.commit()
+        bump_generation(user_id)
+        rebuilt += 1
+    return {"users_rebuilt": rebuilt}
+
+
+class RollupWorker:
+    def __init__(self, interval_seconds: int = 300, batch_days: int = ROLLUP_FOLD_BATCH_DAYS):
+        self.interval_seconds = interval_seconds
+        self.batch_days = batch_days
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="rollup-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.is_set():
+            db = SessionLocal()
+            try:
+                while not self._stop_event.is_set():
+                    if fold_dirty_rollups(db, self.batch_days)["folded"] < self.batch_days:
+                        break
+                    self._stop_event.wait(0.05)
+            except Exception as exc:
+                print(f"Rollup worker error: {exc}")
+                db.rollback()
+            finally:
+                db.close()
+
+            self._stop_event.wait(self.interval_seconds)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the daily task rollups.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="Recompute rollups from the task tables")
+    rebuild.add_argument("--user-id", type=int, action="append", help="Only rebuild this user (repeatable)")
+    subcommands.add_parser("fold", help="Fold all queued days now")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_schema_updates()
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(rebuild_rollups(db, args.user_id))
+        else:
+            folded = 0
+            while True:
+                batch = fold_dirty_rollups(db)["folded"]
+                folded += batch
+                if batch < ROLLUP_FOLD_BATCH_DAYS:
+                    break
+            print({"folded": folded})
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
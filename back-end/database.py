@@ -1,14 +1,46 @@
 """Database configuration and session management."""
-from sqlalchemy import create_engine, text
+from contextlib import contextmanager
+from datetime import date
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 
 # Database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./instance/data.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+
+def _enable_wal(dbapi_connection, _connection_record):
+    # With the default rollback journal a reader holds a lock that blocks every write,
+    # so one slow streamed export in read_snapshot would stall all routes and jobs.
+    # Under WAL readers keep their snapshot while writers commit; the mode persists
+    # in the database file.
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    finally:
+        cursor.close()
+
+
+event.listen(engine, "connect", _enable_wal)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Tables whose rows carry a per-user change version and leave tombstones when deleted
+SYNC_TRACKED_TABLES = ("tasks", "events", "rules", "categories")
+# Hot and archived task tables, both covered by project counters and daily rollups
+TASK_TABLES = ("tasks", "tasks_archive")
+# Tables indexed for full-text search; search_index rowids are id * 4 + the table's code
+SEARCH_INDEXED_TABLES = {
+    "tasks": (0, "title", "description"),
+    "tasks_archive": (1, "title", "description"),
+    "rules": (2, "name", "description"),
+}
+# Range reads look back this far for events that started before the window; longer
+# events are found through a partial index instead
+EVENT_LOOKBACK_DAYS = 7
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -18,6 +50,23 @@ def get_db():
         db.close()
 
 
+@contextmanager
+def read_snapshot(db):
+    """Run the enclosed queries inside a single SQLite read transaction.
+
+    pysqlite only opens transactions ahead of writes, so consecutive SELECTs on one
+    session can otherwise observe different commits. The explicit BEGIN keeps one
+    snapshot until the block exits and the session rolls back. The database runs
+    in WAL mode, so writers are not blocked while a snapshot is open.
+    """
+    connection = db.connection()
+    connection.exec_driver_sql("BEGIN")
+    try:
+        yield connection
+    finally:
+        db.rollback()
+
+
 def ensure_schema_updates():
     """Apply lightweight schema updates for existing SQLite databases."""
     with engine.connect() as connection:
@@ -28,6 +77,10 @@ def ensure_schema_updates():
             connection.execute(text("ALTER TABLE users ADD COLUMN avatar VARCHAR(10)"))
             connection.commit()
 
+        if "token_version" not in user_columns:
+            connection.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+            connection.commit()
+
         # Add end_date column to tasks if missing
         task_info = connection.execute(text("PRAGMA table_info(tasks)")).fetchall()
         task_columns = {row[1] for row in task_info}
@@ -86,6 +139,10 @@ def ensure_schema_updates():
             connection.execute(text("ALTER TABLE rules ADD COLUMN color VARCHAR(7)"))
             connection.commit()
 
+        if "event_duration_minutes" not in rule_columns:
+            connection.execute(text("ALTER TABLE rules ADD COLUMN event_duration_minutes INTEGER"))
+            connection.commit()
+
         user_data_info = connection.execute(text("PRAGMA table_info(user_data)")).fetchall()
         user_data_columns = {row[1] for row in user_data_info}
 
@@ -93,6 +150,60 @@ def ensure_schema_updates():
             connection.execute(text("ALTER TABLE user_data ADD COLUMN calendar_view VARCHAR(20) DEFAULT 'month'"))
             connection.commit()
 
+        ensure_sync_tracking(connection)
+        ensure_id_sequences(connection)
+
+        # Archive tier: the archiver scans by completion time, windowed reads by due date
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_completed_at ON tasks (completed_at)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_user_due ON tasks (user_id, due_date)"))
+        connection.execute(
+            text("CREATE INDEX IF NOT EXISTS ix_tasks_archive_user_due ON tasks_archive (user_id, due_date)")
+        )
+        connection.commit()
+
+        # Reminder dispatcher: range scans over upcoming due instants across users
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_tasks_due_instant ON tasks (due_date, due_time) "
+                "WHERE due_time IS NOT NULL"
+            )
+        )
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_events_start_time ON events (start_time)"))
+        connection.commit()
+
+        # Event range reads: starts inside the lookback window, plus the few events longer than it
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_events_user_start ON events (user_id, start_time)"))
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_events_user_long ON events (user_id, start_time) "
+                f"WHERE end_time > datetime(start_time, '+{EVENT_LOOKBACK_DAYS} days')"
+            )
+        )
+        connection.commit()
+
+        cascade_job_info = connection.execute(text("PRAGMA table_info(cascade_jobs)")).fetchall()
+        if "inherited_fields" not in {row[1] for row in cascade_job_info}:
+            connection.execute(text("ALTER TABLE cascade_jobs ADD COLUMN inherited_fields TEXT DEFAULT '{}'"))
+            connection.commit()
+
+        connection.execute(
+            text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_rule_completion_ledgers_rule_time "
+                "ON rule_completion_ledgers (rule_id, due_time)"
+            )
+        )
+        connection.commit()
+
+        ledger_info = connection.execute(text("PRAGMA table_info(rule_completion_ledgers)")).fetchall()
+        if "entry_count" not in {row[1] for row in ledger_info}:
+            connection.execute(text("ALTER TABLE rule_completion_ledgers ADD COLUMN entry_count INTEGER DEFAULT 0"))
+            backfill_ledger_entry_counts(connection)
+            connection.commit()
+
+        ensure_category_stats(connection)
+        ensure_rollup_tracking(connection)
+        ensure_search_index(connection)
+
         users_with_uncategorized_rules = connection.execute(
             text("SELECT DISTINCT user_id FROM rules WHERE category_id IS NULL")
         ).fetchall()
@@ -140,3 +251,404 @@ def ensure_schema_updates():
                 )
 
         connection.commit()
+
+
+def ensure_sync_tracking(connection):
+    """Install change-version columns and triggers backing the delta sync endpoint.
+
+    Every insert or update on a tracked table takes the next value of the owning
+    user's counter in ``sync_versions``; every delete records a tombstone with its
+    own version. Doing this in triggers covers ORM writes, bulk query updates and
+    deletes, and the rule engine alike.
+    """
+    for table in SYNC_TRACKED_TABLES:
+        columns = {row[1] for row in connection.execute(text(f"PRAGMA table_info({table})")).fetchall()}
+        if "version" not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER"))
+
+        # Rows written before tracking existed are reported once by a full sync (since=0)
+        connection.execute(text(f"UPDATE {table} SET version = 1 WHERE version IS NULL"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_user_version ON {table} (user_id, version)"))
+
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_sync_insert AFTER INSERT ON {table} BEGIN "
+                "INSERT INTO sync_versions (user_id, value) VALUES (NEW.user_id, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET value = value + 1; "
+                f"UPDATE {table} SET version = (SELECT value FROM sync_versions WHERE user_id = NEW.user_id) "
+                "WHERE id = NEW.id; "
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_sync_update AFTER UPDATE ON {table} "
+                "WHEN NEW.version IS OLD.version BEGIN "
+                "INSERT INTO sync_versions (user_id, value) VALUES (NEW.user_id, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET value = value + 1; "
+                f"UPDATE {table} SET version = (SELECT value FROM sync_versions WHERE user_id = NEW.user_id) "
+                "WHERE id = NEW.id; "
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_sync_delete AFTER DELETE ON {table} BEGIN "
+                "INSERT INTO sync_versions (user_id, value) VALUES (OLD.user_id, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET value = value + 1; "
+                "INSERT INTO sync_tombstones (entity, entity_id, user_id, version, deleted_at) "
+                f"VALUES ('{table}', OLD.id, OLD.user_id, "
+                "(SELECT value FROM sync_versions WHERE user_id = OLD.user_id), CURRENT_TIMESTAMP); "
+                "END"
+            )
+        )
+
+    connection.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_sync_tombstones_user_version ON sync_tombstones (user_id, version)")
+    )
+    # Users whose rows were backfilled above must not hand out version 1 again
+    connection.execute(
+        text(
+            "INSERT INTO sync_versions (user_id, value) "
+            "SELECT id, 1 FROM users WHERE id NOT IN (SELECT user_id FROM sync_versions)"
+        )
+    )
+    connection.commit()
+
+
+# Queries for the highest id each table has ever handed out that something may still
+# refer to: its own rows, rows pointing at it, and cascade jobs still working on it
+ID_SEQUENCE_SEEDS = {
+    "tasks": (
+        "SELECT MAX(id) FROM tasks",
+        "SELECT MAX(id) FROM tasks_archive",
+    ),
+    "categories": (
+        "SELECT MAX(id) FROM categories",
+        "SELECT MAX(category_id) FROM tasks",
+        "SELECT MAX(category_id) FROM tasks_archive",
+        "SELECT MAX(category_id) FROM rules",
+        "SELECT MAX(category_id) FROM events",
+        "SELECT MAX(target_id) FROM cascade_jobs WHERE kind = 'category'",
+    ),
+    "rules": (
+        "SELECT MAX(id) FROM rules",
+        "SELECT MAX(rule_id) FROM tasks",
+        "SELECT MAX(rule_id) FROM tasks_archive",
+        "SELECT MAX(rule_id) FROM events",
+        "SELECT MAX(target_id) FROM cascade_jobs WHERE kind = 'rule'",
+        "SELECT MAX(value) FROM cascade_jobs, json_each(cascade_jobs.rule_ids)",
+    ),
+}
+
+
+def backfill_ledger_entry_counts(connection) -> None:
+    """Count the dates in ledgers written before ``entry_count`` existed."""
+    from completion_ledger import iter_ledger_dates  # imports models, which import Base from here
+
+    ledgers = connection.execute(text("SELECT id, start_date, bitmap FROM rule_completion_ledgers")).fetchall()
+    counts = [
+        {"id": ledger_id, "entry_count": sum(1 for _ in iter_ledger_dates(date.fromisoformat(start_date), bitmap))}
+        for ledger_id, start_date, bitmap in ledgers
+    ]
+    if counts:
+        connection.execute(text("UPDATE rule_completion_ledgers SET entry_count = :entry_count WHERE id = :id"), counts)
+
+
+def ensure_id_sequences(connection):
+    """Rebuild tables with AUTOINCREMENT where an older database created them without.
+
+    Without it SQLite hands the highest id out again once that row is deleted or
+    archived. A new task could then overwrite an archived one. A new project or
+    rule could also inherit the tasks that a still-running cascade job is
+    deleting under the old id. Each sequence is seeded from
+    ``ID_SEQUENCE_SEEDS``, so new ids start above every id still referenced.
+    """
+    from models import Category, Rule, Task  # models imports Base from this module
+
+    for model in (Task, Category, Rule):
+        _rebuild_with_autoincrement(connection, model.__table__)
+    connection.commit()
+
+
+def _rebuild_with_autoincrement(connection, table):
+    # Indexes and triggers are recreated from their stored SQL; dropping the old
+    # table fires no delete triggers
+    name = table.name
+    table_sql = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+    ).scalar()
+    if table_sql is None or "AUTOINCREMENT" in table_sql.upper():
+        return
+
+    dependents = connection.execute(
+        text(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = :name AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+        ),
+        {"name": name},
+    ).scalars().all()
+    existing = {row[1] for row in connection.execute(text(f"PRAGMA table_info({name})")).fetchall()}
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+    create_sql = str(CreateTable(table).compile(dialect=engine.dialect))
+
+    connection.execute(text(create_sql.replace(f"CREATE TABLE {name}", f"CREATE TABLE {name}_rebuild", 1)))
+    connection.execute(text(f"INSERT INTO {name}_rebuild ({columns}) SELECT {columns} FROM {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
+    # Triggers on other tables name this one; the legacy rename does not re-check
+    # them while it is missing, and the name they use is restored here
+    connection.execute(text("PRAGMA legacy_alter_table = ON"))
+    try:
+        connection.execute(text(f"ALTER TABLE {name}_rebuild RENAME TO {name}"))
+    finally:
+        connection.execute(text("PRAGMA legacy_alter_table = OFF"))
+    for statement in dependents:
+        connection.execute(text(statement))
+
+    seeds = " UNION ALL ".join(f"SELECT ({query}) AS id" for query in ID_SEQUENCE_SEEDS[name])
+    highest = connection.execute(text(f"SELECT MAX(id) FROM ({seeds})")).scalar()
+    if highest is not None:
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": name})
+        connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": name, "seq": highest})
+
+
+def _category_stats_add_sql(row):
+    return (
+        "INSERT INTO category_stats (category_id, user_id, open_count, completed_count) "
+        f"SELECT {row}.category_id, {row}.user_id, COALESCE({row}.is_completed, 0) = 0, COALESCE({row}.is_completed, 0) != 0 "
+        f"WHERE {row}.category_id IS NOT NULL AND EXISTS (SELECT 1 FROM categories WHERE id = {row}.category_id) "
+        "ON CONFLICT(category_id) DO UPDATE SET open_count = open_count + excluded.open_count, "
+        "completed_count = completed_count + excluded.completed_count; "
+        "INSERT INTO category_open_due (category_id, due_date, open_count) "
+        f"SELECT {row}.category_id, {row}.due_date, 1 "
+        f"WHERE {row}.category_id IS NOT NULL AND {row}.due_date IS NOT NULL AND COALESCE({row}.is_completed, 0) = 0 "
+        f"AND EXISTS (SELECT 1 FROM categories WHERE id = {row}.category_id) "
+        "ON CONFLICT(category_id, due_date) DO UPDATE SET open_count = open_count + 1; "
+    )
+
+
+def _category_stats_remove_sql(row):
+    # Decrements never insert, so a deleted project's counters are not recreated
+    return (
+        "UPDATE category_stats SET "
+        f"open_count = open_count - (COALESCE({row}.is_completed, 0) = 0), "
+        f"completed_count = completed_count - (COALESCE({row}.is_completed, 0) != 0) "
+        f"WHERE category_id = {row}.category_id; "
+        "UPDATE category_open_due SET open_count = open_count - 1 "
+        f"WHERE category_id = {row}.category_id AND due_date = {row}.due_date AND COALESCE({row}.is_completed, 0) = 0; "
+        "DELETE FROM category_open_due "
+        f"WHERE category_id = {row}.category_id AND due_date = {row}.due_date AND open_count <= 0; "
+    )
+
+
+def ensure_category_stats(connection):
+    """Install the triggers that keep ``category_stats`` and ``category_open_due`` current.
+
+    Creating, completing, reopening, moving, rescheduling, archiving and deleting a
+    task each adjust the counters of the projects involved, whichever code path
+    writes the row. Counters are rebuilt from scratch on first install.
+    """
+    for table in TASK_TABLES:
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_category_stats_insert AFTER INSERT ON {table} BEGIN "
+                f"{_category_stats_add_sql('NEW')}"
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_category_stats_delete AFTER DELETE ON {table} BEGIN "
+                f"{_category_stats_remove_sql('OLD')}"
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_category_stats_update "
+                f"AFTER UPDATE OF category_id, is_completed, due_date ON {table} "
+                "WHEN OLD.category_id IS NOT NEW.category_id OR OLD.is_completed IS NOT NEW.is_completed "
+                "OR OLD.due_date IS NOT NEW.due_date BEGIN "
+                f"{_category_stats_remove_sql('OLD')}"
+                f"{_category_stats_add_sql('NEW')}"
+                "END"
+            )
+        )
+
+    connection.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS categories_category_stats_delete AFTER DELETE ON categories BEGIN "
+            "DELETE FROM category_stats WHERE category_id = OLD.id; "
+            "DELETE FROM category_open_due WHERE category_id = OLD.id; "
+            "END"
+        )
+    )
+
+    has_stats = connection.execute(text("SELECT 1 FROM category_stats LIMIT 1")).first()
+    has_categories = connection.execute(text("SELECT 1 FROM categories LIMIT 1")).first()
+    if has_categories and not has_stats:
+        rebuild_category_stats(connection)
+    connection.commit()
+
+
+def rebuild_category_stats(connection, user_id=None):
+    """Recompute a user's (or every user's) project counters from the task tables.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    params = {} if user_id is None else {"user_id": user_id}
+    user_filter = "" if user_id is None else "AND c.user_id = :user_id"
+    counted_rows = " UNION ALL ".join(
+        f"SELECT category_id, is_completed, due_date FROM {table}" for table in TASK_TABLES
+    )
+
+    if user_id is None:
+        connection.execute(text("DELETE FROM category_stats"))
+        connection.execute(text("DELETE FROM category_open_due"))
+    else:
+        connection.execute(text("DELETE FROM category_stats WHERE user_id = :user_id"), params)
+        connection.execute(
+            text("DELETE FROM category_open_due WHERE category_id IN (SELECT id FROM categories WHERE user_id = :user_id)"),
+            params,
+        )
+
+    connection.execute(
+        text(
+            "INSERT INTO category_stats (category_id, user_id, open_count, completed_count) "
+            "SELECT c.id, c.user_id, "
+            "COALESCE(SUM(t.category_id IS NOT NULL AND COALESCE(t.is_completed, 0) = 0), 0), "
+            "COALESCE(SUM(COALESCE(t.is_completed, 0) != 0), 0) "
+            f"FROM categories c LEFT JOIN ({counted_rows}) t ON t.category_id = c.id "
+            f"WHERE 1 = 1 {user_filter} GROUP BY c.id"
+        ),
+        params,
+    )
+    connection.execute(
+        text(
+            "INSERT INTO category_open_due (category_id, due_date, open_count) "
+            "SELECT t.category_id, t.due_date, COUNT(*) "
+            f"FROM ({counted_rows}) t JOIN categories c ON c.id = t.category_id "
+            f"WHERE t.due_date IS NOT NULL AND COALESCE(t.is_completed, 0) = 0 {user_filter} "
+            "GROUP BY t.category_id, t.due_date"
+        ),
+        params,
+    )
+
+
+def ensure_rollup_tracking(connection):
+    """Install the triggers that queue (user, day) pairs for the daily rollup job.
+
+    Any write that can change a day's counts marks the old and the new due day
+    dirty; the job in ``daily_rollups`` recomputes only those days. On first
+    install every day that has tasks is queued.
+    """
+    def mark_dirty(row):
+        return (
+            "INSERT OR IGNORE INTO rollup_dirty_days (user_id, day) "
+            f"SELECT {row}.user_id, {row}.due_date WHERE {row}.due_date IS NOT NULL; "
+        )
+
+    installed = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'tasks_rollup_insert'")
+    ).first()
+
+    for table in TASK_TABLES:
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_rollup_insert AFTER INSERT ON {table} BEGIN "
+                f"{mark_dirty('NEW')}"
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_rollup_delete AFTER DELETE ON {table} BEGIN "
+                f"{mark_dirty('OLD')}"
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_rollup_update "
+                f"AFTER UPDATE OF due_date, is_completed, category_id, rule_id ON {table} BEGIN "
+                f"{mark_dirty('OLD')}"
+                f"{mark_dirty('NEW')}"
+                "END"
+            )
+        )
+
+    if not installed:
+        for table in TASK_TABLES:
+            connection.execute(
+                text(
+                    "INSERT OR IGNORE INTO rollup_dirty_days (user_id, day) "
+                    f"SELECT DISTINCT user_id, due_date FROM {table} WHERE due_date IS NOT NULL"
+                )
+            )
+    connection.commit()
+
+
+def _search_index_row_sql(row, table):
+    code, title_column, description_column = SEARCH_INDEXED_TABLES[table]
+    # Delete first: indexes built before the archiver used a plain INSERT can still hold
+    # entries for rows it replaced, and a duplicate rowid would abort the write
+    return (
+        f"DELETE FROM search_index WHERE rowid = {row}.id * 4 + {code}; "
+        "INSERT INTO search_index (rowid, owner, title, description) "
+        f"SELECT {row}.id * 4 + {code}, 'u' || {row}.user_id, {row}.{title_column}, {row}.{description_column} "
+        f"WHERE {row}.{title_column} != '' OR {row}.{description_column} IS NOT NULL; "
+    )
+
+
+def ensure_search_index(connection):
+    """Create the FTS5 ``search_index`` over task and rule text and the triggers feeding it.
+
+    ``owner`` holds ``u<user_id>`` so a user's rows are found through the index
+    rather than by filtering every match. Rule-generated tasks store no text of
+    their own and are only indexed once they override it; search reaches them
+    through their rule's row. The index is filled from existing rows on first install.
+    """
+    installed = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    ).first()
+    if not installed:
+        connection.execute(
+            text(
+                "CREATE VIRTUAL TABLE search_index USING fts5("
+                "owner, title, description, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+            )
+        )
+
+    for table, (code, title_column, description_column) in SEARCH_INDEXED_TABLES.items():
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+                f"{_search_index_row_sql('NEW', table)}"
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+                f"DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code}; "
+                "END"
+            )
+        )
+        connection.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_search_update "
+                f"AFTER UPDATE OF {title_column}, {description_column}, user_id ON {table} BEGIN "
+                f"DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code}; "
+                f"{_search_index_row_sql('NEW', table)}"
+                "END"
+            )
+        )
+
+        if not installed:
+            connection.execute(
+                text(
+                    "INSERT INTO search_index (rowid, owner, title, description) "
+                    f"SELECT id * 4 + {code}, 'u' || user_id, {title_column}, {description_column} FROM {table} "
+                    f"WHERE {title_column} != '' OR {description_column} IS NOT NULL"
+                )
+            )
+    connection.commit()
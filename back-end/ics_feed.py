@@ -0,0 +1,231 @@
+"""iCalendar rendering of a user's schedule for subscription feeds.
+
+The feed holds one VEVENT per event, per dated standalone task, and per rule
+segment. A segment whose ``rate_pattern`` maps exactly onto RFC 5545 becomes
+a recurring VEVENT with an RRULE. Any other segment, such as a yearly rule
+whose dates are not a month-by-day cross product, is expanded into single
+occurrences over the feed window. Tasks and events generated by active rules
+are left out because the rule series already shows them, and event rules carry
+their duration. Those of paused rules stay in, as the app still lists them.
+Times are floating wall-clock values, matching how the app stores them.
+
+Feed URLs carry an HMAC of the user id and ``token_version`` under
+``ICS_FEED_SECRET``, so revoking a user's access tokens also retires the old
+feed URL. Set the secret explicitly: it falls back to the access-token secret,
+which is random per process unless configured.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+from datetime import date, datetime, timedelta
+from itertools import product
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models import Category, Event, Rule, Task
+from rule_engine import parse_rate_pattern, segment_occurrences
+from serializers import TASK_COLUMNS
+from session_tokens import ACCESS_TOKEN_SECRET
+
+ICS_FEED_SECRET = os.getenv("ICS_FEED_SECRET") or ACCESS_TOKEN_SECRET
+ICS_PAST_DAYS = 90
+ICS_FUTURE_DAYS = 365
+ICS_PRODUCT_ID = "-//Dial-In//Schedule Feed//EN"
+
+# rule_engine weekday codes run 1 = Sunday .. 7 = Saturday
+ICS_WEEKDAYS = {1: "SU", 2: "MO", 3: "TU", 4: "WE", 5: "TH", 6: "FR", 7: "SA"}
+
+
+def feed_token(user_id: int, token_version: int) -> str:
+    message = f"ics:{user_id}:{token_version or 0}".encode("utf-8")
+    return hmac.new(ICS_FEED_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()[:32]
+
+
+def feed_token_matches(user_id: int, token_version: int, token: str) -> bool:
+    return hmac.compare_digest(feed_token(user_id, token_version), token)
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold a content line at 75 octets without splitting UTF-8 sequences."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    start = 0
+    limit = 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start = end
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts)
+
+
+def _date_value(value: date) -> str:
+    return value.strftime("%Y%m%d")
+
+
+def _datetime_value(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _start_properties(day: date, due_time: Optional[str]) -> List[str]:
+    if not due_time:
+        return [f"DTSTART;VALUE=DATE:{_date_value(day)}"]
+    hours, minutes = (int(part) for part in due_time[:5].split(":"))
+    return [f"DTSTART:{_datetime_value(datetime(day.year, day.month, day.day, hours, minutes))}"]
+
+
+def _vevent(uid: str, stamp: str, summary: str, properties: List[str], description: Optional[str], category: Optional[str]) -> List[str]:
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{stamp}", f"SUMMARY:{_escape(summary)}"]
+    lines.extend(properties)
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    if category:
+        lines.append(f"CATEGORIES:{_escape(category)}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def segment_rrule(segment: Dict[str, object]) -> Optional[str]:
+    """The RRULE equivalent of a parsed rate-pattern segment, or None when none is exact."""
+    frequency = segment["frequency"]
+    month_filter: List[int] = segment.get("month_filter") or []  # type: ignore[assignment]
+    by_month = f";BYMONTH={','.join(str(month) for month in month_filter)}" if month_filter else ""
+
+    if frequency == "d":
+        return f"FREQ=DAILY;INTERVAL={segment['interval']}{by_month}"
+    if frequency == "w":
+        days = ",".join(ICS_WEEKDAYS[code] for code in segment["weekday_codes"])  # type: ignore[union-attr]
+        return f"FREQ=WEEKLY;BYDAY={days}{by_month}"
+    if frequency == "m":
+        days = ",".join(str(day) for day in segment["month_days"])  # type: ignore[union-attr]
+        return f"FREQ=MONTHLY;BYMONTHDAY={days}{by_month}"
+    if frequency == "mw":
+        days = ",".join(
+            f"{-1 if entry['occurrence'] == 'L' else entry['occurrence']}{ICS_WEEKDAYS[entry['weekday']]}"
+            for entry in segment["monthly_weekdays"]  # type: ignore[union-attr]
+        )
+        return f"FREQ=MONTHLY;BYDAY={days}{by_month}"
+    if frequency == "y":
+        pairs = {
+            (entry["month"], entry["day"])
+            for entry in segment["yearly_dates"]  # type: ignore[union-attr]
+            if not month_filter or entry["month"] in month_filter
+        }
+        months = sorted({month for month, _ in pairs})
+        days = sorted({day for _, day in pairs})
+        # BYMONTH x BYMONTHDAY is a cross product, so only exact products map cleanly
+        if not pairs or set(product(months, days)) != pairs:
+            return None
+        return f"FREQ=YEARLY;BYMONTH={','.join(map(str, months))};BYMONTHDAY={','.join(map(str, days))}"
+    return None
+
+
+def _first_occurrence(segment: Dict[str, object], anchor: date) -> Optional[date]:
+    # Four years plus a day reaches every pattern, including 29 February
+    return next(segment_occurrences(segment, anchor, anchor, anchor + timedelta(days=4 * 366)), None)
+
+
+def _rule_lines(rule: Rule, stamp: str, category: Optional[str], window_start: date, window_end: date) -> Iterator[str]:
+    anchor = rule.created_at.date() if rule.created_at else window_start
+    # Event rules start at midnight when the pattern has no time, as their events do
+    duration = [f"DURATION:PT{rule.event_duration_minutes}M"] if rule.event_duration_minutes else []
+    for index, segment in enumerate(parse_rate_pattern(rule.rate_pattern or "")):
+        due_time = segment.get("due_time") or ("00:00" if duration else None)
+        rrule = segment_rrule(segment)
+        first = _first_occurrence(segment, anchor) if rrule else None
+        if rrule and first:
+            yield from _vevent(
+                f"rule-{rule.id}-{index}@dial-in",
+                stamp,
+                rule.name,
+                _start_properties(first, due_time) + duration + [f"RRULE:{rrule}"],
+                rule.description,
+                category,
+            )
+            continue
+
+        # No exact RRULE: list the segment's occurrences inside the feed window
+        for day in segment_occurrences(segment, anchor, window_start, window_end):
+            yield from _vevent(
+                f"rule-{rule.id}-{index}-{_date_value(day)}@dial-in",
+                stamp,
+                rule.name,
+                _start_properties(day, due_time) + duration,
+                rule.description,
+                category,
+            )
+
+
+def render_feed(db: Session, user_id: int, today: date, stamp: datetime) -> bytes:
+    window_start = today - timedelta(days=ICS_PAST_DAYS)
+    window_end = today + timedelta(days=ICS_FUTURE_DAYS)
+    stamp_value = stamp.strftime("%Y%m%dT%H%M%SZ")
+    categories = dict(db.query(Category.id, Category.name).filter(Category.user_id == user_id).all())
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{ICS_PRODUCT_ID}",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Dial-In",
+    ]
+
+    rules = db.query(Rule).filter(Rule.user_id == user_id, Rule.is_active == True).order_by(Rule.id).all()
+    # Tasks and events generated by active rules are covered by the rule's series
+    series_rule_ids = [rule.id for rule in rules]
+
+    events = (
+        db.query(Event)
+        .filter(
+            Event.user_id == user_id,
+            Event.start_time >= window_start,
+            Event.start_time < window_end + timedelta(days=1),
+            or_(Event.rule_id.is_(None), Event.rule_id.notin_(series_rule_ids)),
+        )
+        .order_by(Event.start_time, Event.id)
+    )
+    for event in events.yield_per(500):
+        properties = [f"DTSTART:{_datetime_value(event.start_time)}"]
+        if event.end_time:
+            properties.append(f"DTEND:{_datetime_value(event.end_time)}")
+        lines.extend(_vevent(f"event-{event.id}@dial-in", stamp_value, event.title, properties, event.description, categories.get(event.category_id)))
+
+    # Title and description read through from the rule for generated tasks
+    tasks = (
+        db.query(*TASK_COLUMNS)
+        .filter(
+            Task.user_id == user_id,
+            or_(Task.rule_id.is_(None), Task.rule_id.notin_(series_rule_ids)),
+            Task.due_date >= window_start,
+            Task.due_date <= window_end,
+        )
+        .order_by(Task.due_date, Task.due_time, Task.id)
+    )
+    for task in tasks.yield_per(500):
+        properties = _start_properties(task.due_date, task.due_time)
+        if task.end_date and task.end_time and task.due_time:
+            properties.append(f"DTEND:{_datetime_value(datetime.combine(task.end_date, datetime.strptime(task.end_time[:5], '%H:%M').time()))}")
+        elif not task.due_time:
+            properties.append(f"DTEND;VALUE=DATE:{_date_value((task.end_date or task.due_date) + timedelta(days=1))}")
+        summary = f"✓ {task.title}" if task.is_completed else task.title
+        lines.extend(_vevent(f"task-{task.id}@dial-in", stamp_value, summary, properties, task.description, categories.get(task.category_id)))
+
+    for rule in rules:
+        lines.extend(_rule_lines(rule, stamp_value, categories.get(rule.category_id), window_start, window_end))
+
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode("utf-8")
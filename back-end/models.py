@@ -1,8 +1,9 @@
 """SQLAlchemy database models."""
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, DateTime, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, DateTime, LargeBinary, Text, func, select
+from sqlalchemy.orm import object_session, relationship
 from datetime import datetime
 from database import Base
+import json
 
 class User(Base):
     __tablename__ = "users"
@@ -11,6 +12,7 @@ class User(Base):
     username = Column(String(80), unique=True, nullable=False, index=True)
     password = Column(String(120), nullable=False)
     avatar = Column(String(10), nullable=True, default="🙂")
+    token_version = Column(Integer, nullable=False, default=0)  # Bumped to revoke every issued access token
 
     def to_dict(self):
         return {
@@ -41,7 +43,6 @@ class UserData(Base):
     user = relationship('User')
     
     def to_dict(self):
-        import json
         return {
             "id": self.id,
             "user_id": self.user_id,
@@ -58,6 +59,8 @@ class UserData(Base):
 
 class Category(Base):
     __tablename__ = 'categories'
+    # Ids are never reused, so a cascade job still running for a deleted row cannot reach a new one
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -65,6 +68,7 @@ class Category(Base):
     color = Column(String(7), nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=True)  # Assigned by sync triggers on every write
     
     # Relationships
     user = relationship('User')
@@ -79,11 +83,14 @@ class Category(Base):
             "icon": self.icon,
             "color": self.color,
             "user_id": self.user_id,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "version": self.version
         }
 
 class Rule(Base):
     __tablename__ = 'rules'
+    # Ids are never reused, so a cascade job still running for a deleted row cannot reach a new one
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -94,7 +101,9 @@ class Rule(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Add user_id for ownership
     rate_pattern = Column(String(200), nullable=False)  # New encoding system (e.g., "w#1M#1,2,3,4,5,6,7,8,9,10,11,12T#09:00")
     is_active = Column(Boolean, default=True)
+    event_duration_minutes = Column(Integer, nullable=True)  # Set on rules that generate events instead of tasks
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=True)  # Assigned by sync triggers on every write
     
     # Relationships
     user = relationship('User')
@@ -113,11 +122,15 @@ class Rule(Base):
             "user_id": self.user_id,
             "rate_pattern": self.rate_pattern,
             "is_active": self.is_active,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "event_duration_minutes": self.event_duration_minutes,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "version": self.version
         }
 
 class Task(Base):
     __tablename__ = 'tasks'
+    # Ids are never reused, so an archived task's id stays unique across tasks and tasks_archive
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -134,19 +147,43 @@ class Task(Base):
     end_time = Column(String(5), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=True)  # Assigned by sync triggers on every write
     
     # Relationships
     user = relationship('User')
     category = relationship('Category', back_populates='tasks')
     rule = relationship('Rule', back_populates='tasks')
-    
+
+    # Rule-generated tasks store an empty title and NULL description, icon and color
+    # until edited; those fields are read through from the rule, or from the cascade
+    # job orphaning them once the rule is deleted
+    def _inherited_from_deleted_rule(self, field):
+        session = object_session(self)
+        if session is None:
+            return None
+        return session.scalar(deleted_rule_field(self.user_id, self.rule_id, field))
+
+    def resolved_title(self):
+        if self.title == "" and self.rule_id is not None:
+            if self.rule is not None:
+                return self.rule.name
+            return self._inherited_from_deleted_rule("name") or self.title
+        return self.title
+
+    def resolved_description(self):
+        if self.description is None and self.rule_id is not None:
+            if self.rule is not None:
+                return self.rule.description
+            return self._inherited_from_deleted_rule("description")
+        return self.description
+
     def to_dict(self):
         return {
             "id": self.id,
-            "title": self.title,
+            "title": self.resolved_title(),
             "icon": self.icon,
             "color": self.color,
-            "description": self.description,
+            "description": self.resolved_description(),
             "category_id": self.category_id,
             "rule_id": self.rule_id,
             "user_id": self.user_id,
@@ -156,7 +193,8 @@ class Task(Base):
             "end_date": self.end_date.isoformat() if self.end_date else None,
             "end_time": self.end_time,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "version": self.version
         }
 
 class Event(Base):
@@ -171,6 +209,7 @@ class Event(Base):
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=True)  # Assigned by sync triggers on every write
     
     # Relationships
     user = relationship('User')
@@ -187,5 +226,158 @@ class Event(Base):
             "user_id": self.user_id,
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "version": self.version
         }
+
+class SyncVersion(Base):
+    __tablename__ = 'sync_versions'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)  # Last change version handed out for this user
+
+class SyncTombstone(Base):
+    __tablename__ = 'sync_tombstones'
+
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String(20), nullable=False)  # Source table name: tasks, events, rules, categories
+    entity_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "entity": self.entity,
+            "id": self.entity_id,
+            "version": self.version,
+            "deleted_at": self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+class CascadeJob(Base):
+    __tablename__ = 'cascade_jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    kind = Column(String(20), nullable=False)  # category, rule
+    target_id = Column(Integer, nullable=False)  # Id of the already-deleted parent
+    rule_ids = Column(Text, default="[]")  # JSON array of rule ids whose tasks are affected
+    inherited_fields = Column(Text, default="{}")  # JSON {rule_id: [name, description]} of the deleted rules
+    action = Column(String(10), nullable=False)  # delete, orphan
+    status = Column(String(20), default="pending")  # pending, running, done, failed
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "kind": self.kind,
+            "target_id": self.target_id,
+            "action": self.action,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+def deleted_rule_field(user_id, rule_id, field):
+    """Select the name or description of a deleted rule, as its cascade job saved it.
+
+    Tasks keep the deleted rule's id until the job reaches them, so reads fall back
+    to this while it runs. ``user_id`` and ``rule_id`` may be values or columns.
+    """
+    index = 0 if field == "name" else 1
+    value = func.json_extract(CascadeJob.inherited_fields, func.printf('$."%d"[%d]', rule_id, index))
+    return (
+        select(value)
+        .where(CascadeJob.user_id == user_id, value.isnot(None))
+        .order_by(CascadeJob.id.desc())
+        .limit(1)
+    )
+
+
+class ArchivedTask(Base):
+    """Cold copy of completed tasks moved out of ``tasks`` by the archiver; same columns."""
+    __tablename__ = 'tasks_archive'
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String(200), nullable=False)
+    icon = Column(String(10), nullable=True)
+    color = Column(String(7), nullable=True)
+    description = Column(Text)
+    category_id = Column(Integer, nullable=True)
+    rule_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=False)
+    is_completed = Column(Boolean, default=False)
+    due_date = Column(Date, nullable=True)
+    due_time = Column(String(5), nullable=True)
+    end_date = Column(Date, nullable=True)
+    end_time = Column(String(5), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=True)
+
+
+class RuleCompletionLedger(Base):
+    """Completed past occurrences of one rule at one time of day, as a date bitmap.
+
+    Bit ``i`` of ``bitmap`` (least significant bit first) marks the occurrence on
+    ``start_date + i days`` as completed. ``due_time`` is "" for untimed occurrences.
+    """
+    __tablename__ = 'rule_completion_ledgers'
+
+    id = Column(Integer, primary_key=True)
+    rule_id = Column(Integer, ForeignKey('rules.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    due_time = Column(String(5), nullable=False, default="")
+    start_date = Column(Date, nullable=False)
+    bitmap = Column(LargeBinary, nullable=False)
+    entry_count = Column(Integer, default=0)  # Number of set bits, kept for project counters
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CategoryStats(Base):
+    """Task counters per project, maintained by triggers on tasks and tasks_archive."""
+    __tablename__ = 'category_stats'
+
+    category_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    open_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+
+
+class CategoryOpenDue(Base):
+    """Open dated tasks per project and due date; overdue counts sum the past dates."""
+    __tablename__ = 'category_open_due'
+
+    category_id = Column(Integer, primary_key=True)
+    due_date = Column(Date, primary_key=True)
+    open_count = Column(Integer, default=0)
+
+
+class TaskDailyRollup(Base):
+    """Task counts per user, due day, project and rule; 0 stands for "none" in the key."""
+    __tablename__ = 'task_daily_rollups'
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True, default=0)
+    rule_id = Column(Integer, primary_key=True, default=0)
+    task_count = Column(Integer, default=0)
+    generated_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+
+
+class RollupDirtyDay(Base):
+    """A (user, day) whose rollups must be recomputed, recorded by triggers on task writes."""
+    __tablename__ = 'rollup_dirty_days'
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
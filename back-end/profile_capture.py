@@ -0,0 +1,288 @@
+"""On-demand CPU profiles of live requests and rule scheduler ticks.
+
+Nothing is profiled until an operator asks for it. ``POST /admin/profiles``
+arms a target for the next ``count`` runs. The target is either a route as
+``METHOD /path/{template}`` (the labels ``GET /admin/routes`` reports) or
+``thread:rule-scheduler`` for the scheduler's next ticks. A single request can
+also ask for itself by sending ``X-Profile: cprofile`` or ``X-Profile: sample``
+along with a valid ``X-Admin-Token``.
+
+Two modes are supported:
+
+- ``cprofile`` records deterministic call counts and times in a ``.pstats``
+  file for ``pstats`` or snakeviz.
+- ``sample`` reads the thread's stack every ``PROFILE_SAMPLE_INTERVAL_MS`` from
+  a helper thread and writes collapsed stacks to a ``.folded`` file for
+  flamegraph.pl or speedscope.
+
+Both watch only the thread that runs the work. For a request that is the event
+loop thread, so work from other requests interleaved on the loop during the
+capture shows up too. Sync dependencies run in the threadpool and do not.
+Only one capture runs at a time. An armed run that arrives while another
+capture is active waits for a later run.
+
+``ProfileCaptureMiddleware`` is only installed when ``ADMIN_TOKEN`` is set. With
+nothing armed, a request costs one scan of its header list and a scheduler tick
+costs one dictionary check. Files go to ``PROFILE_CAPTURE_DIR``, and only the
+newest ``PROFILE_CAPTURE_KEEP`` are kept.
+"""
+from __future__ import annotations
+
+import cProfile
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from starlette.routing import Match
+
+from request_profiling import route_label
+from session_tokens import admin_token_matches
+
+PROFILE_CAPTURE_DIR = os.getenv("PROFILE_CAPTURE_DIR", "./instance/profiles")
+PROFILE_CAPTURE_KEEP = int(os.getenv("PROFILE_CAPTURE_KEEP", "50"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_CAPTURE_MAX_COUNT = 100
+
+CAPTURE_MODES = ("cprofile", "sample")
+CAPTURE_EXTENSIONS = {"cprofile": ".pstats", "sample": ".folded"}
+SCHEDULER_TARGET = "thread:rule-scheduler"
+
+CAPTURE_FILE_NAME = re.compile(r"^[\w.-]+\.(pstats|folded)$")
+UNSAFE_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9]+")
+
+
+class _StackSampler:
+    """Collapsed stacks of one thread, read from ``sys._current_frames`` on a timer."""
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._thread.join(timeout=2)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+class ProfileCaptures:
+    def __init__(self, directory: str = PROFILE_CAPTURE_DIR, keep: int = PROFILE_CAPTURE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        # target -> {"mode": ..., "remaining": ...}
+        self._armed: Dict[str, Dict[str, object]] = {}
+        self._active = False
+
+    @property
+    def is_armed(self) -> bool:
+        return bool(self._armed)
+
+    def arm(self, target: str, count: int = 1, mode: str = "cprofile") -> Dict[str, object]:
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        with self._lock:
+            self._armed[target] = {"mode": mode, "remaining": count}
+        return {"target": target, "mode": mode, "remaining": count}
+
+    def disarm(self) -> None:
+        with self._lock:
+            self._armed.clear()
+
+    def armed(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return [{"target": target, **dict(state)} for target, state in self._armed.items()]
+
+    def claim(self, target: str) -> Optional[str]:
+        """The mode to profile this run of ``target`` with, if it is armed and no capture is running."""
+        with self._lock:
+            state = self._armed.get(target)
+            if state is None or self._active:
+                return None
+            state["remaining"] -= 1  # type: ignore[operator]
+            if state["remaining"] <= 0:  # type: ignore[operator]
+                del self._armed[target]
+            self._active = True
+            return state["mode"]  # type: ignore[return-value]
+
+    def begin(self) -> bool:
+        """Claim the single capture slot for a run that asked for itself."""
+        with self._lock:
+            if self._active:
+                return False
+            self._active = True
+            return True
+
+    def start(self, mode: str):
+        if mode == "sample":
+            profiler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_MS / 1000)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def finish(self, profiler, target: str, mode: str, seconds: float) -> Optional[str]:
+        """Stop ``profiler``, write its file and release the capture slot; returns the file name."""
+        try:
+            if mode == "sample":
+                profiler.stop()
+            else:
+                profiler.disable()
+            name = (
+                f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-"
+                f"{UNSAFE_NAME_CHARACTERS.sub('_', target).strip('_')}{CAPTURE_EXTENSIONS[mode]}"
+            )
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, name)
+            if mode == "sample":
+                profiler.dump(path)
+            else:
+                profiler.dump_stats(path)
+            self._prune()
+            print(f"Captured {mode} profile of {target} ({seconds * 1000:.1f} ms): {name}")
+            return name
+        except Exception as exc:
+            print(f"Profile capture error for {target}: {exc}")
+            return None
+        finally:
+            with self._lock:
+                self._active = False
+
+    @contextmanager
+    def capture(self, target: str):
+        """Profile the enclosed block if ``target`` is armed; a bare ``yield`` otherwise."""
+        mode = self.claim(target) if self._armed else None
+        if mode is None:
+            yield
+            return
+        profiler = self.start(mode)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.finish(profiler, target, mode, perf_counter() - started)
+
+    def files(self) -> List[Dict[str, object]]:
+        """Captured profiles on disk, newest first."""
+        try:
+            names = [name for name in os.listdir(self.directory) if CAPTURE_FILE_NAME.match(name)]
+        except FileNotFoundError:
+            return []
+        files = []
+        for name in sorted(names, reverse=True):
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            files.append({
+                "name": name,
+                "mode": "sample" if name.endswith(".folded") else "cprofile",
+                "bytes": stat.st_size,
+                "created": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+            })
+        return files
+
+    def path_for(self, name: str) -> Optional[str]:
+        """The path of a captured profile, or None for names that are not one."""
+        if not CAPTURE_FILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def _prune(self) -> None:
+        for stale in self.files()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, stale["name"]))  # type: ignore[arg-type]
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        self.disarm()
+        for captured in self.files():
+            try:
+                os.remove(os.path.join(self.directory, captured["name"]))  # type: ignore[arg-type]
+            except FileNotFoundError:
+                pass
+
+
+profile_captures = ProfileCaptures()
+
+
+def _match_route_label(scope) -> Optional[str]:
+    # Routing has not run yet, so find the route the router would pick
+    for route in getattr(getattr(scope.get("app"), "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{scope.get('method', '')} {getattr(route, 'path', 'unmatched')}"
+    return None
+
+
+def _requested_mode(scope) -> Optional[str]:
+    mode = token = None
+    for key, value in scope.get("headers", ()):
+        if key == b"x-profile":
+            mode = value.decode("latin-1").strip().lower()
+        elif key == b"x-admin-token":
+            token = value.decode("latin-1")
+    if mode is None:
+        return None
+    if mode not in CAPTURE_MODES or not admin_token_matches(token):
+        return None
+    return mode
+
+
+class ProfileCaptureMiddleware:
+    """Pure ASGI middleware that profiles armed routes and requests sending ``X-Profile``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = _requested_mode(scope)
+        if mode is not None and not profile_captures.begin():
+            mode = None
+        if mode is None and profile_captures.is_armed:
+            label = _match_route_label(scope)
+            if label is not None:
+                mode = profile_captures.claim(label)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = profile_captures.start(mode)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile_captures.finish(profiler, route_label(scope), mode, perf_counter() - started)
@@ -0,0 +1,346 @@
+"""Due-time reminders for timed tasks and events.
+
+``ReminderDispatcher`` keeps every reminder due within ``REMINDER_HORIZON_HOURS``
+in a ``TimingWheel``, so the next due item costs nothing to find. Reminders past
+the horizon stay in the database. Each refill loads only the slice that has
+newly entered the horizon, through range queries on ``ix_tasks_due_instant`` and
+``ix_events_start_time``. Writes reach the wheel through the
+``bump_generation`` listener: a changed user's reminders inside the horizon are
+reloaded from ``ix_tasks_user_due``. Every fired item is re-read once before
+anything is sent, so completed, deleted or rescheduled rows never notify.
+
+Due instants are wall-clock values like the rest of the app. "Now" is UTC
+shifted by ``REMINDER_UTC_OFFSET_MINUTES``. Untimed tasks have no instant and get
+no reminder. ``REMINDER_SINKS`` picks where notifications go:
+``stream`` (``reminder`` events on ``GET /stream``), ``log`` and ``webhook``
+(JSON POSTed to ``REMINDER_WEBHOOK_URL``).
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import urllib.request
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from change_stream import change_bus
+from database import SessionLocal
+from models import Event, Rule, Task, deleted_rule_field
+from response_cache import add_generation_listener
+
+REMINDER_HORIZON_HOURS = int(os.getenv("REMINDER_HORIZON_HOURS", "48"))
+REMINDER_UTC_OFFSET_MINUTES = int(os.getenv("REMINDER_UTC_OFFSET_MINUTES", "0"))
+REMINDER_SINKS = os.getenv("REMINDER_SINKS", "stream")
+REMINDER_WEBHOOK_URL = os.getenv("REMINDER_WEBHOOK_URL", "http://127.0.0.1:5001/reminders")
+REMINDER_FIRE_BATCH_SIZE = 500
+
+WALL_CLOCK_EPOCH = datetime(1970, 1, 1)
+
+# Wheel keys pack the row id with its kind
+TASK_KIND = 0
+EVENT_KIND = 1
+
+ReminderSink = Callable[[List[Dict[str, object]]], None]
+
+
+def wall_clock_now() -> datetime:
+    return datetime.utcnow() + timedelta(minutes=REMINDER_UTC_OFFSET_MINUTES)
+
+
+def wall_clock_seconds(value: datetime) -> int:
+    return int((value - WALL_CLOCK_EPOCH).total_seconds())
+
+
+def task_due_instant(due_date: Optional[date], due_time: Optional[str]) -> Optional[datetime]:
+    if due_date is None or not due_time:
+        return None
+    try:
+        hours, minutes = (int(part) for part in due_time[:5].split(":"))
+    except ValueError:
+        return None
+    return datetime(due_date.year, due_date.month, due_date.day, hours, minutes)
+
+
+class TimingWheel:
+    """Hierarchical timing wheel of integer keys due at whole-second deadlines.
+
+    Level 0 has one slot per second for a minute, level 1 one per minute for an
+    hour, level 2 one per hour for a day and level 3 one per day for a week.
+    Scheduling and cancelling are dict operations. ``advance`` visits one slot
+    per elapsed second and moves a higher slot's entries down whenever the
+    level below wraps.
+    """
+
+    LEVEL_SLOTS = (60, 60, 24, 7)
+
+    def __init__(self, now_seconds: int):
+        self.current = now_seconds
+        self._units: List[int] = []
+        unit = 1
+        for slots in self.LEVEL_SLOTS:
+            self._units.append(unit)
+            unit *= slots
+        self.span = unit
+        self._levels: List[List[Dict[int, int]]] = [[{} for _ in range(slots)] for slots in self.LEVEL_SLOTS]
+        self._locations: Dict[int, Tuple[int, int]] = {}
+        self._overdue: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._locations) + len(self._overdue)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._locations or key in self._overdue
+
+    def schedule(self, key: int, deadline: int) -> bool:
+        """Add or move ``key``; False when the deadline lies beyond the wheel's span."""
+        self.cancel(key)
+        delay = deadline - self.current
+        if delay <= 0:
+            self._overdue[key] = deadline
+            return True
+        for level, unit in enumerate(self._units):
+            if delay < unit * self.LEVEL_SLOTS[level]:
+                slot = (deadline // unit) % self.LEVEL_SLOTS[level]
+                self._levels[level][slot][key] = deadline
+                self._locations[key] = (level, slot)
+                return True
+        return False
+
+    def cancel(self, key: int) -> None:
+        location = self._locations.pop(key, None)
+        if location is not None:
+            level, slot = location
+            del self._levels[level][slot][key]
+        else:
+            self._overdue.pop(key, None)
+
+    def advance(self, now_seconds: int) -> List[Tuple[int, int]]:
+        """Move the wheel to ``now_seconds``; returns the (key, deadline) pairs that came due."""
+        expired = list(self._overdue.items())
+        self._overdue.clear()
+        while self.current < now_seconds:
+            self.current += 1
+            for level in range(1, len(self._units)):
+                unit = self._units[level]
+                if self.current % unit:
+                    break
+                bucket = self._levels[level][(self.current // unit) % self.LEVEL_SLOTS[level]]
+                entries = list(bucket.items())
+                bucket.clear()
+                for key, deadline in entries:
+                    del self._locations[key]
+                    self.schedule(key, deadline)
+
+            bucket = self._levels[0][self.current % self.LEVEL_SLOTS[0]]
+            for key, deadline in list(bucket.items()):
+                if deadline <= self.current:
+                    del bucket[key]
+                    del self._locations[key]
+                    expired.append((key, deadline))
+            if self._overdue:
+                expired.extend(self._overdue.items())
+                self._overdue.clear()
+        return expired
+
+
+def log_sink(reminders: List[Dict[str, object]]) -> None:
+    for reminder in reminders:
+        print(f"Reminder for user {reminder['user_id']}: {reminder['kind']} {reminder['id']} {reminder['title']!r} due {reminder['due_at']}")
+
+
+def change_stream_sink(reminders: List[Dict[str, object]]) -> None:
+    for reminder in reminders:
+        change_bus.push_message(reminder["user_id"], "reminder", reminder)
+
+
+class WebhookSink:
+    def __init__(self, url: str = REMINDER_WEBHOOK_URL, timeout_seconds: float = 2.0):
+        self.url = url
+        self.timeout_seconds = timeout_seconds
+
+    def __call__(self, reminders: List[Dict[str, object]]) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"reminders": reminders}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout_seconds):
+            pass
+
+
+def configured_sinks(names: str = REMINDER_SINKS) -> List[ReminderSink]:
+    available = {"log": log_sink, "stream": change_stream_sink, "webhook": WebhookSink()}
+    return [available[name.strip()] for name in names.split(",") if name.strip() in available]
+
+
+def _resolved_task_query(db: Session):
+    title = func.coalesce(
+        func.nullif(Task.title, ""),
+        Rule.name,
+        deleted_rule_field(Task.user_id, Task.rule_id, "name").scalar_subquery(),
+    )
+    return db.query(Task.id, Task.user_id, title, Task.due_date, Task.due_time).outerjoin(Rule, Rule.id == Task.rule_id)
+
+
+class ReminderDispatcher:
+    def __init__(
+        self,
+        horizon_hours: int = REMINDER_HORIZON_HOURS,
+        refill_seconds: int = 300,
+        sinks: Optional[List[ReminderSink]] = None,
+    ):
+        # The wheel covers a week, so the horizon must end inside it
+        self.horizon = min(timedelta(hours=horizon_hours), timedelta(days=7) - timedelta(minutes=1))
+        self.refill_seconds = refill_seconds
+        self.sinks = configured_sinks() if sinks is None else sinks
+        self.wheel: Optional[TimingWheel] = None
+        self._loaded_until: Optional[datetime] = None
+        self._dirty_users: Set[int] = set()
+        self._dirty_lock = threading.Lock()
+        self._listening = False
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        if not self._listening:
+            add_generation_listener(self.mark_user_dirty)
+            self._listening = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="reminder-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def mark_user_dirty(self, user_id: int) -> None:
+        with self._dirty_lock:
+            self._dirty_users.add(user_id)
+        self._wake_event.set()
+
+    def _schedule(self, kind: int, row_id: int, instant: Optional[datetime], now: datetime) -> None:
+        key = row_id * 2 + kind
+        if instant is None or instant > now + self.horizon:
+            self.wheel.cancel(key)
+        else:
+            self.wheel.schedule(key, wall_clock_seconds(instant))
+
+    def _load_window(self, db: Session, start: datetime, end: datetime, user_id: Optional[int] = None) -> None:
+        """Schedule pending tasks and events due in (start, end], optionally for one user."""
+        now = wall_clock_now()
+        tasks = db.query(Task.id, Task.due_date, Task.due_time).filter(
+            Task.due_time.isnot(None),
+            Task.due_date >= start.date(),
+            Task.due_date <= end.date(),
+            Task.is_completed == False,
+        )
+        events = db.query(Event.id, Event.start_time).filter(Event.start_time > start, Event.start_time <= end)
+        if user_id is not None:
+            tasks = tasks.filter(Task.user_id == user_id)
+            events = events.filter(Event.user_id == user_id)
+
+        for task_id, due_date, due_time in tasks.yield_per(REMINDER_FIRE_BATCH_SIZE):
+            instant = task_due_instant(due_date, due_time)
+            if instant is not None and start < instant <= end:
+                self._schedule(TASK_KIND, task_id, instant, now)
+        for event_id, start_time in events.yield_per(REMINDER_FIRE_BATCH_SIZE):
+            self._schedule(EVENT_KIND, event_id, start_time, now)
+
+    def refill(self, db: Session) -> None:
+        now = wall_clock_now()
+        if self.wheel is None:
+            self.wheel = TimingWheel(wall_clock_seconds(now))
+            self._loaded_until = now
+        until = now + self.horizon
+        if until > self._loaded_until:
+            self._load_window(db, self._loaded_until, until)
+            self._loaded_until = until
+
+    def reload_dirty_users(self, db: Session) -> None:
+        if self.wheel is None:
+            return
+        with self._dirty_lock:
+            users, self._dirty_users = self._dirty_users, set()
+        now = wall_clock_now()
+        for user_id in users:
+            # Moves into the window and new rows; rows moved out are dropped when they fire
+            self._load_window(db, now - timedelta(seconds=1), self._loaded_until, user_id)
+
+    def fire_due(self, db: Session) -> List[Dict[str, object]]:
+        """Advance the wheel to now and send whatever is still due after a re-read."""
+        now = wall_clock_now()
+        expired = self.wheel.advance(wall_clock_seconds(now))
+        reminders: List[Dict[str, object]] = []
+        for index in range(0, len(expired), REMINDER_FIRE_BATCH_SIZE):
+            reminders.extend(self._still_due(db, expired[index:index + REMINDER_FIRE_BATCH_SIZE], now))
+        reminders.sort(key=lambda reminder: reminder["due_at"])
+        if reminders:
+            for sink in self.sinks:
+                try:
+                    sink(reminders)
+                except Exception as exc:
+                    print(f"Reminder sink error: {exc}")
+        return reminders
+
+    def _still_due(self, db: Session, expired: Iterable[Tuple[int, int]], now: datetime) -> List[Dict[str, object]]:
+        deadlines = {key: deadline for key, deadline in expired}
+        task_ids = [key // 2 for key in deadlines if key % 2 == TASK_KIND]
+        event_ids = [key // 2 for key in deadlines if key % 2 == EVENT_KIND]
+        reminders = []
+
+        if task_ids:
+            rows = _resolved_task_query(db).filter(Task.id.in_(task_ids), Task.is_completed == False).all()
+            for task_id, user_id, title, due_date, due_time in rows:
+                instant = task_due_instant(due_date, due_time)
+                if instant is None:
+                    continue
+                if wall_clock_seconds(instant) != deadlines[task_id * 2 + TASK_KIND]:
+                    # Rescheduled without the wheel noticing yet; keep the new time if it is ahead
+                    if instant > now:
+                        self._schedule(TASK_KIND, task_id, instant, now)
+                    continue
+                reminders.append({"kind": "task", "id": task_id, "user_id": user_id, "title": title, "due_at": instant.isoformat()})
+
+        if event_ids:
+            rows = db.query(Event.id, Event.user_id, Event.title, Event.start_time).filter(Event.id.in_(event_ids)).all()
+            for event_id, user_id, title, start_time in rows:
+                if wall_clock_seconds(start_time) != deadlines[event_id * 2 + EVENT_KIND]:
+                    if start_time > now:
+                        self._schedule(EVENT_KIND, event_id, start_time, now)
+                    continue
+                reminders.append({"kind": "event", "id": event_id, "user_id": user_id, "title": title, "due_at": start_time.isoformat()})
+
+        return reminders
+
+    def _run_loop(self) -> None:
+        last_refill = datetime.utcnow()
+        while not self._stop_event.is_set():
+            db = SessionLocal()
+            try:
+                if self.wheel is None:
+                    self.refill(db)
+                    last_refill = datetime.utcnow()
+                # Fire first so the wheel stands at now before the window grows
+                self.fire_due(db)
+                if datetime.utcnow() - last_refill >= timedelta(seconds=self.refill_seconds):
+                    self.refill(db)
+                    last_refill = datetime.utcnow()
+                self.reload_dirty_users(db)
+            except Exception as exc:
+                print(f"Reminder dispatcher error: {exc}")
+                db.rollback()
+            finally:
+                db.close()
+
+            self._wake_event.wait(1)
+            self._wake_event.clear()
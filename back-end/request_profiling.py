@@ -0,0 +1,229 @@
+"""Per-request SQL accounting, N+1 detection and per-route latency histograms.
+
+``ProfilingMiddleware`` opens a profile for every HTTP request in a context
+variable. The cursor hooks that ``install_sql_hooks`` registers on the engine add
+each statement's count and time to it. Sessions used by background threads run
+outside any request and are not counted. Statements are reduced to their shape
+(literals and ``IN`` lists collapsed), and a shape that runs
+``N_PLUS_ONE_THRESHOLD`` times in one request is reported as a probable N+1
+loop.
+
+Each response gets a ``Server-Timing`` header with the handler time until the
+headers were sent and the SQL time and query count up to then, so browser dev
+tools show them per request. ``route_stats`` aggregates the full request
+duration per route template into fixed latency buckets; ``GET /admin/routes``
+reads it.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "1") != "0"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# Upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+ROUTE_SUSPECT_SHAPES = 5
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+_current_profile: ContextVar[Optional[Dict[str, object]]] = ContextVar("request_profile", default=None)
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """The statement's shape: literals become ``?`` and parameter lists ``(?+)``."""
+    shape = STRING_LITERAL.sub("?", statement)
+    shape = NUMBER_LITERAL.sub("?", shape)
+    shape = PARAMETER_LIST.sub("(?+)", shape)
+    return WHITESPACE.sub(" ", shape).strip()
+
+
+def current_profile() -> Optional[Dict[str, object]]:
+    """The profile of the request being served on this task or thread, if any."""
+    return _current_profile.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None and _current_profile.get() is not None:
+        context._profile_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = _current_profile.get()
+    started = getattr(context, "_profile_started", None)
+    if profile is None or started is None:
+        return
+    profile["queries"] += 1  # type: ignore[operator]
+    profile["sql_seconds"] += perf_counter() - started  # type: ignore[operator]
+    profile["shapes"][normalize_sql(statement)] += 1  # type: ignore[index]
+
+
+def install_sql_hooks(engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def suspected_n_plus_one(profile: Dict[str, object]) -> List[Dict[str, object]]:
+    shapes: Counter = profile["shapes"]  # type: ignore[assignment]
+    return [
+        {"statement": shape, "count": count}
+        for shape, count in shapes.most_common()
+        if count >= N_PLUS_ONE_THRESHOLD
+    ]
+
+
+class RouteStats:
+    """Latency histograms and query totals per ``METHOD /route/{template}``."""
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, object]] = {}
+
+    def observe(self, route: str, seconds: float, profile: Dict[str, object], suspects: List[Dict[str, object]]) -> None:
+        elapsed_ms = seconds * 1000
+        bucket = next((index for index, bound in enumerate(self.buckets_ms) if elapsed_ms <= bound), len(self.buckets_ms))
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "queries": 0,
+                    "sql_ms": 0.0,
+                    "n_plus_one_requests": 0,
+                    "buckets": [0] * (len(self.buckets_ms) + 1),
+                    "suspects": Counter(),
+                }
+                self._routes[route] = stats
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["queries"] += profile["queries"]
+            stats["sql_ms"] += profile["sql_seconds"] * 1000  # type: ignore[operator]
+            stats["buckets"][bucket] += 1
+            if suspects:
+                stats["n_plus_one_requests"] += 1
+                for suspect in suspects:
+                    stats["suspects"][suspect["statement"]] += 1
+
+    def _percentile(self, buckets: List[int], count: int, fraction: float) -> Optional[float]:
+        # Upper bound of the bucket holding the requested rank; None past the last bound
+        rank = fraction * count
+        seen = 0
+        for index, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets_ms[index] if index < len(self.buckets_ms) else None
+        return None
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        """Per-route summaries, slowest total time first."""
+        with self._lock:
+            routes = [(route, dict(stats, buckets=list(stats["buckets"]), suspects=Counter(stats["suspects"]))) for route, stats in self._routes.items()]
+        summaries = []
+        for route, stats in routes:
+            count = stats["count"]
+            summaries.append({
+                "route": route,
+                "count": count,
+                "mean_ms": round(stats["total_ms"] / count, 3),
+                "p50_ms": self._percentile(stats["buckets"], count, 0.5),
+                "p95_ms": self._percentile(stats["buckets"], count, 0.95),
+                "p99_ms": self._percentile(stats["buckets"], count, 0.99),
+                "max_ms": round(stats["max_ms"], 3),
+                "total_ms": round(stats["total_ms"], 3),
+                "mean_queries": round(stats["queries"] / count, 2),
+                "mean_sql_ms": round(stats["sql_ms"] / count, 3),
+                "n_plus_one_requests": stats["n_plus_one_requests"],
+                "n_plus_one_statements": [
+                    {"statement": shape, "requests": requests}
+                    for shape, requests in stats["suspects"].most_common(ROUTE_SUSPECT_SHAPES)
+                ],
+                "histogram": {
+                    "le_ms": list(self.buckets_ms) + [None],
+                    "counts": stats["buckets"],
+                },
+            })
+        summaries.sort(key=lambda summary: summary["total_ms"], reverse=True)
+        return summaries
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStats()
+
+# Route templates by endpoint, filled in as requests are served
+_route_templates: Dict[object, str] = {}
+
+
+def route_label(scope) -> str:
+    """``METHOD /path/{template}`` for the route that served ``scope``."""
+    endpoint = scope.get("endpoint")
+    template = _route_templates.get(endpoint)
+    if template is None and endpoint is not None:
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                template = getattr(route, "path", None)
+                break
+        _route_templates[endpoint] = template or "unmatched"
+    return f"{scope.get('method', '')} {template or 'unmatched'}"
+
+
+def _server_timing(profile: Dict[str, object], seconds: float, suspects: List[Dict[str, object]]) -> str:
+    description = f"{profile['queries']} queries"
+    if suspects:
+        description += f", {len(suspects)} repeated"
+    return f'app;dur={seconds * 1000:.1f}, sql;dur={profile["sql_seconds"] * 1000:.1f};desc="{description}"'  # type: ignore[operator]
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware, so streamed responses pass through unbuffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILE_REQUESTS:
+            await self.app(scope, receive, send)
+            return
+
+        profile: Dict[str, object] = {"queries": 0, "sql_seconds": 0.0, "shapes": Counter(), "scope": scope}
+        token = _current_profile.set(profile)
+        started = perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", _server_timing(profile, perf_counter() - started, suspected_n_plus_one(profile)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            elapsed = perf_counter() - started
+            route = route_label(scope)
+            suspects = suspected_n_plus_one(profile)
+            if suspects:
+                top = suspects[0]
+                print(f"Probable N+1 in {route}: {top['count']}x {top['statement'][:200]}")
+            route_stats.observe(route, elapsed, profile, suspects)
@@ -0,0 +1,134 @@
+"""Per-user data generations and a byte-bounded cache of serialized list responses.
+
+Every route that changes a user's data calls ``bump_generation`` after its commit.
+Read routes wrap their query in ``cached_json_response``, which answers a matching
+``If-None-Match`` with 304 and otherwise serves the body cached for the current
+generation, so unchanged polls never reach the database.
+
+Generations live in process memory, which matches the single-process uvicorn
+deployment in ``app.py``. The process epoch is part of every ETag so a restart
+can never revalidate a body built by a previous process.
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from serializers import ORJSONBytesResponse
+
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PROCESS_EPOCH = uuid.uuid4().hex[:12]
+
+_generation_lock = threading.Lock()
+_generations: Dict[int, int] = {}
+_generation_listeners: List[Callable[[int], None]] = []
+
+
+def add_generation_listener(listener: Callable[[int], None]) -> None:
+    """Call ``listener(user_id)`` after every bump, from whichever thread bumped."""
+    _generation_listeners.append(listener)
+
+
+def bump_generation(user_id: Optional[int]) -> int:
+    """Mark a user's data as changed. Call only after the change is committed."""
+    if user_id is None:
+        return 0
+    with _generation_lock:
+        generation = _generations.get(user_id, 0) + 1
+        _generations[user_id] = generation
+    for listener in _generation_listeners:
+        listener(user_id)
+    return generation
+
+
+def current_generation(user_id: int) -> int:
+    with _generation_lock:
+        return _generations.get(user_id, 0)
+
+
+class ResponseCache:
+    """LRU of serialized bodies keyed by (user, resource), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, generation: int, body: bytes) -> None:
+        size = len(body)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous[1])
+
+            # A body larger than a quarter of the budget would evict everything else
+            if size > self.max_bytes // 4:
+                return
+
+            self._entries[key] = (generation, body)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_body) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted_body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+response_cache = ResponseCache()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return etag in {value[2:] if value.startswith("W/") else value for value in candidates}
+
+
+def cached_json_response(
+    request: Request,
+    user_id: int,
+    resource: str,
+    build: Callable[[], bytes],
+    variant: Optional[str] = None,
+) -> Response:
+    """Serve a user's JSON list from the ETag/LRU cache, calling ``build`` on a miss.
+
+    The generation is read before ``build`` runs, so a change committed while the
+    body is being built leaves the cached entry behind the new generation instead
+    of serving it as current. Bodies that also depend on something other than the
+    user's data, such as the current time, pass it as ``variant``.
+    """
+    generation = current_generation(user_id)
+    etag = f'"{PROCESS_EPOCH}-{user_id}-{generation}"'
+    if variant:
+        etag = f'"{PROCESS_EPOCH}-{user_id}-{generation}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (user_id, resource, str(request.url.query), variant)
+    body = response_cache.get(key, generation)
+    if body is None:
+        body = build()
+        response_cache.put(key, generation, body)
+
+    return ORJSONBytesResponse(content=body, headers=headers)
@@ -1,8 +1,11 @@
 """Shared helpers for API route input handling."""
 import re
+from datetime import datetime
+from typing import Optional
 
 
 HEX_COLOR_PATTERN = re.compile(r"^#[0-9a-fA-F]{6}$")
+MAX_EVENT_DURATION_MINUTES = 7 * 24 * 60
 
 
 def normalize_icon(value):
@@ -22,3 +25,45 @@ def normalize_color(value):
         return None
 
     return trimmed.lower() if HEX_COLOR_PATTERN.match(trimmed) else None
+
+
+def normalize_event_duration(value):
+    """Store a rule's event length in whole minutes; blank or invalid inputs make it a task rule."""
+    if isinstance(value, bool) or value is None:
+        return None
+
+    try:
+        minutes = int(value)
+    except (TypeError, ValueError):
+        return None
+
+    return minutes if 0 < minutes <= MAX_EVENT_DURATION_MINUTES else None
+
+
+def parse_date_only(value: Optional[str]):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed.date()
+
+
+def parse_wall_datetime(value: Optional[str]):
+    """Parse an ISO date or datetime into the naive wall-clock time the app stores."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def parse_time_only(value: Optional[str], fallback_datetime: Optional[str] = None):
+    if isinstance(value, str) and value.strip():
+        parsed = value.strip()
+        if len(parsed) >= 5:
+            return parsed[:5]
+        return parsed
+
+    if fallback_datetime and "T" in fallback_datetime:
+        parsed = datetime.fromisoformat(fallback_datetime.replace('Z', '+00:00'))
+        fallback = parsed.strftime("%H:%M")
+        return fallback if fallback != "00:00" else None
+
+    return None
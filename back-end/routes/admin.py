@@ -0,0 +1,92 @@
+"""Operator diagnostics; every route requires the configured admin token."""
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from typing import Optional
+from profile_capture import PROFILE_CAPTURE_MAX_COUNT, SCHEDULER_TARGET, profile_captures
+from request_profiling import N_PLUS_ONE_THRESHOLD, route_stats
+from slow_query_log import slow_query_log
+
+router = APIRouter()
+
+
+@router.get("/routes")
+async def get_route_stats(route: Optional[str] = Query(None, description="Substring of METHOD /path to keep")):
+    """Latency histograms, percentiles and SQL totals per route since start or the last reset.
+
+    Percentiles are bucket upper bounds in milliseconds; null means beyond the
+    last bucket. ``n_plus_one_statements`` are statement shapes that ran at
+    least ``n_plus_one_threshold`` times within a single request.
+    """
+    routes = route_stats.snapshot()
+    if route:
+        routes = [summary for summary in routes if route in summary["route"]]
+    return {"n_plus_one_threshold": N_PLUS_ONE_THRESHOLD, "routes": routes}
+
+
+@router.delete("/routes")
+async def reset_route_stats():
+    route_stats.reset()
+    return {"message": "Route statistics reset"}
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """The latest statements slower than the threshold, newest first, with their query plans."""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "total": slow_query_log.total,
+        "entries": slow_query_log.entries(limit),
+    }
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries():
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+
+def _profile_targets(request: Request):
+    targets = {SCHEDULER_TARGET}
+    for route in request.app.router.routes:
+        for method in getattr(route, "methods", None) or ():
+            targets.add(f"{method} {route.path}")
+    return targets
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """Armed profile targets and the captured profiles on disk, newest first."""
+    return {"armed": profile_captures.armed(), "files": profile_captures.files()}
+
+
+@router.post("/profiles")
+async def arm_profile(
+    request: Request,
+    target: str = Query(..., description="METHOD /path/{template} of a route, or thread:rule-scheduler"),
+    count: int = Query(1, ge=1, le=PROFILE_CAPTURE_MAX_COUNT),
+    mode: str = Query("cprofile", pattern="^(cprofile|sample)$"),
+):
+    """Profile the next ``count`` requests to a route or ticks of the rule scheduler.
+
+    ``cprofile`` writes a ``.pstats`` file per run and ``sample`` a ``.folded``
+    file of collapsed stacks. Arming a target again replaces its count and mode.
+    """
+    if target not in _profile_targets(request):
+        raise HTTPException(status_code=400, detail=f"Unknown profile target: {target}")
+    return profile_captures.arm(target, count, mode)
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    path = profile_captures.path_for(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain; charset=utf-8" if name.endswith(".folded") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@router.delete("/profiles")
+async def clear_profiles():
+    """Disarm every target and delete the captured profiles."""
+    profile_captures.clear()
+    return {"message": "Profiles cleared"}
@@ -0,0 +1,154 @@
+"""Completion analytics routes, answered from the daily rollups."""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from datetime import date, timedelta
+from database import get_db
+from models import Category, Rule, TaskDailyRollup
+from response_cache import cached_json_response
+from route_utils import parse_date_only
+from serializers import render_orjson
+from view_filters import parse_client_now
+
+router = APIRouter()
+
+ANALYTICS_DEFAULT_DAYS = 365
+
+# SQLite's 'weekday 0' moves forward to Sunday; stepping back six days gives the Monday
+TREND_BUCKETS = {
+    "day": lambda column: column,
+    "week": lambda column: func.date(column, "weekday 0", "-6 days"),
+    "month": lambda column: func.strftime("%Y-%m-01", column),
+}
+
+
+def _analytics_window(start: Optional[str], end: Optional[str], now: Optional[str]) -> Tuple[date, date, date]:
+    try:
+        today = parse_client_now(now).date()
+        window_end = parse_date_only(end) or today
+        window_start = parse_date_only(start) or window_end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date window")
+    if window_end < window_start:
+        raise HTTPException(status_code=400, detail="Invalid date window")
+    return window_start, window_end, today
+
+
+def _count_columns(today: date) -> List:
+    """Summed counts; tasks of past days that are still open count as missed."""
+    return [
+        func.sum(TaskDailyRollup.task_count).label("task_count"),
+        func.sum(TaskDailyRollup.generated_count).label("generated_count"),
+        func.sum(TaskDailyRollup.completed_count).label("completed_count"),
+        func.sum(
+            case((TaskDailyRollup.day < today, TaskDailyRollup.task_count - TaskDailyRollup.completed_count), else_=0)
+        ).label("missed_count"),
+    ]
+
+
+def _with_rate(row: dict) -> dict:
+    row["completion_rate"] = round(row["completed_count"] / row["task_count"], 4) if row["task_count"] else None
+    return row
+
+
+@router.get("/{user_id}/trend")
+async def get_completion_trend(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    category_id: Optional[int] = None,
+    rule_id: Optional[int] = None,
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Task, generated, completed and missed counts per day, week or month.
+
+    Defaults to the last year. Counts lag task writes by at most one rollup pass.
+    """
+    window_start, window_end, today = _analytics_window(start, end, now)
+    period = TREND_BUCKETS[bucket](TaskDailyRollup.day).label("period")
+
+    criteria = [
+        TaskDailyRollup.user_id == user_id,
+        TaskDailyRollup.day >= window_start,
+        TaskDailyRollup.day <= window_end,
+    ]
+    if category_id is not None:
+        criteria.append(TaskDailyRollup.category_id == category_id)
+    if rule_id is not None:
+        criteria.append(TaskDailyRollup.rule_id == rule_id)
+
+    def build():
+        query = select(period, *_count_columns(today)).where(*criteria).group_by(period).order_by(period)
+        rows = [_with_rate(dict(row._mapping)) for row in db.execute(query)]
+        return render_orjson({"start": window_start, "end": window_end, "bucket": bucket, "periods": rows})
+
+    return cached_json_response(request, user_id, "analytics_trend", build, variant=today.isoformat())
+
+
+@router.get("/{user_id}/rules")
+async def get_rule_effectiveness(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Generated, completed and missed occurrences per rule over the window."""
+    window_start, window_end, today = _analytics_window(start, end, now)
+
+    def build():
+        query = (
+            select(TaskDailyRollup.rule_id, Rule.name, *_count_columns(today))
+            .outerjoin(Rule, Rule.id == TaskDailyRollup.rule_id)
+            .where(
+                TaskDailyRollup.user_id == user_id,
+                TaskDailyRollup.rule_id != 0,
+                TaskDailyRollup.day >= window_start,
+                TaskDailyRollup.day <= window_end,
+            )
+            .group_by(TaskDailyRollup.rule_id)
+            .order_by(TaskDailyRollup.rule_id)
+        )
+        rows = [_with_rate(dict(row._mapping)) for row in db.execute(query)]
+        return render_orjson({"start": window_start, "end": window_end, "rules": rows})
+
+    return cached_json_response(request, user_id, "analytics_rules", build, variant=today.isoformat())
+
+
+@router.get("/{user_id}/categories")
+async def get_category_progress(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Task, completed and missed counts per project over the window; null is "no project"."""
+    window_start, window_end, today = _analytics_window(start, end, now)
+
+    def build():
+        query = (
+            select(
+                case((TaskDailyRollup.category_id == 0, None), else_=TaskDailyRollup.category_id).label("category_id"),
+                Category.name,
+                *_count_columns(today),
+            )
+            .outerjoin(Category, Category.id == TaskDailyRollup.category_id)
+            .where(
+                TaskDailyRollup.user_id == user_id,
+                TaskDailyRollup.day >= window_start,
+                TaskDailyRollup.day <= window_end,
+            )
+            .group_by(TaskDailyRollup.category_id)
+            .order_by(TaskDailyRollup.category_id)
+        )
+        rows = [_with_rate(dict(row._mapping)) for row in db.execute(query)]
+        return render_orjson({"start": window_start, "end": window_end, "categories": rows})
+
+    return cached_json_response(request, user_id, "analytics_categories", build, variant=today.isoformat())
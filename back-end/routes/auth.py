@@ -1,12 +1,24 @@
 """Authentication routes."""
 from fastapi import APIRouter, Depends, HTTPException, status, Body
 from sqlalchemy.orm import Session
+from typing import Dict, Optional
 from database import get_db
 from models import User
-import bcrypt
+from password_hashing import PasswordHashingBusy, password_hasher
+from session_tokens import authorize_user_scope, current_identity, issue_access_token, revoke_user_tokens
 
 router = APIRouter()
 
+PASSWORD_HASH_RETRY_AFTER_SECONDS = 1
+
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
 @router.post("/register")
 async def register(
     username: str = Body(...),
@@ -21,13 +33,16 @@ async def register(
             detail="Username already registered"
         )
     
-    # Hash the password
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    # Hash the password off the event loop
+    try:
+        hashed_password = await password_hasher.hash(password)
+    except PasswordHashingBusy:
+        raise _hashing_busy()
     
     # Create new user
     user = User(
         username=username,
-        password=hashed_password.decode('utf-8'),
+        password=hashed_password,
         avatar="🙂",
     )
     
@@ -39,7 +54,8 @@ async def register(
         "id": user.id,
         "username": user.username,
         "avatar": user.avatar or "🙂",
-        "message": "User registered successfully"
+        "message": "User registered successfully",
+        **issue_access_token(user),
     }
 
 @router.post("/login")
@@ -56,26 +72,44 @@ async def login(
             detail="Invalid username or password"
         )
     
-    # Check password
-    if not bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8')):
+    # Check password off the event loop
+    try:
+        password_ok = await password_hasher.verify(password, user.password)
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
+
+    # Upgrade hashes made with a different cost factor while we have the plaintext;
+    # under load the upgrade simply waits for a later login
+    if password_hasher.needs_rehash(user.password):
+        try:
+            user.password = await password_hasher.hash(password)
+            db.commit()
+        except PasswordHashingBusy:
+            pass
     
     return {
         "id": user.id,
         "username": user.username,
         "avatar": user.avatar or "🙂",
-        "message": "Login successful"
+        "message": "Login successful",
+        **issue_access_token(user),
     }
 
-@router.post("/me")
+@router.post("/me", dependencies=[Depends(authorize_user_scope)])
 async def validate_user(
     user_id: int = Body(..., embed=True),
+    identity: Optional[Dict[str, object]] = Depends(current_identity),
     db: Session = Depends(get_db)
 ):
-    """Validate that a stored user ID is still valid."""
+    """Validate that a stored user ID is still valid.
+
+    Called with a valid access token, the response also carries a fresh token.
+    """
     # Find user by ID
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -88,10 +122,18 @@ async def validate_user(
         "id": user.id,
         "username": user.username,
         "avatar": user.avatar or "🙂",
-        "message": "User validation successful"
+        "message": "User validation successful",
+        **(issue_access_token(user) if identity is not None else {}),
     }
 
 @router.post("/logout")
-async def logout():
-    """Logout current user."""
+async def logout(
+    identity: Optional[Dict[str, object]] = Depends(current_identity),
+    db: Session = Depends(get_db)
+):
+    """Logout current user, revoking every access token they hold."""
+    if identity is not None:
+        user = db.query(User).filter(User.id == identity["user_id"]).first()
+        if user:
+            revoke_user_tokens(db, user)
     return {"message": "Logged out successfully"}
@@ -0,0 +1,91 @@
+"""Free/busy and scheduling conflict routes."""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime, timedelta
+from availability import AVAILABILITY_MAX_DAYS, CONFLICT_DEFAULT_DAYS, find_conflicts, free_slots, load_intervals, merge_busy
+from database import get_db, read_snapshot
+from response_cache import cached_json_response
+from route_utils import parse_wall_datetime
+from serializers import render_orjson
+from view_filters import parse_client_now
+
+router = APIRouter()
+
+
+def _window(start: Optional[str], end: Optional[str], default_start: datetime, default_days: int):
+    try:
+        window_start = parse_wall_datetime(start) or default_start
+        window_end = parse_wall_datetime(end) or window_start + timedelta(days=default_days)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if window_end - window_start > timedelta(days=AVAILABILITY_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Window is limited to {AVAILABILITY_MAX_DAYS} days")
+    return window_start, window_end
+
+
+@router.get("/freebusy/{user_id}")
+async def get_freebusy(
+    request: Request,
+    user_id: int,
+    start: str,
+    end: str,
+    min_free_minutes: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Merged busy intervals and the free slots between them within [start, end).
+
+    Busy time comes from events with an end and tasks with both a due and an end
+    time. ``min_free_minutes`` drops free slots shorter than that.
+    """
+    window_start, window_end = _window(start, end, datetime.utcnow(), 0)
+
+    def build():
+        with read_snapshot(db):
+            intervals = load_intervals(db, user_id, window_start, window_end)
+        busy = merge_busy(intervals, window_start, window_end)
+        free = free_slots(busy, window_start, window_end, timedelta(minutes=min_free_minutes))
+        return render_orjson({
+            "start": window_start,
+            "end": window_end,
+            "busy": [{"start": busy_start, "end": busy_end} for busy_start, busy_end in busy],
+            "free": [{"start": free_start, "end": free_end} for free_start, free_end in free],
+        })
+
+    return cached_json_response(request, user_id, "freebusy", build)
+
+
+@router.get("/conflicts/{user_id}")
+async def get_conflicts(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Groups of overlapping events and timed tasks within [start, end).
+
+    Each group lists its items in start order with the group's span and the
+    most items that overlap at any one moment. The window defaults to the next
+    30 days from ``now``, the client's local time.
+    """
+    try:
+        client_now = parse_client_now(now)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    window_start, window_end = _window(start, end, client_now, CONFLICT_DEFAULT_DAYS)
+
+    def build():
+        with read_snapshot(db):
+            intervals = load_intervals(db, user_id, window_start, window_end)
+        return render_orjson({
+            "start": window_start,
+            "end": window_end,
+            "conflicts": list(find_conflicts(intervals)),
+        })
+
+    variant = None if start else client_now.strftime("%Y%m%dT%H%M")
+    return cached_json_response(request, user_id, "conflicts", build, variant=variant)
@@ -0,0 +1,105 @@
+"""Bootstrap route returning everything the app loads on start in one response."""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime, timedelta
+from completion_ledger import iter_ledger_tasks
+from database import get_db, read_snapshot
+from models import ArchivedTask, Category, Event, Rule, SyncVersion, Task, User, UserData
+from response_cache import cached_json_response
+from route_utils import parse_date_only
+from serializers import ARCHIVED_TASK_COLUMNS, TASK_COLUMNS, fetch_dicts, render_orjson
+from task_archive import task_window_filters, window_reaches_archive
+
+router = APIRouter()
+
+@router.get("/{user_id}")
+async def get_bootstrap(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_undated: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Return the user, preferences, projects, rules, tasks and events together.
+
+    All sections are read on one connection inside one read transaction, so they
+    form a consistent snapshot. ``start``/``end`` window the task and event
+    sections by date; tasks spanning into the window through ``end_date`` are
+    kept, and undated tasks are included unless ``include_undated`` is false.
+    Archived tasks and compacted rule history are included when ``start`` reaches
+    past the archive horizon; compacted occurrences carry string ids of the form
+    ``ledger-<rule_id>-<due_date>``.
+    ``sync_version`` can be passed straight to ``GET /sync/`` afterwards.
+    """
+    try:
+        window_start = parse_date_only(start)
+        window_end = parse_date_only(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date window")
+
+    if window_start and window_end and window_end < window_start:
+        raise HTTPException(status_code=400, detail="Invalid date window")
+
+    # Default preferences are created up front so the snapshot itself stays read-only
+    if not db.query(UserData.id).filter(UserData.user_id == user_id).first():
+        if not db.query(User.id).filter(User.id == user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+        db.add(UserData(user_id=user_id, show_categories="[]"))
+        db.commit()
+
+    def build():
+        with read_snapshot(db):
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+
+            sync_version = db.query(SyncVersion.value).filter(SyncVersion.user_id == user_id).scalar() or 0
+            user_data = db.query(UserData).filter(UserData.user_id == user_id).first()
+            categories = db.query(Category).filter(Category.user_id == user_id).all()
+            rules = db.query(Rule).filter(Rule.user_id == user_id).all()
+
+            tasks = fetch_dicts(
+                db,
+                TASK_COLUMNS,
+                Task.user_id == user_id,
+                *task_window_filters(Task, window_start, window_end, include_undated),
+            )
+            if window_reaches_archive(window_start):
+                tasks.extend(fetch_dicts(
+                    db,
+                    ARCHIVED_TASK_COLUMNS,
+                    ArchivedTask.user_id == user_id,
+                    *task_window_filters(ArchivedTask, window_start, window_end, include_undated),
+                ))
+                tasks.extend(iter_ledger_tasks(db, user_id, window_start, window_end))
+
+            event_query = db.query(Event).filter(Event.user_id == user_id)
+            if window_start:
+                window_start_dt = datetime.combine(window_start, datetime.min.time())
+                event_query = event_query.filter(
+                    or_(Event.start_time >= window_start_dt, Event.end_time >= window_start_dt)
+                )
+            if window_end:
+                event_query = event_query.filter(
+                    Event.start_time < datetime.combine(window_end + timedelta(days=1), datetime.min.time())
+                )
+            events = event_query.all()
+
+            return render_orjson({
+                "user": {
+                    "id": user.id,
+                    "username": user.username,
+                    "avatar": user.avatar or "🙂",
+                },
+                "user_data": user_data.to_dict() if user_data else None,
+                "categories": [category.to_dict() for category in categories],
+                "rules": [rule.to_dict() for rule in rules],
+                "tasks": tasks,
+                "events": [event.to_dict() for event in events],
+                "sync_version": sync_version,
+            })
+
+    return cached_json_response(request, user_id, "bootstrap", build)
@@ -0,0 +1,243 @@
+"""Calendar aggregation routes."""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import case, func, not_, or_, select
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from completion_ledger import iter_ledger_tasks
+from database import get_db, read_snapshot
+from models import ArchivedTask, Event, Task
+from response_cache import cached_json_response
+from route_utils import parse_date_only
+from serializers import ARCHIVED_TASK_COLUMNS, EVENT_COLUMNS, TASK_COLUMNS, fetch_dicts, render_orjson
+from task_archive import window_reaches_archive
+from view_filters import (
+    category_filter,
+    category_visible,
+    events_overlapping,
+    is_overdue,
+    load_view_preferences,
+    overdue_filter,
+    parse_client_now,
+)
+
+router = APIRouter()
+
+CALENDAR_DEFAULT_ITEMS = 3
+CALENDAR_MAX_ITEMS = 20
+
+
+def calendar_window(view: str, anchor: date) -> Tuple[date, date]:
+    """First and last day on screen; week and month grids start on Sunday like the client."""
+    if view == "day":
+        return anchor, anchor
+    if view == "week":
+        start = anchor - timedelta(days=(anchor.weekday() + 1) % 7)
+        return start, start + timedelta(days=6)
+    first_of_month = anchor.replace(day=1)
+    start = first_of_month - timedelta(days=(first_of_month.weekday() + 1) % 7)
+    return start, start + timedelta(days=41)  # Six full weeks
+
+
+def _day_range(first: date, last: date):
+    current = first
+    while current <= last:
+        yield current
+        current += timedelta(days=1)
+
+
+def _empty_day(day: date) -> Dict[str, object]:
+    return {
+        "date": day,
+        "task_count": 0,
+        "completed_count": 0,
+        "overdue_count": 0,
+        "event_count": 0,
+        "tasks": [],
+        "events": [],
+    }
+
+
+def _add_task(days: Dict[date, dict], row: dict, now: datetime, window_start: date, window_end: date) -> None:
+    """Count a task built or expanded in Python on every window day it covers."""
+    last_day = max(row["end_date"] or row["due_date"], row["due_date"])
+    overdue = is_overdue(row["is_completed"], row["due_date"], row["due_time"], now)
+    for day in _day_range(max(row["due_date"], window_start), min(last_day, window_end)):
+        bucket = days[day]
+        bucket["task_count"] += 1
+        bucket["completed_count"] += 1 if row["is_completed"] else 0
+        bucket["overdue_count"] += 1 if overdue else 0
+        bucket["tasks"].append(row)
+
+
+def _aggregate_tasks(db: Session, days: Dict[date, dict], model, columns, criteria: List, window_start: date, window_end: date, now: datetime, limit: int) -> None:
+    single_day = [
+        *criteria,
+        model.due_date >= window_start,
+        model.due_date <= window_end,
+        or_(model.end_date.is_(None), model.end_date <= model.due_date),
+    ]
+    counts = db.execute(
+        select(
+            model.due_date,
+            func.count(),
+            func.sum(case((model.is_completed == True, 1), else_=0)),
+            func.sum(case((overdue_filter(model, now), 1), else_=0)),
+        )
+        .where(*single_day)
+        .group_by(model.due_date)
+    ).all()
+    for due_date, total, completed, overdue in counts:
+        bucket = days[due_date]
+        bucket["task_count"] += total
+        bucket["completed_count"] += completed or 0
+        bucket["overdue_count"] += overdue or 0
+
+    # Untimed tasks sort first, then by time, matching the client's cells
+    ranked = (
+        select(
+            *columns,
+            func.row_number().over(partition_by=model.due_date, order_by=(model.due_time, model.id)).label("day_rank"),
+        )
+        .where(*single_day)
+        .subquery()
+    )
+    for row in fetch_dicts(db, [ranked.c[column.key] for column in columns], ranked.c.day_rank <= limit):
+        days[row["due_date"]]["tasks"].append(row)
+
+    spans = fetch_dicts(
+        db,
+        columns,
+        *criteria,
+        model.due_date <= window_end,
+        model.end_date > model.due_date,
+        model.end_date >= window_start,
+    )
+    for row in spans:
+        _add_task(days, row, now, window_start, window_end)
+
+
+def _aggregate_events(db: Session, days: Dict[date, dict], user_id: int, criteria: List, window_start: date, window_end: date, limit: int) -> None:
+    window_start_dt = datetime.combine(window_start, datetime.min.time())
+    window_end_dt = datetime.combine(window_end + timedelta(days=1), datetime.min.time())
+    start_day = func.date(Event.start_time)
+    single_day = [
+        *criteria,
+        Event.start_time >= window_start_dt,
+        Event.start_time < window_end_dt,
+        or_(Event.end_time.is_(None), func.date(Event.end_time) <= start_day),
+    ]
+    for day_text, total in db.execute(select(start_day, func.count()).where(*single_day).group_by(start_day)).all():
+        days[date.fromisoformat(day_text)]["event_count"] += total
+
+    ranked = (
+        select(
+            *EVENT_COLUMNS,
+            func.row_number().over(partition_by=start_day, order_by=(Event.start_time, Event.id)).label("day_rank"),
+        )
+        .where(*single_day)
+        .subquery()
+    )
+    for row in fetch_dicts(db, [ranked.c[column.key] for column in EVENT_COLUMNS], ranked.c.day_rank <= limit):
+        days[row["start_time"].date()]["events"].append(row)
+
+    spans = fetch_dicts(
+        db,
+        EVENT_COLUMNS,
+        *criteria,
+        events_overlapping(user_id, window_start_dt, window_end_dt),
+        func.date(Event.end_time) > start_day,
+    )
+    for row in spans:
+        for day in _day_range(max(row["start_time"].date(), window_start), min(row["end_time"].date(), window_end)):
+            days[day]["event_count"] += 1
+            days[day]["events"].append(row)
+
+
+def _trim_items(bucket: dict, limit: int) -> None:
+    day = bucket["date"]
+
+    def task_key(row):
+        due_time = row["due_time"] if row["due_date"] == day else None
+        # Compacted history has string ids; it sorts after real tasks due at the same time
+        ledger = isinstance(row["id"], str)
+        return (due_time is not None, due_time or "", ledger, row["id"])
+
+    def event_key(row):
+        starts_today = row["start_time"].date() == day
+        return (starts_today, row["start_time"] if starts_today else datetime.min, row["id"])
+
+    bucket["tasks"] = sorted(bucket["tasks"], key=task_key)[:limit]
+    bucket["events"] = sorted(bucket["events"], key=event_key)[:limit]
+
+
+@router.get("/{user_id}")
+async def get_calendar(
+    request: Request,
+    user_id: int,
+    view: str = Query("month", pattern="^(month|week|day)$"),
+    anchor: Optional[str] = None,
+    limit: int = Query(CALENDAR_DEFAULT_ITEMS, ge=0, le=CALENDAR_MAX_ITEMS),
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Per-day task and event aggregates for one calendar screen.
+
+    Each day carries task totals, completed and overdue counts, the event count
+    and its first ``limit`` tasks and events by time. Counts are grouped in SQL,
+    so a month costs one small response however long the history is. Tasks and
+    events spanning several days through ``end_date``/``end_time`` count on every
+    day they cover. The user's project and overdue filters apply as in the client.
+    ``anchor`` defaults to today; ``now`` is the client's local time and decides
+    what is overdue. Compacted rule history appears among the tasks with string
+    ids of the form ``ledger-<rule_id>-<due_date>``.
+    """
+    try:
+        client_now = parse_client_now(now)
+        anchor_date = parse_date_only(anchor) or client_now.date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+
+    window_start, window_end = calendar_window(view, anchor_date)
+
+    def build():
+        with read_snapshot(db):
+            preferences = load_view_preferences(db, user_id)
+            days = {day: _empty_day(day) for day in _day_range(window_start, window_end)}
+
+            task_sources = [(Task, TASK_COLUMNS)]
+            if window_reaches_archive(window_start):
+                task_sources.append((ArchivedTask, ARCHIVED_TASK_COLUMNS))
+            for model, columns in task_sources:
+                criteria = [model.user_id == user_id, category_filter(model, preferences)]
+                if not preferences["show_overdue"]:
+                    criteria.append(not_(overdue_filter(model, client_now)))
+                _aggregate_tasks(db, days, model, columns, criteria, window_start, window_end, client_now, limit)
+
+            if window_reaches_archive(window_start):
+                for row in iter_ledger_tasks(db, user_id, window_start, window_end):
+                    if category_visible(row["category_id"], preferences):
+                        _add_task(days, row, client_now, window_start, window_end)
+
+            _aggregate_events(
+                db,
+                days,
+                user_id,
+                [Event.user_id == user_id, category_filter(Event, preferences)],
+                window_start,
+                window_end,
+                limit,
+            )
+
+            for bucket in days.values():
+                _trim_items(bucket, limit)
+
+            return render_orjson({
+                "view": view,
+                "anchor": anchor_date,
+                "start": window_start,
+                "end": window_end,
+                "days": list(days.values()),
+            })
+
+    return cached_json_response(request, user_id, "calendar", build, variant=client_now.strftime("%Y%m%dT%H%M"))
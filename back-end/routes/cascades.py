@@ -0,0 +1,30 @@
+"""Cascade job progress routes."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from database import get_db
+from models import CascadeJob
+
+router = APIRouter()
+
+@router.get("/")
+async def get_cascade_jobs(user_id: int, limit: int = 50, db: Session = Depends(get_db)):
+    jobs = (
+        db.query(CascadeJob)
+        .filter(CascadeJob.user_id == user_id)
+        .order_by(CascadeJob.id.desc())
+        .limit(max(1, min(limit, 500)))
+        .all()
+    )
+    return [job.to_dict() for job in jobs]
+
+@router.get("/{job_id}")
+async def get_cascade_job(job_id: int, user_id: int, db: Session = Depends(get_db)):
+    job = db.query(CascadeJob).filter(
+        CascadeJob.id == job_id,
+        CascadeJob.user_id == user_id
+    ).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Cascade job not found")
+
+    return job.to_dict()
@@ -1,17 +1,45 @@
 """Category routes."""
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
 from sqlalchemy.orm import Session
 from typing import Optional
+from cascade_jobs import enqueue_cascade, start_cascade
+from category_stats import category_count_columns
 from database import get_db
-from models import Category, Rule, Task
+from models import Category, Event, Rule
+from response_cache import bump_generation, cached_json_response
+from serializers import CATEGORY_COLUMNS, fetch_dicts, render_orjson, streaming_list_response
 from route_utils import normalize_color, normalize_icon
+from view_filters import parse_client_now
 
 router = APIRouter()
 
 @router.get("/")
-async def get_categories(user_id: int, db: Session = Depends(get_db)):
-    categories = db.query(Category).filter(Category.user_id == user_id).all()
-    return [category.to_dict() for category in categories]
+async def get_categories(
+    request: Request,
+    user_id: int,
+    stream: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """List a user's projects with their open, completed and overdue task counts.
+
+    Counts come from the trigger-maintained counters, so the cost grows with the
+    number of projects rather than tasks. ``now`` is the client's local time and
+    decides what is overdue.
+    """
+    try:
+        client_now = parse_client_now(now)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+
+    columns = (*CATEGORY_COLUMNS, *category_count_columns(user_id, client_now))
+    if stream:
+        return streaming_list_response((columns, [Category.user_id == user_id]), stream_format=stream)
+
+    def build():
+        return render_orjson(fetch_dicts(db, columns, Category.user_id == user_id))
+
+    return cached_json_response(request, user_id, "categories", build, variant=client_now.strftime("%Y%m%dT%H%M"))
 
 @router.post("/")
 async def create_category(
@@ -24,6 +52,7 @@ async def create_category(
     category = Category(name=name, icon=normalize_icon(icon), color=normalize_color(color), user_id=user_id)
     db.add(category)
     db.commit()
+    bump_generation(user_id)
     db.refresh(category)
     return category.to_dict()
 
@@ -52,6 +81,7 @@ async def update_category(
         category.color = normalize_color(changes.get('color'))
 
     db.commit()
+    bump_generation(user_id)
     db.refresh(category)
     return category.to_dict()
 
@@ -76,38 +106,33 @@ async def delete_category(
         Rule.category_id == category_id,
     ).all()]
 
-    if rule_ids:
-        if cascade_tasks:
-            # Delete all tasks generated by these rules AND all tasks in this category
-            db.query(Task).filter(
-                Task.user_id == user_id,
-                (Task.rule_id.in_(rule_ids)) | (Task.category_id == category_id),
-            ).delete(synchronize_session=False)
-        else:
-            # Orphan tasks: clear rule_id and category_id
-            db.query(Task).filter(
-                Task.user_id == user_id,
-                Task.rule_id.in_(rule_ids),
-            ).update({Task.rule_id: None, Task.category_id: None}, synchronize_session=False)
-            db.query(Task).filter(
-                Task.user_id == user_id,
-                Task.category_id == category_id,
-            ).update({Task.category_id: None}, synchronize_session=False)
+    # The project and its rules disappear now; their tasks are deleted or
+    # orphaned in bounded chunks so the write lock is never held for long
+    job = enqueue_cascade(
+        db,
+        user_id=user_id,
+        kind="category",
+        target_id=category_id,
+        rule_ids=rule_ids,
+        action="delete" if cascade_tasks else "orphan",
+    )
 
+    if rule_ids:
+        db.query(Event).filter(
+            Event.user_id == user_id,
+            Event.rule_id.in_(rule_ids),
+        ).update({Event.rule_id: None}, synchronize_session=False)
         db.query(Rule).filter(Rule.id.in_(rule_ids)).delete(synchronize_session=False)
-    else:
-        # No rules, but still handle tasks in this category
-        if cascade_tasks:
-            db.query(Task).filter(
-                Task.user_id == user_id,
-                Task.category_id == category_id,
-            ).delete(synchronize_session=False)
-        else:
-            db.query(Task).filter(
-                Task.user_id == user_id,
-                Task.category_id == category_id,
-            ).update({Task.category_id: None}, synchronize_session=False)
-
-    db.delete(category)
+
+    db.query(Event).filter(
+        Event.user_id == user_id,
+        Event.category_id == category_id,
+    ).update({Event.category_id: None}, synchronize_session=False)
+
+    # A query-level delete skips the ORM relationship cascade, which would load and
+    # null out every child task in this request
+    db.query(Category).filter(Category.id == category_id).delete(synchronize_session=False)
     db.commit()
-    return {"message": "Category deleted successfully"}
+    bump_generation(user_id)
+    start_cascade(db, job)
+    return {"message": "Category deleted successfully", "cascade_job": job.to_dict()}
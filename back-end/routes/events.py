@@ -1,17 +1,46 @@
 """Event routes."""
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime
 from database import get_db
 from models import Event
+from response_cache import bump_generation, cached_json_response
+from route_utils import parse_wall_datetime
+from serializers import EVENT_COLUMNS, fetch_dicts, render_orjson, streaming_list_response
+from view_filters import events_overlapping
 
 router = APIRouter()
 
 @router.get("/")
-async def get_events(user_id: int, db: Session = Depends(get_db)):
-    events = db.query(Event).filter(Event.user_id == user_id).all()
-    return [event.to_dict() for event in events]
+async def get_events(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    stream: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """List the user's events, optionally only those overlapping [start, end).
+
+    ``start`` and ``end`` are ISO dates or datetimes in the same wall-clock time
+    as the events; a date means its midnight. Calendar views pass the interval
+    they display.
+    """
+    try:
+        window_start = parse_wall_datetime(start)
+        window_end = parse_wall_datetime(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+
+    criteria = [events_overlapping(user_id, window_start, window_end)]
+    if stream:
+        return streaming_list_response((EVENT_COLUMNS, criteria), stream_format=stream)
+
+    def build():
+        return render_orjson(fetch_dicts(db, EVENT_COLUMNS, *criteria))
+
+    return cached_json_response(request, user_id, "events", build)
 
 @router.post("/")
 async def create_event(
@@ -35,6 +64,7 @@ async def create_event(
     )
     db.add(event)
     db.commit()
+    bump_generation(user_id)
     db.refresh(event)
     return event.to_dict()
 
@@ -61,6 +91,7 @@ async def update_event(
         event.end_time = datetime.fromisoformat(changes.get('end_time').replace('Z', '+00:00'))
 
     db.commit()
+    bump_generation(user_id)
     db.refresh(event)
     return event.to_dict()
 
@@ -80,4 +111,5 @@ async def delete_event(
     
     db.delete(event)
     db.commit()
+    bump_generation(user_id)
     return {"message": "Event deleted successfully"}
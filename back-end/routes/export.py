@@ -0,0 +1,121 @@
+"""Bulk export routes."""
+import csv
+import io
+import zlib
+from datetime import date, datetime
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from typing import Iterator
+from completion_ledger import iter_ledger_tasks
+from database import SessionLocal, read_snapshot
+from models import ArchivedTask, Category, Event, Rule, Task
+from serializers import (
+    ARCHIVED_TASK_COLUMNS,
+    CATEGORY_COLUMNS,
+    EVENT_COLUMNS,
+    RULE_COLUMNS,
+    STREAM_CHUNK_BYTES,
+    TASK_COLUMNS,
+    iter_dicts,
+    iter_ndjson,
+)
+
+router = APIRouter()
+
+# Parents come first so an import can remap category and rule ids as it goes
+EXPORT_SECTIONS = (
+    ("category", CATEGORY_COLUMNS, Category),
+    ("rule", RULE_COLUMNS, Rule),
+    ("task", TASK_COLUMNS, Task),
+    ("task", ARCHIVED_TASK_COLUMNS, ArchivedTask),
+    ("event", EVENT_COLUMNS, Event),
+)
+
+CSV_FIELDS = ["entity"]
+for _, _columns, _ in EXPORT_SECTIONS:
+    CSV_FIELDS.extend(column.key for column in _columns if column.key not in CSV_FIELDS)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _iter_export_rows(db, user_id: int) -> Iterator[dict]:
+    for entity, columns, model in EXPORT_SECTIONS:
+        for row in iter_dicts(db, columns, model.user_id == user_id):
+            yield {"entity": entity, **row}
+        if model is ArchivedTask:
+            # Compacted rule history is exported as ordinary completed tasks
+            for row in iter_ledger_tasks(db, user_id):
+                yield {"entity": "task", **row}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _iter_csv(rows) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for row in rows:
+        writer.writerow([_csv_value(row.get(field)) for field in CSV_FIELDS])
+        if buffer.tell() >= STREAM_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_gzip(chunks) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@router.get("/{user_id}")
+async def export_user_data(
+    user_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+):
+    """Stream all of a user's projects, rules, tasks and events.
+
+    Rows are read from one read transaction with a ``yield_per`` cursor and encoded
+    chunk by chunk, so memory stays constant regardless of history size. Each row
+    carries an ``entity`` field; the output can be fed back into ``POST /import/``.
+    Compacted rule history is exported as completed tasks with string ids of the
+    form ``ledger-<rule_id>-<due_date>``, which the importer ignores like any task id.
+    """
+    def generate() -> Iterator[bytes]:
+        db = SessionLocal()
+        try:
+            with read_snapshot(db):
+                rows = _iter_export_rows(db, user_id)
+                chunks = _iter_csv(rows) if format == "csv" else iter_ndjson(rows)
+                yield from (_iter_gzip(chunks) if gzip else chunks)
+        finally:
+            db.close()
+
+    download_name = f"dial-in-export-{user_id}.{format}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        download_name += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'},
+    )
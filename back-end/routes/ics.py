@@ -0,0 +1,95 @@
+"""iCalendar subscription feed routes."""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from typing import Dict, Tuple
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import gzip
+import threading
+from database import get_db
+from ics_feed import feed_token, feed_token_matches, render_feed
+from models import User
+from response_cache import PROCESS_EPOCH, current_generation, etag_matches, response_cache
+from session_tokens import authorize_user_scope
+
+router = APIRouter()
+
+ICS_MEDIA_TYPE = "text/calendar; charset=utf-8"
+ICS_GZIP_MIN_BYTES = 1024
+
+# user_id -> (generation, day, Last-Modified) of the last feed built for that user
+_feed_stamps: Dict[int, Tuple[int, str, datetime]] = {}
+_feed_stamps_lock = threading.Lock()
+
+
+def _feed_stamp(user_id: int, generation: int, day: str) -> datetime:
+    """When the feed first looked like this; kept until the data or the day changes."""
+    with _feed_stamps_lock:
+        stamp = _feed_stamps.get(user_id)
+        if stamp is None or stamp[0] != generation or stamp[1] != day:
+            stamp = (generation, day, datetime.utcnow().replace(microsecond=0))
+            _feed_stamps[user_id] = stamp
+        return stamp[2]
+
+
+@router.get("/{user_id}/url", dependencies=[Depends(authorize_user_scope)])
+async def get_feed_url(request: Request, user_id: int, db: Session = Depends(get_db)):
+    """The user's subscription URL; it changes when their access tokens are revoked."""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    path = f"/ics/{user_id}/{feed_token(user_id, user.token_version)}.ics"
+    return {"url": str(request.base_url).rstrip("/") + path}
+
+
+@router.get("/{user_id}/{token}.ics")
+async def get_feed(request: Request, user_id: int, token: str, db: Session = Depends(get_db)):
+    """Serve the user's calendar feed for external calendar apps.
+
+    The token in the path is the only credential, since calendar clients cannot
+    send headers. The rendered bytes, plain and gzipped, are cached until the
+    user's data or the date changes. Polls carrying the ETag or Last-Modified
+    are answered 304 without touching the database.
+    """
+    version = db.query(User.token_version).filter(User.id == user_id).first()
+    if version is None or not feed_token_matches(user_id, version[0], token):
+        raise HTTPException(status_code=404, detail="Feed not found")
+
+    generation = current_generation(user_id)
+    today = datetime.utcnow().date()
+    day = today.isoformat()
+    last_modified = _feed_stamp(user_id, generation, day)
+    etag = f'"{PROCESS_EPOCH}-{user_id}-{generation}-{day}-ics"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "private, max-age=300",
+        "Vary": "Accept-Encoding",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and not request.headers.get("if-none-match"):
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        if since is not None and last_modified <= since:
+            return Response(status_code=304, headers=headers)
+
+    wants_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    body = response_cache.get((user_id, "ics", day), generation)
+    if body is None:
+        body = render_feed(db, user_id, today, last_modified)
+        response_cache.put((user_id, "ics", day), generation, body)
+    if wants_gzip and len(body) >= ICS_GZIP_MIN_BYTES:
+        compressed = response_cache.get((user_id, "ics.gz", day), generation)
+        if compressed is None:
+            compressed = gzip.compress(body, compresslevel=6, mtime=0)
+            response_cache.put((user_id, "ics.gz", day), generation, compressed)
+        body = compressed
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=ICS_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,69 @@
+"""Bulk import routes."""
+import gzip
+import io
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+from bulk_import import run_import
+from database import get_db
+from models import User
+
+router = APIRouter()
+
+# Uploads larger than this spill from memory to a temporary file while they arrive
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+CONTENT_TYPE_FORMATS = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+    "text/calendar": "ics",
+}
+
+@router.post("/{user_id}")
+async def import_user_data(
+    request: Request,
+    user_id: int,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv|ics)$"),
+    entity: Optional[str] = Query(None, pattern="^(category|rule|task|event)$"),
+    db: Session = Depends(get_db)
+):
+    """Import projects, rules, tasks and events from an NDJSON, CSV or iCalendar body.
+
+    The raw request body is spooled to a temporary file as it arrives and then
+    parsed record by record, so uploads are never held in memory whole. Gzip
+    bodies (as produced by ``GET /export/{user_id}?gzip=true``) are accepted.
+    ``entity`` supplies the row type for CSV files without an ``entity`` column.
+    The response lists per-row errors; valid rows are imported regardless.
+    """
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    import_format = format or CONTENT_TYPE_FORMATS.get(content_type)
+    if not import_format:
+        raise HTTPException(status_code=400, detail="Unknown import format")
+
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+
+        binary = spool
+        if spool.read(2) == b"\x1f\x8b":
+            spool.seek(0)
+            binary = gzip.GzipFile(fileobj=spool, mode="rb")
+        else:
+            spool.seek(0)
+
+        stream = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+        try:
+            return await run_in_threadpool(run_import, db, user_id, stream, import_format, entity)
+        except (UnicodeDecodeError, OSError, EOFError):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Import body must be UTF-8 text, optionally gzipped")
+        finally:
+            stream.detach()
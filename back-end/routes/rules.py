@@ -1,12 +1,22 @@
 """Rule routes."""
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional, Set
 from datetime import datetime, timedelta
+from cascade_jobs import enqueue_cascade, start_cascade
+from completion_ledger import compact_completion_history, mark_ledger_days_dirty
 from database import get_db
-from models import Rule, Task, Category
-from rule_engine import run_rule_generation, preview_rule_schedule_change, apply_rule_schedule_change
-from route_utils import normalize_color, normalize_icon
+from models import Category, Event, Rule, Task
+from rule_engine import (
+    apply_rule_schedule_change,
+    is_event_rule,
+    preview_rule_schedule_change,
+    run_rule_generation,
+    sync_upcoming_events,
+)
+from response_cache import bump_generation, cached_json_response
+from serializers import RULE_COLUMNS, fetch_dicts, render_orjson, streaming_list_response
+from route_utils import normalize_color, normalize_event_duration, normalize_icon
 
 router = APIRouter()
 
@@ -17,9 +27,19 @@ ALLOWED_SCHEDULE_UPDATE_MODES = {
 }
 
 @router.get("/")
-async def get_rules(user_id: int, db: Session = Depends(get_db)):
-    rules = db.query(Rule).filter(Rule.user_id == user_id).all()
-    return [rule.to_dict() for rule in rules]
+async def get_rules(
+    request: Request,
+    user_id: int,
+    stream: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    if stream:
+        return streaming_list_response((RULE_COLUMNS, [Rule.user_id == user_id]), stream_format=stream)
+
+    def build():
+        return render_orjson(fetch_dicts(db, RULE_COLUMNS, Rule.user_id == user_id))
+
+    return cached_json_response(request, user_id, "rules", build)
 
 @router.post("/")
 async def create_rule(
@@ -30,8 +50,10 @@ async def create_rule(
     color: Optional[str] = Body(None),
     description: Optional[str] = Body(None),
     category_id: int = Body(...),
+    event_duration_minutes: Optional[int] = Body(None),
     db: Session = Depends(get_db)
 ):
+    """Create a rule; with ``event_duration_minutes`` it generates events of that length instead of tasks."""
     category = db.query(Category).filter(
         Category.id == category_id,
         Category.user_id == user_id,
@@ -46,10 +68,12 @@ async def create_rule(
         description=description,
         category_id=category_id,
         user_id=user_id,
-        rate_pattern=rate_pattern
+        rate_pattern=rate_pattern,
+        event_duration_minutes=normalize_event_duration(event_duration_minutes),
     )
     db.add(rule)
     db.commit()
+    bump_generation(user_id)
     db.refresh(rule)
 
     start_date = datetime.utcnow().date()
@@ -58,6 +82,142 @@ async def create_rule(
 
     return rule.to_dict()
 
+BATCH_RULE_OPERATIONS = {"pause", "resume", "move", "repattern"}
+
+@router.post("/batch")
+async def batch_update_rules(
+    user_id: int = Body(...),
+    operations: List[dict] = Body(...),
+    db: Session = Depends(get_db)
+):
+    """Pause, resume, move or re-pattern many rules in one transaction.
+
+    Operations look like ``{"op": "pause" | "resume", "ids": [...]}``,
+    ``{"op": "move", "ids": [...], "category_id": ...}`` and
+    ``{"op": "repattern", "ids": [...], "rate_pattern": ..., "schedule_update_mode": ...}``.
+    Child tasks of moved rules follow them with one UPDATE per target project.
+    Task generation runs once at the end and only for the affected rules;
+    re-patterned rules are regenerated by their schedule update as in update_rule.
+    """
+    requested_ids: Set[int] = set()
+    for operation in operations:
+        ids = operation.get('ids') if 'ids' in operation else [operation.get('id')]
+        if isinstance(ids, list):
+            requested_ids.update(rule_id for rule_id in ids if isinstance(rule_id, int))
+
+    rules_by_id = {
+        rule.id: rule
+        for rule in db.query(Rule).filter(Rule.user_id == user_id, Rule.id.in_(requested_ids)).all()
+    } if requested_ids else {}
+
+    target_category_ids = {
+        operation.get('category_id') for operation in operations
+        if operation.get('op') == 'move' and isinstance(operation.get('category_id'), int)
+    }
+    valid_category_ids = {
+        row[0] for row in db.query(Category.id).filter(
+            Category.user_id == user_id,
+            Category.id.in_(target_category_ids),
+        ).all()
+    } if target_category_ids else set()
+
+    results: List[Dict[str, object]] = []
+    moved_rule_ids: Dict[int, int] = {}
+    regenerate_ids: Set[int] = set()
+    repatterned_ids: Set[int] = set()
+    schedule_updates: Dict[int, Dict[str, object]] = {}
+
+    for index, operation in enumerate(operations):
+        op = operation.get('op')
+        ids = operation.get('ids') if 'ids' in operation else [operation.get('id')]
+        schedule_update_mode = str(operation.get('schedule_update_mode') or 'future_replace_preserve_completed').strip().lower()
+        error = None
+        if op not in BATCH_RULE_OPERATIONS:
+            error = "Unknown operation"
+        elif not isinstance(ids, list) or not all(isinstance(rule_id, int) for rule_id in ids):
+            error = "ids must be a list of rule ids"
+        elif op == 'move' and operation.get('category_id') not in valid_category_ids:
+            error = "Invalid project"
+        elif op == 'repattern':
+            rate_pattern = operation.get('rate_pattern')
+            if not isinstance(rate_pattern, str) or not rate_pattern.strip():
+                error = "rate_pattern is required"
+            elif schedule_update_mode not in ALLOWED_SCHEDULE_UPDATE_MODES:
+                error = "Invalid schedule update mode"
+
+        if error:
+            results.append({"index": index, "op": op, "status": "error", "detail": error})
+            continue
+
+        for rule_id in ids:
+            rule = rules_by_id.get(rule_id)
+            if rule is None:
+                results.append({"index": index, "op": op, "id": rule_id, "status": "not_found"})
+                continue
+
+            if op in ('pause', 'resume'):
+                rule.is_active = op == 'resume'
+                regenerate_ids.add(rule.id)
+            elif op == 'move':
+                rule.category_id = operation['category_id']
+                moved_rule_ids[rule.id] = rule.category_id
+                regenerate_ids.add(rule.id)
+            elif operation['rate_pattern'] != (rule.rate_pattern or ""):
+                rule.rate_pattern = operation['rate_pattern']
+                schedule_updates[rule.id] = {
+                    "mode": schedule_update_mode,
+                    **apply_rule_schedule_change(
+                        db=db,
+                        rule=rule,
+                        next_rate_pattern=operation['rate_pattern'],
+                        mode=schedule_update_mode,
+                        horizon_days=30,
+                    ),
+                }
+                repatterned_ids.add(rule.id)
+
+            results.append({"index": index, "op": op, "id": rule_id, "status": "ok"})
+
+    # Tasks created by schedule changes above must exist before their project is rewritten
+    db.flush()
+
+    # One UPDATE per destination project rather than one per moved rule
+    rule_ids_by_category: Dict[int, List[int]] = {}
+    for rule_id, category_id in moved_rule_ids.items():
+        rule_ids_by_category.setdefault(category_id, []).append(rule_id)
+    for category_id, rule_ids in rule_ids_by_category.items():
+        db.query(Task).filter(
+            Task.user_id == user_id,
+            Task.rule_id.in_(rule_ids),
+        ).update({"category_id": category_id}, synchronize_session=False)
+    mark_ledger_days_dirty(db, list(moved_rule_ids))
+    for rule_id in moved_rule_ids:
+        sync_upcoming_events(db, rules_by_id[rule_id])
+
+    db.commit()
+    bump_generation(user_id)
+
+    start_date = datetime.utcnow().date()
+    end_date = start_date + timedelta(days=30)
+    generation = run_rule_generation(
+        db,
+        start_date,
+        end_date,
+        user_id=user_id,
+        rule_ids=regenerate_ids - repatterned_ids,
+    )
+
+    # Reload the committed rules in one query instead of one refresh per rule
+    rules = db.query(Rule).filter(Rule.id.in_(rules_by_id)).order_by(Rule.id).all() if rules_by_id else []
+
+    return {
+        "results": results,
+        "rules": [rule.to_dict() for rule in rules],
+        "schedule_updates": schedule_updates,
+        "tasks_created": generation["tasks_created"],
+        "events_created": generation["events_created"],
+    }
+
 @router.put("/{rule_id}")
 async def update_rule(
     rule_id: int,
@@ -96,6 +256,12 @@ async def update_rule(
     if schedule_update_mode not in ALLOWED_SCHEDULE_UPDATE_MODES:
         raise HTTPException(status_code=400, detail="Invalid schedule update mode")
 
+    duration_changed = 'event_duration_minutes' in changes
+    next_duration = normalize_event_duration(changes.get('event_duration_minutes')) if duration_changed else None
+    if duration_changed and (next_duration is None) != (rule.event_duration_minutes is None):
+        # Existing children would be left behind as the wrong kind
+        raise HTTPException(status_code=400, detail="A rule cannot switch between tasks and events")
+
     if 'name' in changes and isinstance(changes.get('name'), str):
         next_name = changes.get('name', '').strip()
         if next_name:
@@ -124,11 +290,15 @@ async def update_rule(
     if 'is_active' in changes and isinstance(changes.get('is_active'), bool):
         setattr(rule, 'is_active', bool(changes.get('is_active')))
 
+    if duration_changed:
+        setattr(rule, 'event_duration_minutes', next_duration)
+
     if category_changed:
         db.query(Task).filter(
             Task.rule_id == rule.id,
             Task.user_id == user_id,
         ).update({"category_id": next_category_id}, synchronize_session=False)
+        mark_ledger_days_dirty(db, [rule.id])
 
     schedule_result = None
     if schedule_changed:
@@ -141,7 +311,11 @@ async def update_rule(
             horizon_days=30,
         )
 
+    # After the schedule change, so events it deleted are not written back
+    sync_upcoming_events(db, rule)
+
     db.commit()
+    bump_generation(user_id)
     db.refresh(rule)
 
     if not schedule_changed:
@@ -204,19 +378,51 @@ async def delete_rule(
     
     should_delete_children = delete_children if delete_children is not None else bool(delete_children_body)
 
-    if should_delete_children:
-        db.query(Task).filter(Task.rule_id == rule.id).delete()
+    # Child tasks are deleted or orphaned in bounded chunks after the rule is gone
+    job = enqueue_cascade(
+        db,
+        user_id=user_id,
+        kind="rule",
+        target_id=rule.id,
+        rule_ids=[rule.id],
+        action="delete" if should_delete_children else "orphan",
+    )
+
+    rule_events = db.query(Event).filter(
+        Event.user_id == user_id,
+        Event.rule_id == rule.id,
+    )
+    if should_delete_children and is_event_rule(rule):
+        rule_events.delete(synchronize_session=False)
     else:
-        db.query(Task).filter(Task.rule_id == rule.id).update({"rule_id": None})
+        rule_events.update({Event.rule_id: None}, synchronize_session=False)
 
-    db.delete(rule)
+    # A query-level delete skips the ORM relationship cascade, which would load and
+    # null out every child task in this request
+    db.query(Rule).filter(Rule.id == rule.id).delete(synchronize_session=False)
     db.commit()
+    bump_generation(user_id)
+    start_cascade(db, job)
     return {
         "message": "Rule deleted successfully",
         "delete_children": should_delete_children,
+        "cascade_job": job.to_dict(),
     }
 
 
+@router.post("/{rule_id}/compact-history")
+async def compact_rule_history_route(
+    rule_id: int,
+    user_id: int = Body(..., embed=True),
+    db: Session = Depends(get_db),
+):
+    """Fold the rule's old completed occurrences into its completion ledger."""
+    rule = db.query(Rule.id).filter(Rule.id == rule_id, Rule.user_id == user_id).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return compact_completion_history(db, user_id=user_id, rule_ids=[rule_id])
+
+
 @router.post("/run")
 async def run_rules(
     days_ahead: int = Body(30),
@@ -0,0 +1,143 @@
+"""Full-text search routes over tasks, archived tasks and rules."""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+import re
+from database import SEARCH_INDEXED_TABLES, get_db
+from response_cache import cached_json_response
+from route_utils import parse_date_only
+from serializers import render_orjson
+
+router = APIRouter()
+
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+SEARCH_MAX_TERMS = 8
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_TOKENS = 12
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+TASK_CODE = SEARCH_INDEXED_TABLES["tasks"][0]
+ARCHIVE_CODE = SEARCH_INDEXED_TABLES["tasks_archive"][0]
+RULE_CODE = SEARCH_INDEXED_TABLES["rules"][0]
+
+
+def build_match_expression(user_id: int, query: str) -> Optional[str]:
+    """Turn free text into an FTS5 expression: every word as a prefix, all required, in the user's rows."""
+    terms = TERM_PATTERN.findall(query)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    words = " ".join(f'"{term}"*' for term in terms)
+    return f"owner:u{user_id} AND {{title description}}: ({words})"
+
+
+def _task_hits_sql(table: str, code: int, kind: str, filters: str) -> str:
+    # Own-text hits, then tasks that inherit the text of a matching rule. A deleted
+    # rule's name is read from its cascade job until the job reaches the task.
+    resolved_title = (
+        "COALESCE(NULLIF(t.title, ''), (SELECT name FROM rules WHERE id = t.rule_id), "
+        "(SELECT json_extract(j.inherited_fields, printf('$.\"%d\"[0]', t.rule_id)) FROM cascade_jobs j "
+        "WHERE j.user_id = t.user_id AND json_extract(j.inherited_fields, printf('$.\"%d\"[0]', t.rule_id)) IS NOT NULL "
+        "ORDER BY j.id DESC LIMIT 1))"
+    )
+    columns = (
+        f"'{kind}' AS kind, t.id AS id, t.rule_id AS rule_id, t.category_id AS category_id, "
+        f"{resolved_title} AS title, t.due_date AS due_date, t.due_time AS due_time, "
+        "t.is_completed AS is_completed, h.title_highlight AS title_highlight, h.snippet AS snippet, h.rank AS rank"
+    )
+    return (
+        f"SELECT {columns} FROM hits h JOIN {table} t ON t.id = h.doc_id / 4 "
+        f"WHERE h.doc_id % 4 = {code} {filters} "
+        "UNION ALL "
+        f"SELECT {columns} FROM hits h JOIN {table} t ON t.rule_id = h.doc_id / 4 "
+        f"WHERE h.doc_id % 4 = {RULE_CODE} AND t.user_id = :user_id AND t.title = '' {filters} "
+        f"AND NOT EXISTS (SELECT 1 FROM hits own WHERE own.doc_id = t.id * 4 + {code})"
+    )
+
+
+@router.get("/{user_id}")
+async def search(
+    request: Request,
+    user_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_archived: bool = True,
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Search task and rule titles and descriptions, best matches first.
+
+    Every word matches as a prefix, so ``gro mil`` finds "Grocery run: milk".
+    Rule-generated tasks match through their rule's text. ``start`` and ``end``
+    bound task due dates and leave rules out of the results. ``title_highlight``
+    and the description ``snippet`` mark matched words with ``<mark>`` tags
+    around the raw stored text; inheriting tasks carry their rule's.
+    """
+    match = build_match_expression(user_id, q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Search query has no searchable words")
+    try:
+        window_start = parse_date_only(start)
+        window_end = parse_date_only(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date window")
+
+    params: Dict[str, object] = {
+        "match": match,
+        "user_id": user_id,
+        "limit": limit + 1,
+        "offset": offset,
+    }
+    task_filters: List[str] = []
+    if category_id is not None:
+        task_filters.append("AND t.category_id = :category_id")
+        params["category_id"] = category_id
+    if window_start is not None:
+        task_filters.append("AND t.due_date >= :start")
+        params["start"] = window_start.isoformat()
+    if window_end is not None:
+        task_filters.append("AND t.due_date <= :end")
+        params["end"] = window_end.isoformat()
+    filters = " ".join(task_filters)
+
+    branches = [_task_hits_sql("tasks", TASK_CODE, "task", filters)]
+    if include_archived:
+        branches.append(_task_hits_sql("tasks_archive", ARCHIVE_CODE, "archived_task", filters))
+    if window_start is None and window_end is None:
+        rule_filter = "AND r.category_id = :category_id" if category_id is not None else ""
+        branches.append(
+            "SELECT 'rule' AS kind, r.id AS id, r.id AS rule_id, r.category_id AS category_id, r.name AS title, "
+            "NULL AS due_date, NULL AS due_time, NULL AS is_completed, h.title_highlight AS title_highlight, "
+            "h.snippet AS snippet, h.rank AS rank "
+            f"FROM hits h JOIN rules r ON r.id = h.doc_id / 4 WHERE h.doc_id % 4 = {RULE_CODE} {rule_filter}"
+        )
+
+    statement = text(
+        "WITH hits AS MATERIALIZED ("
+        "SELECT rowid AS doc_id, bm25(search_index, 0.0, 10.0, 1.0) AS rank, "
+        f"highlight(search_index, 1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}') AS title_highlight, "
+        f"snippet(search_index, 2, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet "
+        "FROM search_index WHERE search_index MATCH :match"
+        ") SELECT * FROM ("
+        + " UNION ALL ".join(branches)
+        + ") ORDER BY rank, kind = 'rule' DESC, due_date DESC, kind, id LIMIT :limit OFFSET :offset"
+    )
+
+    def build():
+        rows = [dict(row._mapping) for row in db.execute(statement, params)]
+        for row in rows:
+            if row["is_completed"] is not None:
+                row["is_completed"] = bool(row["is_completed"])
+        return render_orjson({
+            "query": q,
+            "results": rows[:limit],
+            "has_more": len(rows) > limit,
+        })
+
+    return cached_json_response(request, user_id, "search", build)
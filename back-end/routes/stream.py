@@ -0,0 +1,90 @@
+"""Server-sent events stream of data changes."""
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+import orjson
+from change_stream import CHANGE_STREAM_BATCH_SIZE, change_bus, current_change_version, read_changes
+
+router = APIRouter()
+
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_RETRY_MILLISECONDS = 3000
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {orjson.dumps(data).decode()}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/{user_id}")
+async def stream_changes(
+    user_id: int,
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """Push a ``change`` event per created, updated or deleted row.
+
+    Each event carries ``{"entity", "id", "op", "version"}`` and uses the sync
+    version as its SSE id, so a reconnecting ``EventSource`` resumes from
+    ``Last-Event-ID`` without gaps; ``since`` does the same for a first connect
+    after ``GET /sync/``. With neither, the stream starts at the current version.
+    A ``reset`` event means the client is ahead of the server and should sync
+    from zero. ``reminder`` events announce tasks and events coming due; they
+    are not replayed. Idle streams receive a comment every 15 seconds. Since
+    ``EventSource`` cannot set headers, the access token may be passed as
+    ``?access_token=`` here, unlike on every other route.
+    """
+    cursor = since
+    if last_event_id:
+        try:
+            cursor = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    if not change_bus.has_capacity(user_id):
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many open streams")
+
+    async def events() -> AsyncIterator[str]:
+        # Subscribed before the first read so no change can slip in between
+        subscription = change_bus.subscribe(user_id)
+        if subscription is None:
+            return
+        position = cursor
+        try:
+            current = await run_in_threadpool(current_change_version, user_id)
+            yield f"retry: {STREAM_RETRY_MILLISECONDS}\n\n"
+            if position is None or position > current:
+                if position is not None:
+                    yield _sse("reset", {"version": current}, current)
+                position = current
+            yield _sse("ready", {"version": position}, position)
+
+            while True:
+                # Cleared before reading, so a change committed during the read wakes the next round
+                subscription.clear()
+                messages = subscription.drain()
+                if messages:
+                    yield "".join(_sse(event, data) for event, data in messages)
+                changes = await run_in_threadpool(read_changes, user_id, position)
+                if changes:
+                    yield "".join(
+                        _sse("change", {"entity": entity, "id": entity_id, "op": op, "version": version}, version)
+                        for version, entity, entity_id, op in changes
+                    )
+                    position = changes[-1][0]
+                    if len(changes) == CHANGE_STREAM_BATCH_SIZE:
+                        continue
+
+                if not await subscription.wait(STREAM_HEARTBEAT_SECONDS):
+                    yield ": heartbeat\n\n"
+        finally:
+            change_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
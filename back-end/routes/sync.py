@@ -0,0 +1,45 @@
+"""Delta sync routes."""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from database import get_db
+from models import Category, Event, Rule, SyncTombstone, SyncVersion, Task
+
+router = APIRouter()
+
+@router.get("/")
+async def get_changes(user_id: int, since: int = 0, db: Session = Depends(get_db)):
+    """Return rows created, changed or deleted after the given change version.
+
+    Clients store the returned ``version`` and pass it back as ``since`` on the
+    next call. Apply rows and tombstones in version order: a tombstone only
+    removes a row the client holds at an older version. When ``reset`` is true
+    the client's version is ahead of the server and it should discard its
+    stores and sync again from zero.
+    """
+    # Read the counter first so nothing committed after it can be skipped next time
+    current_version = db.query(SyncVersion.value).filter(SyncVersion.user_id == user_id).scalar() or 0
+    reset = since > current_version
+    if reset:
+        since = 0
+
+    categories = db.query(Category).filter(Category.user_id == user_id, Category.version > since).all()
+    rules = db.query(Rule).filter(Rule.user_id == user_id, Rule.version > since).all()
+    tasks = db.query(Task).filter(Task.user_id == user_id, Task.version > since).all()
+    events = db.query(Event).filter(Event.user_id == user_id, Event.version > since).all()
+    tombstones = (
+        db.query(SyncTombstone)
+        .filter(SyncTombstone.user_id == user_id, SyncTombstone.version > since)
+        .order_by(SyncTombstone.version)
+        .all()
+    )
+
+    return {
+        "version": current_version,
+        "since": since,
+        "reset": reset,
+        "categories": [category.to_dict() for category in categories],
+        "rules": [rule.to_dict() for rule in rules],
+        "tasks": [task.to_dict() for task in tasks],
+        "events": [event.to_dict() for event in events],
+        "deleted": [tombstone.to_dict() for tombstone in tombstones],
+    }
@@ -1,38 +1,146 @@
 """Task routes."""
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Request
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, List, Optional, Set
 from datetime import datetime
+from completion_ledger import iter_ledger_tasks
 from database import get_db
-from models import Task
-from route_utils import normalize_color, normalize_icon
+from models import ArchivedTask, Task
+from response_cache import bump_generation, cached_json_response
+from serializers import ARCHIVED_TASK_COLUMNS, TASK_COLUMNS, fetch_dicts, render_orjson, streaming_list_response
+from task_archive import restore_archived_task, restore_archived_tasks, task_window_filters, window_reaches_archive
+from route_utils import normalize_color, normalize_icon, parse_date_only, parse_time_only
+from view_filters import load_view_preferences, parse_client_now, visible_tasks_filter
 
 router = APIRouter()
 
-def parse_date_only(value: Optional[str]):
-    if not value:
-        return None
-    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
-    return parsed.date()
+BATCH_OPERATIONS = {"complete", "incomplete", "update", "delete"}
+# Keeps IN (...) lists well under SQLite's bound-parameter limit
+BATCH_ID_CHUNK_SIZE = 500
 
-def parse_time_only(value: Optional[str], fallback_datetime: Optional[str] = None):
-    if isinstance(value, str) and value.strip():
-        parsed = value.strip()
-        if len(parsed) >= 5:
-            return parsed[:5]
-        return parsed
+def _task_update_values(changes: dict) -> dict:
+    """Translate an update_task changes dict into column values for a set-based UPDATE.
 
-    if fallback_datetime and "T" in fallback_datetime:
-        parsed = datetime.fromisoformat(fallback_datetime.replace('Z', '+00:00'))
-        fallback = parsed.strftime("%H:%M")
-        return fallback if fallback != "00:00" else None
+    Mirrors update_task field by field. Where update_task consults the row's
+    current due/end date, a CASE expression evaluates it per row instead.
+    """
+    values = {}
+    if 'title' in changes:
+        values[Task.title] = changes.get('title')
+    if 'icon' in changes:
+        values[Task.icon] = normalize_icon(changes.get('icon'))
+    if 'color' in changes:
+        values[Task.color] = normalize_color(changes.get('color'))
+    if 'description' in changes:
+        values[Task.description] = changes.get('description')
+    if 'category_id' in changes:
+        values[Task.category_id] = changes.get('category_id')
+    if 'is_completed' in changes:
+        values[Task.is_completed] = changes.get('is_completed')
+    if 'completed_at' in changes and changes.get('completed_at') is not None:
+        values[Task.completed_at] = datetime.fromisoformat(changes.get('completed_at').replace('Z', '+00:00'))
 
-    return None
+    for date_key, time_key, date_column, time_column in (
+        ('due_date', 'due_time', Task.due_date, Task.due_time),
+        ('end_date', 'end_time', Task.end_date, Task.end_time),
+    ):
+        if date_key in changes:
+            val = changes.get(date_key)
+            values[date_column] = parse_date_only(val)
+            if not val:
+                values[time_column] = None
+            elif time_key not in changes:
+                values[time_column] = parse_time_only(None, val)
+        if time_key in changes:
+            if date_key in changes:
+                values[time_column] = parse_time_only(changes.get(time_key)) if values[date_column] else None
+            else:
+                values[time_column] = case(
+                    (date_column.isnot(None), parse_time_only(changes.get(time_key))),
+                    else_=None,
+                )
+    return values
 
 @router.get("/")
-async def get_tasks(user_id: int, db: Session = Depends(get_db)):
-    tasks = db.query(Task).filter(Task.user_id == user_id).all()
-    return [task.to_dict() for task in tasks]
+async def get_tasks(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_archived: bool = False,
+    stream: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """List a user's tasks, optionally windowed by date.
+
+    Archived (old completed) tasks and compacted rule history are only included
+    when ``start`` reaches back past the archive horizon or ``include_archived`` is set.
+    Compacted occurrences have no task row; their ``id`` is the string
+    ``ledger-<rule_id>-<due_date>`` and the task routes do not accept it.
+    """
+    try:
+        window_start = parse_date_only(start)
+        window_end = parse_date_only(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date window")
+
+    queries = [(TASK_COLUMNS, [Task.user_id == user_id, *task_window_filters(Task, window_start, window_end)])]
+    ledger_rows = None
+    if window_reaches_archive(window_start, include_archived):
+        queries.append((
+            ARCHIVED_TASK_COLUMNS,
+            [ArchivedTask.user_id == user_id, *task_window_filters(ArchivedTask, window_start, window_end)],
+        ))
+        ledger_rows = lambda session: iter_ledger_tasks(session, user_id, window_start, window_end)
+
+    if stream:
+        return streaming_list_response(*queries, stream_format=stream, extra_rows=ledger_rows)
+
+    def build():
+        rows = [row for columns, criteria in queries for row in fetch_dicts(db, columns, *criteria)]
+        if ledger_rows is not None:
+            rows.extend(ledger_rows(db))
+        return render_orjson(rows)
+
+    return cached_json_response(request, user_id, "tasks", build)
+
+@router.get("/view/{user_id}")
+async def get_task_view(
+    request: Request,
+    user_id: int,
+    now: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Return exactly the tasks the user's task list shows, sorted for display.
+
+    The stored ``time_period``, ``show_undated``, ``show_uncategorized``,
+    ``show_overdue`` and ``show_categories`` preferences become one query over
+    the recent tasks. Dated tasks are ordered by when they start and undated ones
+    by when they were created, as in the client. ``now`` is the client's local
+    time and decides "today" and what is overdue.
+    """
+    try:
+        client_now = parse_client_now(now)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+
+    sort_key = case(
+        (Task.due_date.isnot(None), func.printf("%s %s", Task.due_date, func.coalesce(Task.due_time, "00:00"))),
+        else_=func.strftime("%Y-%m-%d %H:%M", Task.created_at),
+    )
+
+    def build():
+        preferences = load_view_preferences(db, user_id)
+        rows = db.execute(
+            select(*TASK_COLUMNS)
+            .where(Task.user_id == user_id, visible_tasks_filter(Task, preferences, client_now))
+            .order_by(sort_key, Task.id)
+        ).all()
+        keys = [column.key for column in TASK_COLUMNS]
+        return render_orjson([dict(zip(keys, row)) for row in rows])
+
+    return cached_json_response(request, user_id, "tasks_view", build, variant=client_now.strftime("%Y%m%dT%H%M"))
 
 @router.post("/")
 async def create_task(
@@ -66,9 +174,100 @@ async def create_task(
     )
     db.add(task)
     db.commit()
+    bump_generation(user_id)
     db.refresh(task)
     return task.to_dict()
 
+@router.post("/batch")
+async def batch_update_tasks(
+    user_id: int = Body(...),
+    operations: List[dict] = Body(...),
+    db: Session = Depends(get_db)
+):
+    """Apply complete/incomplete/update/delete operations to many tasks at once.
+
+    Each operation is ``{"op": ..., "ids": [...], "changes": {...}}`` (``id`` may
+    be given instead of ``ids``; ``changes`` only for ``update``) and becomes one
+    set-based UPDATE or DELETE per id chunk. Everything commits in one transaction.
+    ``update`` follows update_task, including refusing ``rule_id`` changes. Results
+    are reported per operation and id, in request order. Archived tasks are moved
+    back into ``tasks`` first, as the single-task routes do.
+    """
+    requested_ids: Set[int] = set()
+    for operation in operations:
+        ids = operation.get('ids') if 'ids' in operation else [operation.get('id')]
+        if isinstance(ids, list):
+            requested_ids.update(task_id for task_id in ids if isinstance(task_id, int))
+
+    existing_ids: Set[int] = set()
+    requested_list = sorted(requested_ids)
+    for offset in range(0, len(requested_list), BATCH_ID_CHUNK_SIZE):
+        chunk = requested_list[offset:offset + BATCH_ID_CHUNK_SIZE]
+        hot_ids = {row[0] for row in db.query(Task.id).filter(Task.user_id == user_id, Task.id.in_(chunk)).all()}
+        existing_ids.update(hot_ids)
+        archived_candidates = [task_id for task_id in chunk if task_id not in hot_ids]
+        if archived_candidates:
+            existing_ids.update(restore_archived_tasks(db, user_id, archived_candidates))
+
+    results: List[Dict[str, object]] = []
+    updated_count = 0
+    deleted_count = 0
+
+    for index, operation in enumerate(operations):
+        op = operation.get('op')
+        ids = operation.get('ids') if 'ids' in operation else [operation.get('id')]
+        error = None
+        if op not in BATCH_OPERATIONS:
+            error = "Unknown operation"
+        elif not isinstance(ids, list) or not all(isinstance(task_id, int) for task_id in ids):
+            error = "ids must be a list of task ids"
+        elif op == 'update':
+            changes = operation.get('changes')
+            if not isinstance(changes, dict):
+                error = "changes are required"
+            elif 'rule_id' in changes:
+                error = "rule_id cannot be set through manual task updates"
+            else:
+                try:
+                    values = _task_update_values(changes)
+                except (AttributeError, TypeError, ValueError):
+                    error = "Invalid changes"
+
+        if error:
+            results.append({"index": index, "op": op, "status": "error", "detail": error})
+            continue
+
+        found_ids = [task_id for task_id in dict.fromkeys(ids) if task_id in existing_ids]
+        results.extend(
+            {"index": index, "op": op, "id": task_id, "status": "ok" if task_id in existing_ids else "not_found"}
+            for task_id in ids
+        )
+
+        if op == 'complete':
+            values = {Task.is_completed: True, Task.completed_at: datetime.utcnow()}
+        elif op == 'incomplete':
+            values = {Task.is_completed: False, Task.completed_at: None}
+
+        for offset in range(0, len(found_ids), BATCH_ID_CHUNK_SIZE):
+            chunk = found_ids[offset:offset + BATCH_ID_CHUNK_SIZE]
+            chunk_query = db.query(Task).filter(Task.user_id == user_id, Task.id.in_(chunk))
+            if op == 'delete':
+                deleted_count += chunk_query.delete(synchronize_session=False)
+            elif values:
+                updated_count += chunk_query.update(values, synchronize_session=False)
+
+        if op == 'delete':
+            existing_ids.difference_update(found_ids)
+
+    db.commit()
+    bump_generation(user_id)
+
+    return {
+        "results": results,
+        "updated": updated_count,
+        "deleted": deleted_count,
+    }
+
 @router.put("/{task_id}")
 async def update_task(
     task_id: int,
@@ -85,7 +284,7 @@ async def update_task(
     task = db.query(Task).filter(
         Task.id == task_id,
         Task.user_id == user_id
-    ).first()
+    ).first() or restore_archived_task(db, task_id, user_id)
 
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -124,6 +323,7 @@ async def update_task(
         task.end_time = parse_time_only(changes.get('end_time')) if task.end_date else None
 
     db.commit()
+    bump_generation(user_id)
     db.refresh(task)
     return task.to_dict()
 
@@ -136,7 +336,7 @@ async def complete_task(
     task = db.query(Task).filter(
         Task.id == task_id,
         Task.user_id == user_id
-    ).first()
+    ).first() or restore_archived_task(db, task_id, user_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -145,6 +345,7 @@ async def complete_task(
     task.completed_at = datetime.utcnow()
     
     db.commit()
+    bump_generation(user_id)
     db.refresh(task)
     return task.to_dict()
 
@@ -157,7 +358,7 @@ async def mark_task_incomplete(
     task = db.query(Task).filter(
         Task.id == task_id,
         Task.user_id == user_id
-    ).first()
+    ).first() or restore_archived_task(db, task_id, user_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -166,6 +367,7 @@ async def mark_task_incomplete(
     task.completed_at = None
     
     db.commit()
+    bump_generation(user_id)
     db.refresh(task)
     return task.to_dict()
 
@@ -178,11 +380,12 @@ async def delete_task(
     task = db.query(Task).filter(
         Task.id == task_id,
         Task.user_id == user_id
-    ).first()
+    ).first() or restore_archived_task(db, task_id, user_id)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     db.delete(task)
     db.commit()
+    bump_generation(user_id)
     return {"message": "Task deleted successfully"}
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
+from response_cache import bump_generation
 
 router = APIRouter()
 
@@ -46,6 +47,7 @@ async def update_user(
         user.avatar = avatar_value if isinstance(avatar_value, str) and avatar_value.strip() else "🙂"
 
     db.commit()
+    bump_generation(user_id)
     db.refresh(user)
 
     return {
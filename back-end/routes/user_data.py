@@ -1,9 +1,11 @@
 """User data routes for managing user preferences and settings."""
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import update
 from database import get_db
 from models import UserData
+from response_cache import bump_generation, cached_json_response
+from serializers import render_orjson
 from datetime import datetime
 from typing import Optional, List
 import json
@@ -11,8 +13,16 @@ import json
 router = APIRouter()
 
 @router.get("/{user_id}")
-def get_user_data(user_id: int, db: Session = Depends(get_db)):
+def get_user_data(request: Request, user_id: int, db: Session = Depends(get_db)):
     """Get user data/preferences for a specific user."""
+    return cached_json_response(
+        request,
+        user_id,
+        "user_data",
+        lambda: render_orjson(_load_or_create_user_data(db, user_id).to_dict()),
+    )
+
+def _load_or_create_user_data(db: Session, user_id: int) -> UserData:
     user_data = db.query(UserData).filter(UserData.user_id == user_id).first()
     
     if not user_data:
@@ -31,7 +41,7 @@ def get_user_data(user_id: int, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(user_data)
     
-    return user_data.to_dict()
+    return user_data
 
 @router.post("/")
 def create_user_data(
@@ -66,6 +76,7 @@ def create_user_data(
     )
     db.add(db_user_data)
     db.commit()
+    bump_generation(user_id)
     db.refresh(db_user_data)
     return db_user_data.to_dict()
 
@@ -104,6 +115,7 @@ def update_user_data(
     
     user_data.updated_at = datetime.utcnow()
     db.commit()
+    bump_generation(user_id)
     db.refresh(user_data)
     
     return user_data.to_dict()
@@ -121,4 +133,5 @@ def delete_user_data(
     
     db.delete(user_data)
     db.commit()
+    bump_generation(user_id)
     return {"message": "User data deleted successfully"}
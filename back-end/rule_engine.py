@@ -1,16 +1,22 @@
-"""Rule execution engine for generating tasks from active rules."""
+"""Rule execution engine for generating tasks and events from active rules.
+
+Rules with ``event_duration_minutes`` produce events of that length at each
+occurrence; all other rules produce tasks.
+"""
 from __future__ import annotations
 
 from datetime import date, datetime, timedelta
 import re
 import threading
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from database import SessionLocal
-from models import Rule, Task
+from models import Event, Rule, Task
+from profile_capture import SCHEDULER_TARGET, profile_captures
+from response_cache import bump_generation
 
 FREQUENCY_PATTERN = re.compile(r"^(mw|d|w|m|y)#([^MT;]+)")
 MONTH_FILTER_PATTERN = re.compile(r"M#([^T;]+)")
@@ -179,6 +185,20 @@ def parse_rate_pattern(rate_pattern: str) -> List[Dict[str, object]]:
     return segments
 
 
+def segment_occurrences(
+    segment: Dict[str, object],
+    anchor_date: date,
+    start_date: date,
+    end_date: date,
+) -> Iterator[date]:
+    """Yield the days in [start_date, end_date] on which one parsed segment fires."""
+    current_day = start_date
+    while current_day <= end_date:
+        if _segment_matches_date(segment, current_day, anchor_date):
+            yield current_day
+        current_day += timedelta(days=1)
+
+
 def _build_due_datetimes_for_pattern(
     rate_pattern: str,
     anchor_date: date,
@@ -239,6 +259,72 @@ def _time_part_string(value: datetime) -> Optional[str]:
     return time_value if time_value != "00:00" else None
 
 
+def _generated_task(rule: Rule, due_datetime: datetime) -> Task:
+    # Title and description are left empty so they are read through from the rule
+    # (see Task.to_dict); the category stays on the row because every list filters on it
+    return Task(
+        title="",
+        description=None,
+        category_id=getattr(rule, "category_id", None),
+        rule_id=getattr(rule, "id"),
+        user_id=getattr(rule, "user_id"),
+        is_completed=False,
+        due_date=_date_part(due_datetime),
+        due_time=_time_part_string(due_datetime),
+    )
+
+
+def is_event_rule(rule: Rule) -> bool:
+    return bool(getattr(rule, "event_duration_minutes", None))
+
+
+def _generated_event(rule: Rule, start_time: datetime) -> Event:
+    # Events have no read-through, so the rule's text is copied; rule edits update upcoming ones
+    return Event(
+        title=getattr(rule, "name"),
+        description=getattr(rule, "description", None),
+        category_id=getattr(rule, "category_id", None),
+        rule_id=getattr(rule, "id"),
+        user_id=getattr(rule, "user_id"),
+        start_time=start_time,
+        end_time=start_time + timedelta(minutes=int(getattr(rule, "event_duration_minutes"))),
+    )
+
+
+def _child_model(rule: Rule):
+    return Event if is_event_rule(rule) else Task
+
+
+def _child_datetime(child) -> Optional[datetime]:
+    if isinstance(child, Event):
+        return child.start_time
+    return _combine_task_datetime(child)
+
+
+def _generated_child(rule: Rule, due_datetime: datetime):
+    if is_event_rule(rule):
+        return _generated_event(rule, due_datetime)
+    return _generated_task(rule, due_datetime)
+
+
+def sync_upcoming_events(db: Session, rule: Rule) -> int:
+    """Copy the rule's name, description, project and duration onto its events that have not started."""
+    if not is_event_rule(rule):
+        return 0
+
+    events = (
+        db.query(Event)
+        .filter(Event.rule_id == rule.id, Event.user_id == rule.user_id, Event.start_time >= datetime.utcnow())
+        .all()
+    )
+    for event in events:
+        event.title = rule.name
+        event.description = rule.description
+        event.category_id = rule.category_id
+        event.end_time = event.start_time + timedelta(minutes=int(rule.event_duration_minutes))
+    return len(events)
+
+
 def _schedule_preview_summary(delete_count: int, create_count: int) -> Dict[str, int]:
     return {
         "delete_count": max(0, delete_count),
@@ -258,7 +344,8 @@ def preview_rule_schedule_change(
     start_future_dt = datetime.combine(start_future, datetime.min.time())
     end_future = start_future + timedelta(days=horizon_days)
 
-    existing_tasks = db.query(Task).filter(Task.rule_id == rule.id, Task.user_id == rule.user_id).all()
+    child_model = _child_model(rule)
+    existing_tasks = db.query(child_model).filter(child_model.rule_id == rule.id, child_model.user_id == rule.user_id).all()
     if len(existing_tasks) == 0:
         return {
             "has_child_tasks": False,
@@ -276,13 +363,13 @@ def preview_rule_schedule_change(
     existing_due_dates = {
         due_datetime
         for task in existing_tasks
-        for due_datetime in [_combine_task_datetime(task)]
+        for due_datetime in [_child_datetime(task)]
         if due_datetime is not None
     }
 
     existing_future_incomplete = []
     for task in existing_tasks:
-        due_date = _combine_task_datetime(task)
+        due_date = _child_datetime(task)
         is_completed = bool(getattr(task, "is_completed", False))
         if due_date is not None and due_date >= start_future_dt and not is_completed:
             existing_future_incomplete.append(task)
@@ -290,14 +377,14 @@ def preview_rule_schedule_change(
     expected_future = _build_due_datetimes_for_pattern(next_rate_pattern, anchor_date, start_future, end_future)
     kept_due_dates_for_future_replace = set()
     for task in existing_tasks:
-        due_date = _combine_task_datetime(task)
+        due_date = _child_datetime(task)
         is_completed = bool(getattr(task, "is_completed", False))
         if due_date is not None and not (due_date >= start_future_dt and not is_completed):
             kept_due_dates_for_future_replace.add(due_date)
     future_replace_creates = len(expected_future - kept_due_dates_for_future_replace)
     future_replace_deletes = len(existing_future_incomplete)
 
-    all_due_dates = [due_datetime for task in existing_tasks for due_datetime in [_combine_task_datetime(task)] if due_datetime is not None]
+    all_due_dates = [due_datetime for task in existing_tasks for due_datetime in [_child_datetime(task)] if due_datetime is not None]
     all_start_date = min((due_date.date() for due_date in all_due_dates), default=anchor_date)
     expected_all = _build_due_datetimes_for_pattern(next_rate_pattern, anchor_date, all_start_date, end_future)
     all_replace_deletes = len(existing_tasks)
@@ -332,43 +419,33 @@ def apply_rule_schedule_change(
     created_at_value = getattr(rule, "created_at", None)
     anchor_date = created_at_value.date() if isinstance(created_at_value, datetime) else start_future
 
-    existing_tasks = db.query(Task).filter(Task.rule_id == rule.id, Task.user_id == rule.user_id).all()
+    child_model = _child_model(rule)
+    existing_tasks = db.query(child_model).filter(child_model.rule_id == rule.id, child_model.user_id == rule.user_id).all()
     deleted_count = 0
     created_count = 0
 
     if normalized_mode == "future_replace_preserve_completed":
         deletable_tasks = []
         for task in existing_tasks:
-            due_date = _combine_task_datetime(task)
+            due_date = _child_datetime(task)
             is_completed = bool(getattr(task, "is_completed", False))
             if due_date is not None and due_date >= start_future_dt and not is_completed:
                 deletable_tasks.append(task)
         deletable_ids = [task.id for task in deletable_tasks if task.id is not None]
         deleted_count = len(deletable_ids)
         if deletable_ids:
-            db.query(Task).filter(Task.id.in_(deletable_ids)).delete(synchronize_session=False)
+            db.query(child_model).filter(child_model.id.in_(deletable_ids)).delete(synchronize_session=False)
 
         kept_due_dates = {
             due_datetime
             for task in existing_tasks
             if task.id not in set(deletable_ids)
-            for due_datetime in [_combine_task_datetime(task)]
+            for due_datetime in [_child_datetime(task)]
             if due_datetime is not None
         }
         expected_due_dates = _build_due_datetimes_for_pattern(next_rate_pattern, anchor_date, start_future, end_future)
         for due_datetime in sorted(expected_due_dates - kept_due_dates):
-            db.add(
-                Task(
-                    title=str(getattr(rule, "name", "")),
-                    description=getattr(rule, "description", None),
-                    category_id=getattr(rule, "category_id", None),
-                    rule_id=getattr(rule, "id"),
-                    user_id=getattr(rule, "user_id"),
-                    is_completed=False,
-                    due_date=_date_part(due_datetime),
-                    due_time=_time_part_string(due_datetime),
-                )
-            )
+            db.add(_generated_child(rule, due_datetime))
             created_count += 1
 
         return _schedule_preview_summary(deleted_count, created_count)
@@ -376,25 +453,14 @@ def apply_rule_schedule_change(
     if normalized_mode == "all_replace":
         deleted_count = len(existing_tasks)
         if deleted_count > 0:
-            db.query(Task).filter(Task.rule_id == rule.id, Task.user_id == rule.user_id).delete(synchronize_session=False)
+            db.query(child_model).filter(child_model.rule_id == rule.id, child_model.user_id == rule.user_id).delete(synchronize_session=False)
 
-        all_due_dates = [due_datetime for task in existing_tasks for due_datetime in [_combine_task_datetime(task)] if due_datetime is not None]
+        all_due_dates = [due_datetime for task in existing_tasks for due_datetime in [_child_datetime(task)] if due_datetime is not None]
         all_start_date = min((due_date.date() for due_date in all_due_dates), default=anchor_date)
         expected_due_dates = _build_due_datetimes_for_pattern(next_rate_pattern, anchor_date, all_start_date, end_future)
 
         for due_datetime in sorted(expected_due_dates):
-            db.add(
-                Task(
-                    title=str(getattr(rule, "name", "")),
-                    description=getattr(rule, "description", None),
-                    category_id=getattr(rule, "category_id", None),
-                    rule_id=getattr(rule, "id"),
-                    user_id=getattr(rule, "user_id"),
-                    is_completed=False,
-                    due_date=_date_part(due_datetime),
-                    due_time=_time_part_string(due_datetime),
-                )
-            )
+            db.add(_generated_child(rule, due_datetime))
             created_count += 1
 
         return _schedule_preview_summary(deleted_count, created_count)
@@ -403,23 +469,12 @@ def apply_rule_schedule_change(
     existing_due_dates = {
         due_datetime
         for task in existing_tasks
-        for due_datetime in [_combine_task_datetime(task)]
+        for due_datetime in [_child_datetime(task)]
         if due_datetime is not None
     }
 
     for due_datetime in sorted(expected_due_dates - existing_due_dates):
-        db.add(
-            Task(
-                title=str(getattr(rule, "name", "")),
-                description=getattr(rule, "description", None),
-                category_id=getattr(rule, "category_id", None),
-                rule_id=getattr(rule, "id"),
-                user_id=getattr(rule, "user_id"),
-                is_completed=False,
-                due_date=_date_part(due_datetime),
-                due_time=_time_part_string(due_datetime),
-            )
-        )
+        db.add(_generated_child(rule, due_datetime))
         created_count += 1
 
     return _schedule_preview_summary(0, created_count)
@@ -430,15 +485,22 @@ def run_rule_generation(
     start_date: date,
     end_date: date,
     user_id: Optional[int] = None,
+    rule_ids: Optional[Iterable[int]] = None,
 ) -> Dict[str, int]:
-    if end_date < start_date:
-        return {"rules_checked": 0, "tasks_created": 0}
+    if rule_ids is not None:
+        rule_ids = list(rule_ids)
+    if end_date < start_date or rule_ids == []:
+        return {"rules_checked": 0, "tasks_created": 0, "events_created": 0}
 
     query = db.query(Rule).filter(Rule.is_active == True)
     if user_id is not None:
         query = query.filter(Rule.user_id == user_id)
+    if rule_ids is not None:
+        query = query.filter(Rule.id.in_(rule_ids))
     active_rules = query.all()
     tasks_created = 0
+    events_created = 0
+    changed_user_ids: Set[int] = set()
 
     for rule in active_rules:
         rate_pattern = str(getattr(rule, "rate_pattern", "") or "")
@@ -446,20 +508,31 @@ def run_rule_generation(
         if not segments:
             continue
 
-        existing_tasks = (
-            db.query(Task)
-            .filter(
-                Task.rule_id == rule.id,
-                func.date(Task.due_date) >= start_date.isoformat(),
-                func.date(Task.due_date) <= end_date.isoformat(),
+        if is_event_rule(rule):
+            existing_children = (
+                db.query(Event)
+                .filter(
+                    Event.rule_id == rule.id,
+                    Event.start_time >= datetime.combine(start_date, datetime.min.time()),
+                    Event.start_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+                )
+                .all()
+            )
+        else:
+            existing_children = (
+                db.query(Task)
+                .filter(
+                    Task.rule_id == rule.id,
+                    func.date(Task.due_date) >= start_date.isoformat(),
+                    func.date(Task.due_date) <= end_date.isoformat(),
+                )
+                .all()
             )
-            .all()
-        )
 
         existing_due_dates = {
             due_datetime
-            for task in existing_tasks
-            for due_datetime in [_combine_task_datetime(task)]
+            for child in existing_children
+            for due_datetime in [_child_datetime(child)]
             if due_datetime is not None
         }
 
@@ -485,28 +558,25 @@ def run_rule_generation(
                 if due_datetime in existing_due_dates:
                     continue
 
-                generated_task = Task(
-                    title=str(getattr(rule, "name", "")),
-                    description=getattr(rule, "description", None),
-                    category_id=getattr(rule, "category_id", None),
-                    rule_id=getattr(rule, "id"),
-                    user_id=getattr(rule, "user_id"),
-                    is_completed=False,
-                    due_date=_date_part(due_datetime),
-                    due_time=_time_part_string(due_datetime),
-                )
-                db.add(generated_task)
+                db.add(_generated_child(rule, due_datetime))
                 existing_due_dates.add(due_datetime)
-                tasks_created += 1
+                changed_user_ids.add(rule.user_id)
+                if is_event_rule(rule):
+                    events_created += 1
+                else:
+                    tasks_created += 1
 
             current_day += timedelta(days=1)
 
-    if tasks_created > 0:
+    if changed_user_ids:
         db.commit()
+        for changed_user_id in changed_user_ids:
+            bump_generation(changed_user_id)
 
     return {
         "rules_checked": len(active_rules),
         "tasks_created": tasks_created,
+        "events_created": events_created,
     }
 
 
@@ -535,7 +605,8 @@ class RuleScheduler:
             try:
                 start_date = datetime.utcnow().date()
                 end_date = start_date + timedelta(days=self.horizon_days)
-                run_rule_generation(db, start_date, end_date)
+                with profile_captures.capture(SCHEDULER_TARGET):
+                    run_rule_generation(db, start_date, end_date)
             except Exception as exc:
                 print(f"Rule scheduler error: {exc}")
                 db.rollback()
@@ -0,0 +1,195 @@
+"""Column-tuple serialization for list endpoints.
+
+List routes select only the columns their ``to_dict`` exposes, as plain row tuples,
+and hand the resulting dicts straight to orjson. This skips ORM identity-map
+bookkeeping, per-field ``isoformat()`` calls and FastAPI's ``jsonable_encoder``
+while producing byte-for-byte the same JSON: orjson renders ``date`` and naive
+``datetime`` values exactly as ``isoformat()`` does.
+
+Very large lists can instead be streamed from a ``yield_per`` cursor as a chunked
+JSON array or NDJSON, so peak memory stays at one batch of rows.
+"""
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ArchivedTask, Category, Event, Rule, Task, deleted_rule_field
+
+STREAM_BATCH_SIZE = 1000
+STREAM_CHUNK_BYTES = 64 * 1024
+STREAM_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+# Column order mirrors each model's to_dict so the JSON keys come out identically
+CATEGORY_COLUMNS = (
+    Category.id,
+    Category.name,
+    Category.icon,
+    Category.color,
+    Category.user_id,
+    Category.created_at,
+    Category.version,
+)
+
+RULE_COLUMNS = (
+    Rule.id,
+    Rule.name,
+    Rule.icon,
+    Rule.color,
+    Rule.description,
+    Rule.category_id,
+    Rule.user_id,
+    Rule.rate_pattern,
+    Rule.is_active,
+    Rule.event_duration_minutes,
+    Rule.created_at,
+    Rule.version,
+)
+
+
+def _task_columns(model) -> Tuple:
+    """Task columns with title and description read through from the rule when inherited."""
+    def rule_field(column):
+        return select(column).where(Rule.id == model.rule_id).scalar_subquery()
+
+    def deleted_field(field):
+        # Only consulted once the rule row is gone and its cascade job has not reached the task
+        return case(
+            (
+                and_(model.rule_id.isnot(None), rule_field(Rule.id).is_(None)),
+                deleted_rule_field(model.user_id, model.rule_id, field).scalar_subquery(),
+            )
+        )
+
+    return (
+        model.id,
+        case(
+            (model.title == "", func.coalesce(rule_field(Rule.name), deleted_field("name"), model.title)),
+            else_=model.title,
+        ).label("title"),
+        model.icon,
+        model.color,
+        func.coalesce(model.description, rule_field(Rule.description), deleted_field("description")).label("description"),
+        model.category_id,
+        model.rule_id,
+        model.user_id,
+        model.is_completed,
+        model.due_date,
+        model.due_time,
+        model.end_date,
+        model.end_time,
+        model.created_at,
+        model.completed_at,
+        model.version,
+    )
+
+
+TASK_COLUMNS = _task_columns(Task)
+ARCHIVED_TASK_COLUMNS = _task_columns(ArchivedTask)
+
+EVENT_COLUMNS = (
+    Event.id,
+    Event.title,
+    Event.description,
+    Event.category_id,
+    Event.rule_id,
+    Event.user_id,
+    Event.start_time,
+    Event.end_time,
+    Event.created_at,
+    Event.version,
+)
+
+
+class ORJSONBytesResponse(JSONResponse):
+    """JSON response rendered by orjson; already-rendered bytes pass through untouched."""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+
+def render_orjson(content) -> bytes:
+    return orjson.dumps(content)
+
+
+def fetch_dicts(db: Session, columns: Sequence, *criteria) -> List[Dict[str, object]]:
+    """Select ``columns`` matching ``criteria`` and return one dict per row."""
+    keys = [column.key for column in columns]
+    rows = db.execute(select(*columns).where(*criteria)).all()
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def iter_dicts(db: Session, columns: Sequence, *criteria, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict[str, object]]:
+    """Yield one dict per row, fetching ``batch_size`` rows at a time from the cursor."""
+    keys = [column.key for column in columns]
+    result = db.execute(
+        select(*columns).where(*criteria).execution_options(yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        for row in partition:
+            yield dict(zip(keys, row))
+
+
+def iter_json_array(rows: Iterable[Dict[str, object]]) -> Iterator[bytes]:
+    """Encode rows as one JSON array, emitted in chunks of roughly STREAM_CHUNK_BYTES."""
+    buffer = bytearray(b"[")
+    first = True
+    for row in rows:
+        if not first:
+            buffer += b","
+        buffer += orjson.dumps(row)
+        first = False
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
+
+
+def iter_ndjson(rows: Iterable[Dict[str, object]]) -> Iterator[bytes]:
+    """Encode rows as newline-delimited JSON, emitted in chunks of roughly STREAM_CHUNK_BYTES."""
+    buffer = bytearray()
+    for row in rows:
+        buffer += orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def streaming_list_response(
+    *queries: Tuple[Sequence, Sequence],
+    stream_format: str = "json",
+    extra_rows: Optional[Callable[[Session], Iterable[Dict[str, object]]]] = None,
+) -> StreamingResponse:
+    """Stream a list endpoint's rows from a dedicated session as JSON or NDJSON.
+
+    Each query is a ``(columns, criteria)`` pair; their rows are concatenated,
+    followed by any rows ``extra_rows`` yields from the same session. The session
+    is opened inside the generator because the response body is produced after the
+    route returns, once request-scoped dependencies may already be closed.
+    """
+    def generate() -> Iterator[bytes]:
+        db = SessionLocal()
+        try:
+            rows = (row for columns, criteria in queries for row in iter_dicts(db, columns, *criteria))
+            if extra_rows is not None:
+                rows = itertools.chain(rows, extra_rows(db))
+            if stream_format == "ndjson":
+                yield from iter_ndjson(rows)
+            else:
+                yield from iter_json_array(rows)
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type=STREAM_MEDIA_TYPES[stream_format])
@@ -0,0 +1,241 @@
+"""Signed access tokens and the verified-identity cache.
+
+``/auth/login`` and ``/auth/register`` issue short-lived HS256 JWTs carrying the
+user id, username and the user's ``token_version``. ``authorize_user_scope``,
+attached to the data routers in ``app.py``, checks that a presented token
+belongs to the ``user_id`` the request names, so clients can no longer act as
+another user by editing an id. Requests without a token are still served unless
+``REQUIRE_ACCESS_TOKENS`` is set, which keeps older clients working while they
+move over.
+
+Verification never touches the database on the hot path. Decoded identities are
+kept in an LRU keyed by the token string, so a repeat request costs a dict
+lookup, and a new token costs one signature check. Revocation bumps
+``users.token_version``; the current versions are held in process memory, which
+matches the single-process deployment in ``app.py``, and a user's version is
+read from the database once per process, on the first token seen for them.
+"""
+from __future__ import annotations
+
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User
+
+ACCESS_TOKEN_SECRET = os.getenv("ACCESS_TOKEN_SECRET") or secrets.token_urlsafe(32)
+ACCESS_TOKEN_ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL_SECONDS = int(os.getenv("ACCESS_TOKEN_TTL_SECONDS", "900"))
+REQUIRE_ACCESS_TOKENS = os.getenv("REQUIRE_ACCESS_TOKENS", "0").lower() in {"1", "true", "yes"}
+IDENTITY_CACHE_MAX_ENTRIES = 10000
+# Diagnostics under /admin are served only when this is set, to requests sending it as X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+_lock = threading.Lock()
+_identities: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+_token_versions: Dict[int, int] = {}
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def issue_access_token(user: User) -> Dict[str, object]:
+    """Sign a token for ``user``; returned fields are merged into auth responses."""
+    issued_at = int(time.time())
+    version = user.token_version or 0
+    with _lock:
+        _token_versions[user.id] = version
+    claims = {
+        "sub": str(user.id),
+        "username": user.username,
+        "ver": version,
+        "iat": issued_at,
+        "exp": issued_at + ACCESS_TOKEN_TTL_SECONDS,
+    }
+    return {
+        "access_token": jwt.encode(claims, ACCESS_TOKEN_SECRET, algorithm=ACCESS_TOKEN_ALGORITHM),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL_SECONDS,
+    }
+
+
+def _current_token_version(user_id: int) -> Optional[int]:
+    with _lock:
+        version = _token_versions.get(user_id)
+    if version is not None:
+        return version
+
+    db = SessionLocal()
+    try:
+        row = db.query(User.token_version).filter(User.id == user_id).first()
+    finally:
+        db.close()
+    if row is None:
+        return None
+    with _lock:
+        return _token_versions.setdefault(user_id, row[0] or 0)
+
+
+def verify_access_token(token: str) -> Dict[str, object]:
+    """Return the identity a token names, or raise 401."""
+    now = time.time()
+    with _lock:
+        identity = _identities.get(token)
+        if identity is not None:
+            _identities.move_to_end(token)
+
+    if identity is None:
+        try:
+            claims = jwt.decode(token, ACCESS_TOKEN_SECRET, algorithms=[ACCESS_TOKEN_ALGORITHM])
+            identity = {
+                "user_id": int(claims["sub"]),
+                "username": claims.get("username"),
+                "token_version": int(claims["ver"]),
+                "expires_at": int(claims["exp"]),
+            }
+        except (JWTError, KeyError, TypeError, ValueError):
+            raise _unauthorized("Invalid access token")
+        with _lock:
+            _identities[token] = identity
+            while len(_identities) > IDENTITY_CACHE_MAX_ENTRIES:
+                _identities.popitem(last=False)
+
+    if identity["expires_at"] <= now:
+        with _lock:
+            _identities.pop(token, None)
+        raise _unauthorized("Access token expired")
+    if identity["token_version"] != _current_token_version(identity["user_id"]):
+        with _lock:
+            _identities.pop(token, None)
+        raise _unauthorized("Access token revoked")
+    return identity
+
+
+def revoke_user_tokens(db: Session, user: User) -> None:
+    """Invalidate every token issued to ``user`` so far; caller's session commits here."""
+    user.token_version = (user.token_version or 0) + 1
+    db.commit()
+    with _lock:
+        _token_versions[user.id] = user.token_version
+        for token in [token for token, identity in _identities.items() if identity["user_id"] == user.id]:
+            del _identities[token]
+
+
+def bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token.strip()
+    return None
+
+
+def _identity_for(token: Optional[str]) -> Optional[Dict[str, object]]:
+    if token is None:
+        if REQUIRE_ACCESS_TOKENS:
+            raise _unauthorized("Access token required")
+        return None
+    return verify_access_token(token)
+
+
+def current_identity(request: Request) -> Optional[Dict[str, object]]:
+    """Dependency: the verified identity of the request, or None when no token was sent."""
+    return _identity_for(bearer_token(request))
+
+
+# Endpoint -> whether FastAPI parses a request body for it
+_body_endpoints: Dict[object, bool] = {}
+
+
+def _endpoint_reads_body(request: Request) -> bool:
+    endpoint = request.scope.get("endpoint")
+    reads_body = _body_endpoints.get(endpoint)
+    if reads_body is None:
+        reads_body = any(
+            getattr(route, "endpoint", None) is endpoint and getattr(route, "body_field", None) is not None
+            for route in request.app.router.routes
+        )
+        _body_endpoints[endpoint] = reads_body
+    return reads_body
+
+
+def _json_content_type(request: Request) -> bool:
+    # FastAPI parses a body as JSON without a content type, or with a JSON one
+    content_type = request.headers.get("content-type")
+    if not content_type:
+        return True
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type == "application/json" or (media_type.startswith("application/") and media_type.endswith("+json"))
+
+
+async def authorize_user_scope(request: Request) -> None:
+    """Router dependency: a token may only act for the ``user_id`` the request names.
+
+    Every ``user_id`` in the path, the query string and a JSON body must be the
+    token's user, so a route reading the id from one place cannot be steered by
+    a different id in another. Bodies are only read for routes that declare
+    body parameters, so streamed uploads stay unbuffered. Requests that name no
+    user, such as job polling, only need the token to be valid.
+    """
+    await _check_user_scope(request, current_identity(request))
+
+
+async def authorize_stream_scope(request: Request) -> None:
+    """Router dependency for ``/stream``: ``authorize_user_scope`` plus ``?access_token=``.
+
+    EventSource cannot set headers, so the change stream also accepts the token
+    in the query string. Every other route reads it from the Authorization
+    header only, which keeps tokens out of their URLs and access logs.
+    """
+    token = bearer_token(request) or request.query_params.get("access_token") or None
+    await _check_user_scope(request, _identity_for(token))
+
+
+async def _check_user_scope(request: Request, identity: Optional[Dict[str, object]]) -> None:
+    if identity is None:
+        return
+
+    requested = request.query_params.getlist("user_id")
+    if "user_id" in request.path_params:
+        requested.append(request.path_params["user_id"])
+    if _endpoint_reads_body(request) and _json_content_type(request):
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and body.get("user_id") is not None:
+            requested.append(body["user_id"])
+
+    for requested_user in requested:
+        try:
+            requested_id = int(requested_user)
+        except (TypeError, ValueError):
+            requested_id = None
+        if requested_id != identity["user_id"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token does not grant access to this user")
+
+
+def admin_token_matches(presented: Optional[str]) -> bool:
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest((presented or "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+async def require_admin(request: Request) -> None:
+    """Dependency for operator endpoints; they do not exist unless ``ADMIN_TOKEN`` is configured."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not admin_token_matches(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
@@ -0,0 +1,168 @@
+"""Slow-query log with the query plan captured at the time.
+
+Every statement on the engine is timed. One that takes at least
+``SLOW_QUERY_MS`` is recorded with its normalized SQL, parameters, duration,
+and source: the route serving the request, or the background thread such as
+``rule-scheduler`` for scheduler ticks. ``EXPLAIN QUERY PLAN`` is also run
+right away on the same connection and recorded, so a query that degraded into
+a full scan shows it (``full_scans`` lists the scanned tables). Plans are cached
+per statement shape, so a query that is slow every time is explained once.
+
+Entries are kept in a ring buffer of the latest ``SLOW_QUERY_LOG_SIZE`` and read
+through ``GET /admin/slow-queries``. String and bytes parameters are redacted
+to their length unless ``SLOW_QUERY_REDACT_PARAMETERS=0``.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from datetime import date, datetime
+from time import perf_counter
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import event
+
+from request_profiling import current_profile, normalize_sql, route_label
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_REDACT_PARAMETERS = os.getenv("SLOW_QUERY_REDACT_PARAMETERS", "1") != "0"
+SLOW_QUERY_PLAN_CACHE_SIZE = 256
+
+EXPLAINABLE_STATEMENT = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.IGNORECASE)
+# A full pass over a table or index; virtual tables such as FTS5 do their own lookups
+FULL_SCAN_DETAIL = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)\b(?! VIRTUAL TABLE)")
+
+
+def _redact(value):
+    if isinstance(value, (str, bytes)) and SLOW_QUERY_REDACT_PARAMETERS:
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return f"<bytes:{len(value)}>"
+    return value
+
+
+def _loggable_parameters(parameters, executemany: bool):
+    if executemany:
+        batch = list(parameters or [])
+        return {"first": _loggable_parameters(batch[0], False) if batch else None, "rows": len(batch)}
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact(value) for value in parameters]
+    return parameters
+
+
+def _source() -> str:
+    profile = current_profile()
+    if profile is not None:
+        return route_label(profile["scope"])
+    return f"thread:{threading.current_thread().name}"
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._entries: Deque[Dict[str, object]] = deque(maxlen=size)
+        self._plans: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.total = 0
+
+    def _plan(self, cursor, statement: str, shape: str, parameters, executemany: bool) -> Optional[List[str]]:
+        with self._lock:
+            plan = self._plans.get(shape)
+            if plan is not None:
+                self._plans.move_to_end(shape)
+                return plan
+        if not EXPLAINABLE_STATEMENT.match(statement):
+            return None
+        if executemany:
+            parameters = next(iter(parameters or []), ())
+        try:
+            # A fresh DBAPI cursor on the same connection: no engine events, same transaction
+            explain_cursor = cursor.connection.cursor()
+            try:
+                rows = explain_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+            finally:
+                explain_cursor.close()
+        except Exception as exc:
+            return [f"EXPLAIN failed: {exc}"]
+
+        # Rows are (id, parent, notused, detail); indent each detail under its parent
+        depth = {0: -1}
+        plan = []
+        for node_id, parent_id, _, detail in rows:
+            depth[node_id] = depth.get(parent_id, -1) + 1
+            plan.append("  " * depth[node_id] + detail)
+        with self._lock:
+            self._plans[shape] = plan
+            if len(self._plans) > SLOW_QUERY_PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+
+    def record(self, cursor, statement: str, parameters, executemany: bool, duration_ms: float) -> None:
+        shape = normalize_sql(statement)
+        plan = self._plan(cursor, statement, shape, parameters, executemany)
+        full_scans = sorted({
+            match.group(1)
+            for line in plan or []
+            for match in [FULL_SCAN_DETAIL.match(line.strip())]
+            if match
+        })
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "source": _source(),
+            "statement": shape,
+            "parameters": _loggable_parameters(parameters, executemany),
+            "plan": plan,
+            "full_scans": full_scans,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+        scans = f" (full scan: {', '.join(full_scans)})" if full_scans else ""
+        print(f"Slow query {duration_ms:.1f} ms in {entry['source']}{scans}: {shape[:200]}")
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, object]]:
+        """Logged entries, newest first."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit is not None else entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+            self.total = 0
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._slow_query_started = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    duration_ms = (perf_counter() - started) * 1000
+    if duration_ms >= slow_query_log.threshold_ms:
+        slow_query_log.record(cursor, statement, parameters, executemany, duration_ms)
+
+
+def install_slow_query_log(engine) -> None:
+    """Time every statement on ``engine``; a threshold of zero or less turns the log off."""
+    if slow_query_log.threshold_ms <= 0:
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
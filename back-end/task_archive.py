@@ -0,0 +1,200 @@
+"""Hot/cold task archive.
+
+Completed tasks older than ``TASK_ARCHIVE_AFTER_DAYS`` are moved from ``tasks`` into
+``tasks_archive`` in bounded chunks by ``TaskArchiver``. Every list query, rule
+engine dedupe and cascade then only touches the recent rows. Read endpoints
+include archived rows only when the requested date window starts before the
+archive horizon. Writing to an archived task moves it back first.
+
+Moving a row out of ``tasks`` records a sync tombstone like any delete, so delta
+sync clients drop it as well.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, exists, or_, text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ArchivedTask, Task
+from response_cache import bump_generation
+
+TASK_ARCHIVE_AFTER_DAYS = int(os.getenv("TASK_ARCHIVE_AFTER_DAYS", "90"))
+TASK_ARCHIVE_CHUNK_SIZE = 1000
+
+ARCHIVE_COLUMN_NAMES = ", ".join(column.name for column in Task.__table__.columns)
+# Restored rows take a fresh sync version from the insert trigger
+RESTORE_COLUMN_NAMES = ", ".join(column.name for column in Task.__table__.columns if column.name != "version")
+
+
+def archive_cutoff(today: Optional[date] = None) -> date:
+    """First date that is still guaranteed to be in the hot table."""
+    return (today or datetime.utcnow().date()) - timedelta(days=TASK_ARCHIVE_AFTER_DAYS)
+
+
+def window_reaches_archive(window_start: Optional[date], include_archived: bool = False) -> bool:
+    if include_archived:
+        return True
+    return window_start is not None and window_start < archive_cutoff()
+
+
+def task_window_filters(model, window_start: Optional[date], window_end: Optional[date], include_undated: bool = True) -> List:
+    """Filters selecting tasks dated within the window, or spanning into it via end_date."""
+    if not window_start and not window_end:
+        return [] if include_undated else [model.due_date.isnot(None)]
+
+    dated_filters = [model.due_date.isnot(None)]
+    if window_start:
+        dated_filters.append(or_(model.due_date >= window_start, model.end_date >= window_start))
+    if window_end:
+        dated_filters.append(model.due_date <= window_end)
+    dated = and_(*dated_filters)
+    return [or_(dated, model.due_date.is_(None)) if include_undated else dated]
+
+
+def archive_completed_tasks(db: Session, chunk_size: int = TASK_ARCHIVE_CHUNK_SIZE) -> Dict[str, int]:
+    """Move one chunk of old completed tasks into the archive and commit.
+
+    Tasks due on or after the cutoff stay hot even when completed early, so the
+    rule engine still sees them when deduplicating upcoming occurrences.
+    """
+    cutoff = archive_cutoff()
+    cutoff_dt = datetime.combine(cutoff, datetime.min.time())
+    rows = (
+        db.query(Task.id, Task.user_id)
+        .filter(
+            Task.is_completed == True,
+            Task.completed_at < cutoff_dt,
+            or_(Task.due_date.is_(None), Task.due_date < cutoff),
+        )
+        .limit(chunk_size)
+        .all()
+    )
+    if not rows:
+        return {"archived": 0}
+
+    task_ids = [row[0] for row in rows]
+    params = {f"id_{index}": task_id for index, task_id in enumerate(task_ids)}
+    id_list = ", ".join(f":{name}" for name in params)
+    db.execute(
+        text(
+            f"INSERT INTO tasks_archive ({ARCHIVE_COLUMN_NAMES}) "
+            f"SELECT {ARCHIVE_COLUMN_NAMES} FROM tasks WHERE id IN ({id_list})"
+        ),
+        params,
+    )
+    db.query(Task).filter(Task.id.in_(task_ids)).delete(synchronize_session=False)
+    db.commit()
+
+    for user_id in {row[1] for row in rows}:
+        bump_generation(user_id)
+    return {"archived": len(task_ids)}
+
+
+def restore_archived_task(db: Session, task_id: int, user_id: int) -> Optional[Task]:
+    """Move an archived task back into ``tasks`` so it can be edited; caller commits.
+
+    Keeps the original id. Task ids are never reused, so only a row archived by
+    a database that predates AUTOINCREMENT on ``tasks`` can collide with a newer
+    task; it comes back under a fresh id.
+    """
+    archived = db.query(ArchivedTask).filter(
+        ArchivedTask.id == task_id,
+        ArchivedTask.user_id == user_id,
+    ).first()
+    if not archived:
+        return None
+
+    values = {
+        column.key: getattr(archived, column.key)
+        for column in ArchivedTask.__table__.columns
+        if column.key != "version"
+    }
+    if db.query(Task.id).filter(Task.id == task_id).first():
+        values.pop("id")
+
+    task = Task(**values)
+    db.add(task)
+    db.delete(archived)
+    db.flush()
+    return task
+
+
+def restore_archived_tasks(db: Session, user_id: int, task_ids: List[int]) -> List[int]:
+    """Move the user's archived tasks among ``task_ids`` back into ``tasks``; caller commits.
+
+    The set-based form of ``restore_archived_task`` for batch writes, so ids are
+    kept. A row whose id a newer task already holds, possible only in databases
+    older than AUTOINCREMENT on ``tasks``, stays archived. Returns the restored ids.
+    """
+    restored_ids = [
+        row[0]
+        for row in db.query(ArchivedTask.id).filter(
+            ArchivedTask.user_id == user_id,
+            ArchivedTask.id.in_(task_ids),
+            ~exists().where(Task.id == ArchivedTask.id),
+        )
+    ]
+    if not restored_ids:
+        return []
+
+    params = {f"id_{index}": task_id for index, task_id in enumerate(restored_ids)}
+    id_list = ", ".join(f":{name}" for name in params)
+    db.execute(
+        text(
+            f"INSERT INTO tasks ({RESTORE_COLUMN_NAMES}) "
+            f"SELECT {RESTORE_COLUMN_NAMES} FROM tasks_archive WHERE id IN ({id_list})"
+        ),
+        params,
+    )
+    db.query(ArchivedTask).filter(ArchivedTask.id.in_(restored_ids)).delete(synchronize_session=False)
+    return restored_ids
+
+
+class TaskArchiver:
+    def __init__(
+        self,
+        interval_seconds: int = 3600,
+        chunk_size: int = TASK_ARCHIVE_CHUNK_SIZE,
+        after_archive: Optional[Callable[[Session], object]] = None,
+    ):
+        self.interval_seconds = interval_seconds
+        self.chunk_size = chunk_size
+        self.after_archive = after_archive
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="task-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.is_set():
+            db = SessionLocal()
+            try:
+                # Short chunks with a pause between them keep the write lock available
+                while not self._stop_event.is_set():
+                    if archive_completed_tasks(db, self.chunk_size)["archived"] < self.chunk_size:
+                        break
+                    self._stop_event.wait(0.05)
+                if self.after_archive and not self._stop_event.is_set():
+                    self.after_archive(db)
+            except Exception as exc:
+                print(f"Task archiver error: {exc}")
+                db.rollback()
+            finally:
+                db.close()
+
+            self._stop_event.wait(self.interval_seconds)
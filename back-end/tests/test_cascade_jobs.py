@@ -0,0 +1,69 @@
+"""A cascade job still running for a deleted project must not reach a new project.
+
+Run from back-end/ with ``python -m unittest discover tests``.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setUpModule():
+    # database.py opens ./instance/data.db, so work in a scratch directory
+    global _workdir, _previous_cwd
+    _previous_cwd = os.getcwd()
+    _workdir = tempfile.TemporaryDirectory()
+    os.makedirs(os.path.join(_workdir.name, "instance"))
+    os.chdir(_workdir.name)
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def tearDownModule():
+    os.chdir(_previous_cwd)
+    _workdir.cleanup()
+
+
+class CascadeIdReuseTest(unittest.TestCase):
+    def test_running_category_cascade_leaves_new_category_alone(self):
+        from fastapi.testclient import TestClient
+
+        import app as app_module
+        from cascade_jobs import CASCADE_INITIAL_CHUNK_SIZE, run_cascade_job
+        from database import SessionLocal
+        from models import CascadeJob, Task
+
+        # No lifespan: the cascade worker stays stopped, so the job is left mid-way
+        client = TestClient(app_module.app)
+        user_id = client.post("/auth/register", json={"username": "cascade", "password": "pw"}).json()["id"]
+        old_category = client.post("/categories/", json={"name": "Old", "user_id": user_id}).json()["id"]
+
+        db = SessionLocal()
+        db.add_all([
+            Task(title=f"old {index}", user_id=user_id, category_id=old_category)
+            for index in range(CASCADE_INITIAL_CHUNK_SIZE + 200)
+        ])
+        db.commit()
+
+        response = client.request(
+            "DELETE", f"/categories/{old_category}", params={"user_id": user_id, "cascade_tasks": True}
+        ).json()
+        self.assertEqual(response["cascade_job"]["status"], "running")
+
+        new_category = client.post("/categories/", json={"name": "New", "user_id": user_id}).json()["id"]
+        self.assertNotEqual(new_category, old_category)
+        new_task = client.post("/tasks/", json={"title": "keep me", "user_id": user_id, "category_id": new_category}).json()
+
+        job = db.get(CascadeJob, response["cascade_job"]["id"])
+        run_cascade_job(db, job)
+        db.expire_all()
+
+        self.assertEqual(job.status, "done")
+        self.assertEqual(db.query(Task).filter(Task.category_id == old_category).count(), 0)
+        self.assertIsNotNone(db.get(Task, new_task["id"]))
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
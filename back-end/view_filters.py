@@ -0,0 +1,168 @@
+"""Server-side versions of the client's task visibility preferences.
+
+Mirrors the filtering in the web client's task list and planner calendar so
+that a response built with these filters contains exactly what the client would
+have rendered from the full list. Each rule exists as a SQL expression for
+queries and as a plain predicate for rows that are built in Python, such as
+expanded completion ledgers and multi-day spans.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import and_, false, func, literal_column, or_
+from sqlalchemy.orm import Session
+
+from database import EVENT_LOOKBACK_DAYS
+from models import Event, UserData
+
+DEFAULT_VIEW_PREFERENCES = {
+    "time_period": "today",
+    "show_undated": True,
+    "show_uncategorized": True,
+    "show_overdue": True,
+    "show_categories": [],
+}
+
+
+def load_view_preferences(db: Session, user_id: int) -> Dict[str, object]:
+    """Read the user's stored filters, falling back to the defaults new users get."""
+    user_data = db.query(UserData).filter(UserData.user_id == user_id).first()
+    if not user_data:
+        return dict(DEFAULT_VIEW_PREFERENCES)
+
+    try:
+        show_categories = json.loads(user_data.show_categories or "[]")
+    except ValueError:
+        show_categories = []
+
+    return {
+        "time_period": (user_data.time_period or "today").lower(),
+        "show_undated": user_data.show_undated is not False,
+        "show_uncategorized": user_data.show_uncategorized is not False,
+        "show_overdue": user_data.show_overdue is not False,
+        "show_categories": [value for value in show_categories if isinstance(value, int)],
+    }
+
+
+def parse_client_now(value: Optional[str]) -> datetime:
+    """The client's local wall-clock time, which decides "today" and "overdue"."""
+    if not value:
+        return datetime.utcnow().replace(second=0, microsecond=0)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed.replace(tzinfo=None, second=0, microsecond=0)
+
+
+def category_filter(model, preferences: Dict[str, object]):
+    """Allow-listed projects, plus project-less rows when those are shown."""
+    conditions = []
+    if preferences["show_categories"]:
+        conditions.append(model.category_id.in_(preferences["show_categories"]))
+    if preferences["show_uncategorized"]:
+        conditions.append(model.category_id.is_(None))
+    return or_(*conditions) if conditions else false()
+
+
+def category_visible(category_id: Optional[int], preferences: Dict[str, object]) -> bool:
+    if category_id is None:
+        return preferences["show_uncategorized"]
+    return category_id in preferences["show_categories"]
+
+
+def overdue_filter(model, now: datetime):
+    """Incomplete tasks whose start has passed; untimed tasks are overdue the day after."""
+    today = now.date()
+    return and_(
+        or_(model.is_completed == False, model.is_completed.is_(None)),
+        model.due_date.isnot(None),
+        or_(
+            model.due_date < today,
+            and_(model.due_date == today, model.due_time.isnot(None), model.due_time < now.strftime("%H:%M")),
+        ),
+    )
+
+
+def events_overlapping(user_id: int, start: Optional[datetime], end: Optional[datetime]):
+    """The user's events that overlap [start, end); either bound may be left open.
+
+    Events starting up to ``EVENT_LOOKBACK_DAYS`` before ``start`` are range-scanned
+    on ``ix_events_user_start``. Longer events that began earlier come from the
+    partial index ``ix_events_user_long``, whose condition is repeated verbatim
+    here so SQLite can use it. Each branch keeps the user and the end bound so
+    the two index scans are combined by SQLite's OR optimization.
+    """
+    ends_before = [Event.start_time < end] if end is not None else []
+    if start is None:
+        return and_(Event.user_id == user_id, *ends_before)
+
+    lookback = start - timedelta(days=EVENT_LOOKBACK_DAYS)
+    is_long = Event.end_time > func.datetime(Event.start_time, literal_column(f"'+{EVENT_LOOKBACK_DAYS} days'"))
+    return or_(
+        and_(
+            Event.user_id == user_id,
+            Event.start_time >= lookback,
+            *ends_before,
+            func.coalesce(Event.end_time, Event.start_time) >= start,
+        ),
+        and_(Event.user_id == user_id, Event.start_time < lookback, is_long, Event.end_time >= start),
+    )
+
+
+def is_overdue(is_completed: Optional[bool], due_date: Optional[date], due_time: Optional[str], now: datetime) -> bool:
+    if is_completed or due_date is None:
+        return False
+    today = now.date()
+    if due_date < today:
+        return True
+    return due_date == today and bool(due_time) and due_time < now.strftime("%H:%M")
+
+
+def _period_bounds(period: str, today: date) -> Dict[str, Optional[date]]:
+    """Exclusive end for incomplete tasks, and the window completed tasks stay visible in.
+
+    Weeks start on Monday here, as in the client's task list.
+    """
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=7)
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+
+    if period == "week":
+        return {"incomplete_end": week_end, "completed_start": week_start, "completed_end": week_end}
+    if period == "month":
+        return {"incomplete_end": month_end, "completed_start": month_start, "completed_end": month_end}
+    if period == "upcoming":
+        return {"incomplete_end": None, "completed_start": today, "completed_end": None}
+    # "today" and the planner's "day"; completed tasks due earlier stay listed
+    return {"incomplete_end": today + timedelta(days=1), "completed_start": None, "completed_end": today + timedelta(days=1)}
+
+
+def visible_tasks_filter(model, preferences: Dict[str, object], now: datetime):
+    """Everything the task list shows for the user's stored period and toggles."""
+    today = now.date()
+    bounds = _period_bounds(preferences["time_period"], today)
+    is_incomplete = or_(model.is_completed == False, model.is_completed.is_(None))
+
+    not_yet_due = [or_(
+        model.due_date > today,
+        and_(model.due_date == today, or_(model.due_time.is_(None), model.due_time >= now.strftime("%H:%M"))),
+    )]
+    if bounds["incomplete_end"]:
+        not_yet_due.append(model.due_date < bounds["incomplete_end"])
+
+    completed_window = [model.is_completed == True]
+    if bounds["completed_start"]:
+        completed_window.append(model.due_date >= bounds["completed_start"])
+    if bounds["completed_end"]:
+        completed_window.append(model.due_date < bounds["completed_end"])
+
+    dated = [and_(is_incomplete, *not_yet_due), and_(*completed_window)]
+    if preferences["show_overdue"]:
+        dated.append(overdue_filter(model, now))
+
+    visible = [and_(model.due_date.isnot(None), or_(*dated))]
+    if preferences["show_undated"]:
+        visible.append(model.due_date.is_(None))
+    return and_(or_(*visible), category_filter(model, preferences))